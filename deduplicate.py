@@ -1,11 +1,29 @@
 import argparse
+import ctypes
+import gc
 import hashlib
+import heapq
+import math
+import os
+import pickle
+import re
+import shutil
+import sys
+import tempfile
 from pathlib import Path
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 import json as _json
 import ast as _ast
+import numpy as np
 import pandas as pd
 from src.config.base import DEBUG
+from src.io_helpers import (
+    read_frame, iter_frame, rewrite_frame, write_frame, write_map_results, export_xlsx, STORAGE_FORMATS,
+)
+from src.leads_store import LeadsStore
+from src.entity_resolution import fold_listing, resolve_entities
+from src.timing import PhaseTimings
 
 # Project paths (align with scraper.py)
 PROJECT_ROOT = Path(__file__).resolve().parent
@@ -18,30 +36,36 @@ def safe_print(msg: str) -> None:
     print(msg, flush=True)
 
 
-def read_map_file(path: Path) -> pd.DataFrame:
-    df = pd.read_excel(path)
-    # Normalize columns that we rely on
-    # Ensure these columns exist even if missing
-    required_cols = [
-        "listing_link",
-        "position",
-        "name",
-        "categories",
-        "website",
-        "phone",
-        "address",
-        "reviews_count",
-        "rating",
-        "status",
-        "source_file",
-        "search_volume",
-    ]
+# The only map columns the merge reads; everything else is not loaded
+MAP_FILE_COLUMNS = [
+    "listing_link",
+    "position",
+    "name",
+    "categories",
+    "website",
+    "phone",
+    "address",
+    "reviews_count",
+    "rating",
+    "status",
+    "source_file",
+    "search_volume",
+]
+
+
+def _with_merge_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Ensure the columns we rely on exist even if missing
+    required_cols = MAP_FILE_COLUMNS
     for col in required_cols:
         if col not in df.columns:
             df[col] = None
     return df
 
 
+def read_map_file(path: Path) -> pd.DataFrame:
+    return _with_merge_columns(read_frame(path, columns=MAP_FILE_COLUMNS))
+
+
 def _parse_categories_value(val) -> List[str]:
     """Normalize a categories cell into a list[str]. Supports:
     - already a list/tuple
@@ -105,6 +129,97 @@ def filter_min_rating(df: pd.DataFrame, min_rating: float) -> pd.DataFrame:
     return df[mask].copy()
 
 
+def _prepare_map_rows(df: pd.DataFrame, path: Path, min_rating: float):
+    # Preserve original source_file from the map rows if present (e.g., query filename)
+    # Do NOT overwrite it with the map filename. Instead, record the map filename separately.
+    if "source_file" not in df.columns:
+        df["source_file"] = None
+    df["map_file"] = path.name
+    before = len(df)
+    # Normalize categories before merging to ensure lists come through
+    if "categories" in df.columns:
+        df["categories"] = _normalize_categories_series(df["categories"])
+    return filter_min_rating(df, min_rating), before
+
+
+def load_map_rows(path: Path, min_rating: float, full: Optional[pd.DataFrame] = None):
+    """Read one map file ready to merge: categories as lists, map_file set, rating-filtered.
+    With `full` (the whole file, already read) nothing is read again.
+    Returns (rows, row count before the rating filter)."""
+    if full is not None:
+        df = _with_merge_columns(full[[c for c in MAP_FILE_COLUMNS if c in full.columns]].copy())
+    else:
+        df = read_map_file(path)
+    return _prepare_map_rows(df, path, min_rating)
+
+
+def iter_map_rows(path: Path, min_rating: float, batch_rows: int = 1000) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """load_map_rows in batches of at most batch_rows rows (a parquet file's; an xlsx file
+    comes as one batch). Yields (rows, row count of the batch before the rating filter)."""
+    for df in iter_frame(path, MAP_FILE_COLUMNS, batch_rows):
+        yield _prepare_map_rows(_with_merge_columns(df), path, min_rating)
+
+
+def _load_map_rows_job(path: Path, min_rating: float, keep_full: bool = False):
+    # Runs in a worker process: the frame is pickled back, so leave out what the merge does
+    # not read (status) and what the parent can add cheaply (map_file, one string per row)
+    full = read_frame(path) if keep_full else None
+    df, before = load_map_rows(path, min_rating, full)
+    return df.drop(columns=["map_file", "status"], errors="ignore"), before, full
+
+
+def load_map_frames(
+    paths: List[Path], min_rating: float, jobs: int = 1, keep_full: bool = False
+) -> Tuple[List[pd.DataFrame], int, List[Optional[pd.DataFrame]]]:
+    """load_map_rows for every path, in input order; with jobs > 1 in a pool of worker
+    processes (reading xlsx and parsing categories are CPU-bound). jobs=0 uses every CPU.
+
+    With keep_full each file is read whole (all columns, no rating filter) and that frame
+    is returned too, so the status update can rewrite it without reading it again.
+    Returns (frames, total row count before the rating filter, full frames or Nones)."""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+            n = len(paths)
+            results = list(pool.map(_load_map_rows_job, paths, [min_rating] * n, [keep_full] * n))
+    else:
+        results = [_load_map_rows_job(p, min_rating, keep_full) for p in paths]
+    frames: List[pd.DataFrame] = []
+    fulls: List[Optional[pd.DataFrame]] = []
+    total_before = 0
+    for path, (df, before, full) in zip(paths, results):
+        df["map_file"] = path.name
+        frames.append(df)
+        fulls.append(full)
+        total_before += before
+    return frames, total_before, fulls
+
+
+# Whole map files are kept from the load to the status rewrite only while they are
+# estimated to fit in this much memory; bigger input sets are read again file by file
+_KEEP_FULL_MAX_MB = 256
+
+
+def _keep_full_frames(paths: List[Path]) -> bool:
+    """Whether load_map_frames should keep the files whole for update_input_files_status."""
+    on_disk = sum(p.stat().st_size for p in paths if p.exists())
+    return on_disk * _SPILL_EXPANSION <= _KEEP_FULL_MAX_MB * 1024 * 1024
+
+
+# Scalar fields merged as "first non-empty value wins"
+_MERGE_SCALAR_KEYS = ("name", "website", "phone", "address", "reviews_count", "rating", "source_file")
+
+
+def _is_empty(v) -> bool:
+    if v is None:
+        return True
+    if isinstance(v, float) and pd.isna(v):
+        return True
+    if isinstance(v, str) and not v.strip():
+        return True
+    return False
+
+
 def merge_rows_by_listing(rows: List[Dict[str, Any]], source_flags: Dict[str, int]) -> List[Dict[str, Any]]:
     """Deduplicate by listing_link and merge fields.
 
@@ -115,63 +230,67 @@ def merge_rows_by_listing(rows: List[Dict[str, Any]], source_flags: Dict[str, in
     - add map_files -> list of MAP filenames where the listing appeared
     - carry 'source_file' -> first non-empty source from the original row (e.g. query filename)
     - set status = 'pending' in the merged output
+
+    Runs in time linear in the number of rows: each aggregate keeps its own set of
+    (map_file, position) pairs and positions, and the scalar fields it still lacks,
+    so a row only touches what can still change.
     """
     by_link: Dict[str, Dict[str, Any]] = {}
-
-    def first_non_empty(*vals):
-        for v in vals:
-            if v is None:
-                continue
-            if isinstance(v, float) and pd.isna(v):
-                continue
-            if isinstance(v, str) and not v.strip():
-                continue
-            return v
-        return None
+    flag_keys = {fname: f"query_filename{idx}" for fname, idx in source_flags.items()}
+    no_flags = {key: False for key in flag_keys.values()}
+    # Per-aggregate merge state, kept out of the output rows
+    pairs_by_link: Dict[str, set] = {}
+    positions_by_link: Dict[str, set] = {}
+    missing_by_link: Dict[str, List[str]] = {}
 
     for r in rows:
         link = r.get("listing_link")
         if not isinstance(link, str) or not link.strip():
             # skip items without a stable key
             continue
-        if link not in by_link:
-            by_link[link] = {
+        agg = by_link.get(link)
+        if agg is None:
+            agg = by_link[link] = {
                 "listing_link": link,
                 "position": [],
-                "name": r.get("name"),
+                "name": None,
                 "categories": r.get("categories") if isinstance(r.get("categories"), list) else [],
-                "website": r.get("website"),
-                "phone": r.get("phone"),
-                "address": r.get("address"),
-                "reviews_count": r.get("reviews_count"),
-                "rating": r.get("rating"),
-                "source_file": r.get("source_file"),  # first seen source
+                "website": None,
+                "phone": None,
+                "address": None,
+                "reviews_count": None,
+                "rating": None,
+                "source_file": None,  # first seen source
                 "search_volume": [],  # align 1:1 with map_files/position
                 "map_files": [],  # will aggregate below
                 "status": "pending",
             }
             # initialize flags
-            for fname, idx in source_flags.items():
-                by_link[link][f"query_filename{idx}"] = False
+            agg.update(no_flags)
+            pairs_by_link[link] = set()
+            positions_by_link[link] = set()
+            missing_by_link[link] = list(_MERGE_SCALAR_KEYS)
 
-        agg = by_link[link]
         # merge positions together with map_files to preserve encounter order and alignment
         pos = r.get("position")
         map_name = r.get("map_file")
-        sv = r.get("search_volume")
-        if pd.notna(pos):
+        if type(pos) is int or pd.notna(pos):
             try:
                 p = int(pos)
                 if isinstance(map_name, str) and map_name:
-                    existing_pairs = set(zip(agg["map_files"], agg["position"]))
-                    if (map_name, p) not in existing_pairs:
+                    pairs = pairs_by_link[link]
+                    if (map_name, p) not in pairs:
+                        pairs.add((map_name, p))
+                        positions_by_link[link].add(p)
                         agg["position"].append(p)
                         agg["map_files"].append(map_name)
-                        agg["search_volume"].append(sv)
+                        agg["search_volume"].append(r.get("search_volume"))
                 else:
                     # If no map_file, still append position (rare), but alignment may be off
                     # We skip appending search_volume here to preserve alignment with map_files
-                    if p not in agg["position"]:
+                    positions = positions_by_link[link]
+                    if p not in positions:
+                        positions.add(p)
                         agg["position"].append(p)
             except Exception:
                 pass
@@ -181,65 +300,809 @@ def merge_rows_by_listing(rows: List[Dict[str, Any]], source_flags: Dict[str, in
         if isinstance(cats, list) and cats and not agg["categories"]:
             agg["categories"] = cats
 
-        # scalar fields: keep first non-empty (search_volume handled as per-map list above)
-        for key in ("name", "website", "phone", "address", "reviews_count", "rating", "source_file"):
-            agg[key] = first_non_empty(agg.get(key), r.get(key))
+        # scalar fields: keep first non-empty, so only the ones still missing are looked at
+        missing = missing_by_link[link]
+        if missing:
+            still_missing = []
+            for key in missing:
+                v = r.get(key)
+                if _is_empty(v):
+                    still_missing.append(key)
+                else:
+                    agg[key] = v
+            missing_by_link[link] = still_missing
 
         # mark source flag using the MAP filename, not source_file
-        if isinstance(map_name, str) and map_name in source_flags:
-            agg[f"query_filename{source_flags[map_name]}"] = True
+        if isinstance(map_name, str) and map_name in flag_keys:
+            agg[flag_keys[map_name]] = True
 
     # DO NOT sort positions; keep encounter order to align with map_files
 
     return list(by_link.values())
 
 
-def update_input_files_status(input_paths: List[Path], included_links: set[str]) -> None:
+# Merge engines: "rows" folds dict records in Python, "groupby" does the same merge on columns
+DEDUPE_ENGINES = ("rows", "groupby")
+
+
+def _valid_link_mask(links: pd.Series) -> np.ndarray:
+    # Same rule as the rows engine: a str with something besides whitespace
+    return links.map(lambda v: isinstance(v, str) and bool(v.strip())).to_numpy(dtype=bool)
+
+
+def _position_ints(series: pd.Series) -> pd.Series:
+    """int(position) per row as nullable Int64; NA where the rows engine would skip the row."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        num = series.astype("float64")
+        ok = np.isfinite(num.to_numpy())
+        return pd.Series(np.trunc(num.where(ok)), index=series.index).astype("Int64")
+
+    def to_int(v):
+        try:
+            return int(v) if pd.notna(v) else None
+        except Exception:
+            return None
+
+    return series.map(to_int).astype("Int64")
+
+
+def _empty_mask(series: pd.Series) -> np.ndarray:
+    """True where merge_rows_by_listing treats a value as empty (missing or blank string)."""
+    mask = series.isna().to_numpy(dtype=bool)
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        try:
+            blank = series.str.strip().eq("").fillna(False).to_numpy(dtype=bool)
+            mask = mask | blank
+        except AttributeError:
+            # .str refuses columns without any strings
+            pass
+    return mask
+
+
+def _first_per_group(values: np.ndarray, codes: np.ndarray, take: np.ndarray, n_groups: int) -> np.ndarray:
+    """Object array with the first values[take] of every group code, None where a group has none."""
+    out = np.full(n_groups, None, dtype=object)
+    sub_codes = codes[take]
+    # np.unique(return_index=True) reports the first occurrence, i.e. the earliest row
+    groups, first = np.unique(sub_codes, return_index=True)
+    out[groups] = values[take][first]
+    return out
+
+
+def _lists_per_group(values: np.ndarray, codes: np.ndarray, n_groups: int) -> List[list]:
+    """Python lists of values per group code 0..n_groups-1, each in row order."""
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=n_groups)
+    return [chunk.tolist() for chunk in np.split(values[order], np.cumsum(counts)[:-1])]
+
+
+def merge_frame_by_listing(df: pd.DataFrame, source_flags: Dict[str, int]) -> pd.DataFrame:
+    """Column-wise twin of merge_rows_by_listing; returns the same rows as a DataFrame.
+
+    Rows are grouped by listing_link in order of first appearance (pd.factorize), then:
+    - position/map_files/search_volume: kept rows of every group as ordered lists; a row
+      with a map file is kept if its (map_file, position) pair is new for the listing, a
+      row without one if its position is
+    - scalar fields and categories: first non-empty value of the group
+    - query_filename{i}: a listing x map file pivot of the rows' map files
+    """
+    if df.empty:
+        return pd.DataFrame([])
+    valid = _valid_link_mask(df["listing_link"])
+    df = df[valid]
+    if df.empty:
+        return pd.DataFrame([])
+    codes, links = pd.factorize(df["listing_link"], sort=False)
+    n_groups = len(links)
+
+    def column(name: str) -> pd.Series:
+        return df[name] if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+    # Positions: which rows the rows engine would append
+    pos = _position_ints(column("position"))
+    maps = column("map_file")
+    has_map = maps.map(lambda v: isinstance(v, str) and bool(v)).to_numpy(dtype=bool)
+    has_pos = pos.notna().to_numpy(dtype=bool)
+    keys = pd.DataFrame({"code": codes, "map": maps.where(has_map).to_numpy(dtype=object), "pos": pos.to_numpy()})
+    # A row without a map file only adds a position no earlier row of its listing had
+    new_pair = ~keys.duplicated(["code", "map", "pos"]).to_numpy()
+    new_pos = ~keys.duplicated(["code", "pos"]).to_numpy()
+    pair_rows = has_pos & has_map & new_pair
+    pos_rows = has_pos & ((has_map & new_pair) | (~has_map & new_pos))
+
+    pos_values = pos.to_numpy(dtype="int64", na_value=0)
+    out: Dict[str, Any] = {"listing_link": links.tolist()}
+    out["position"] = _lists_per_group(pos_values[pos_rows], codes[pos_rows], n_groups)
+
+    for key in ("name", "categories", "website", "phone", "address", "reviews_count", "rating", "source_file"):
+        if key == "categories":
+            cats = column(key)
+            take = cats.map(lambda c: isinstance(c, list) and len(c) > 0).to_numpy(dtype=bool)
+            firsts = _first_per_group(cats.to_numpy(dtype=object), codes, take, n_groups)
+            out[key] = [c if c is not None else [] for c in firsts]
+            continue
+        series = column(key)
+        out[key] = _first_per_group(series.astype(object).to_numpy(), codes, ~_empty_mask(series), n_groups).tolist()
+
+    # .astype(object) boxes numpy scalars into Python ones, as to_dict(orient="records") does
+    out["search_volume"] = _lists_per_group(
+        column("search_volume").astype(object).to_numpy()[pair_rows], codes[pair_rows], n_groups
+    )
+    out["map_files"] = _lists_per_group(maps.to_numpy(dtype=object)[pair_rows], codes[pair_rows], n_groups)
+    out["status"] = ["pending"] * n_groups
+
+    # Pivot: flags[listing, map file] = the listing has a row from that map file
+    flag_of = {fname: j for j, fname in enumerate(source_flags)}
+    flag_col = maps.map(lambda v: flag_of.get(v, -1) if isinstance(v, str) else -1).to_numpy(dtype="int64")
+    hit = flag_col >= 0
+    flags = np.zeros((n_groups, len(flag_of)), dtype=bool)
+    flags[codes[hit], flag_col[hit]] = True
+    for fname, j in flag_of.items():
+        out[f"query_filename{source_flags[fname]}"] = flags[:, j].tolist()
+
+    return pd.DataFrame(out)
+
+
+def _set_statuses(
+    df: pd.DataFrame, included_links: Optional[set[str]] = None, included_hashes: Optional[np.ndarray] = None
+) -> pd.DataFrame:
+    # Ensure status column exists and is string-typed
+    if "status" not in df.columns:
+        df["status"] = "pending"
+    df["status"] = df["status"].astype(str)
+    df.loc[df["status"].isna() | (df["status"].str.strip() == "") | (df["status"].str.lower() == "nan"), "status"] = "pending"
+
+    # Normalize listing_link for robust matching
+    series = df.get("listing_link")
+    if series is None:
+        # Nothing to match on in this file
+        return df
+
+    norm_links = series.astype(str).str.strip()
+    valid = norm_links.notna() & (norm_links != "") & (norm_links.str.lower() != "nan")
+    if included_hashes is not None:
+        # Out-of-core runs pass the sorted link hashes (_link_hashes) instead of the links themselves
+        in_combined = valid & np.isin(_link_hashes(series), included_hashes)
+    else:
+        in_combined = valid & norm_links.isin(included_links or set())
+
+    # Set 'success' where included; everything else -> 'pending'
+    df.loc[in_combined, "status"] = "success"
+    df.loc[~in_combined, "status"] = "pending"
+    return df
+
+
+def _status_job(path: Path, included_links: Optional[set[str]], df: Optional[pd.DataFrame] = None) -> Optional[str]:
+    # Reads the file here unless the caller kept it whole, so only the files in flight are in memory
+    if df is None:
+        try:
+            df = read_frame(path)
+        except Exception as e:
+            return f"[!] Failed to read {path.name} for status update: {e}"
+    try:
+        write_frame(path, _set_statuses(df, included_links))
+    except Exception as e:
+        return f"[!] Failed to write updated statuses for {path.name}: {e}"
+    return None
+
+
+def update_input_files_status(
+    input_paths: List[Path],
+    included_links: Optional[set[str]],
+    frames: Optional[List[Optional[pd.DataFrame]]] = None,
+    jobs: int = 1,
+) -> None:
     """Update status column in each input map file deterministically.
 
     - Only consider non-empty listing_link values for matching.
     - Mark rows whose normalized listing_link is in included_links as 'success'.
     - Set all other rows to 'pending'.
     - Force status to be string values to avoid random Excel coercions.
+
+    frames[i], when given, is input_paths[i] as already read in full (all rows and
+    columns); files without one are read by the job that writes them. Files are
+    written concurrently (jobs > 1: worker processes, otherwise a few threads), each
+    one atomically through a temp file, so an interrupted run leaves every map file
+    either old or new.
     """
-    for p in input_paths:
+    if not input_paths:
+        return
+    frames = frames or [None] * len(input_paths)
+    if len(input_paths) == 1:
+        # Nothing to overlap; a pool thread would also grow a malloc arena of its own
+        error = _status_job(input_paths[0], included_links, frames[0])
+        if error:
+            safe_print(error)
+        return
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=min(jobs, len(input_paths)))
+    else:
+        # openpyxl holds the GIL, but parquet writes and the file I/O do not
+        pool = ThreadPoolExecutor(max_workers=min(4, len(input_paths)))
+    with pool:
+        for error in pool.map(_status_job, input_paths, [included_links] * len(input_paths), frames):
+            if error:
+                safe_print(error)
+
+
+_FOLD_COLUMNS = ("position", "name", "categories", "website", "phone", "address", "reviews_count", "rating", "source_file", "search_volume", "map_files")
+_LIST_COLUMNS = ("position", "search_volume", "map_files")
+_NAN_TOKEN_RE = re.compile(r"(?<![\w'\"])nan(?![\w'\"])")
+
+
+def _index_path(combined_path: Path) -> Path:
+    """Sidecar listing index of a combined file: data/combined/.index/<combined name>.json"""
+    return combined_path.parent / ".index" / f"{combined_path.name}.json"
+
+
+def _list_cell(val) -> list:
+    # Lists come back as lists from parquet and as their repr from xlsx
+    if isinstance(val, (list, tuple)):
+        return list(val)
+    if isinstance(val, str) and val.strip():
         try:
-            df = pd.read_excel(p)
-        except Exception as e:
-            safe_print(f"[!] Failed to read {p.name} for status update: {e}")
+            # A missing search volume is written as a bare nan, which literal_eval rejects
+            text, nans = _NAN_TOKEN_RE.subn("None", val.strip())
+            parsed = _ast.literal_eval(text)
+            if not isinstance(parsed, (list, tuple)):
+                return []
+            return [float("nan") if nans and v is None else v for v in parsed]
+        except Exception:
+            return []
+    return []
+
+
+def _listing_rows(df: pd.DataFrame) -> Dict[str, int]:
+    """listing_link (and any link folded into it by --resolve) -> row number."""
+    rows: Dict[str, int] = {}
+    merged = df["merged_links"].tolist() if "merged_links" in df.columns else [None] * len(df)
+    for i, (link, others) in enumerate(zip(df["listing_link"].tolist(), merged)):
+        if isinstance(link, str) and link.strip():
+            rows.setdefault(link, i)
+        for other in _list_cell(others):
+            if isinstance(other, str) and other.strip():
+                rows.setdefault(other, i)
+    return rows
+
+
+def _map_entry(path: Path, flag: int) -> Dict[str, Any]:
+    # Taken after the status update, so it matches the map file as it is left on disk
+    entry: Dict[str, Any] = {"flag": int(flag)}
+    try:
+        st = path.stat()
+        entry.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+    except OSError:
+        pass
+    return entry
+
+
+def save_listing_index(combined_path: Path, maps: Dict[str, Dict[str, Any]], df: pd.DataFrame) -> None:
+    """Record which map files (flag number, size, mtime) and which listings make up a
+    combined file, for later --append-to runs."""
+    path = _index_path(combined_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        _json.dump({"map_files": maps, "listings": _listing_rows(df)}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _flags_from_name(combined_path: Path, df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    # No index yet (combined written before indexes existed): its name lists the map stems in flag order
+    seen = {m for cell in df.get("map_files", pd.Series(dtype=object)).tolist() for m in _list_cell(cell)}
+    by_stem = {m.rsplit(".", 1)[0]: m for m in seen}
+    maps: Dict[str, Dict[str, Any]] = {}
+    for i, stem in enumerate(combined_path.stem.split("__")):
+        if stem in by_stem and f"query_filename{i + 1}" in df.columns:
+            maps[by_stem[stem]] = {"flag": i + 1}
+    return maps
+
+
+def load_listing_index(combined_path: Path, df: pd.DataFrame):
+    """(map files, listing -> row) of a combined file; rebuilt from df when missing or stale."""
+    try:
+        with open(_index_path(combined_path), "r", encoding="utf-8") as f:
+            data = _json.load(f)
+        maps, rows = data["map_files"], data["listings"]
+    except Exception:
+        safe_print(f"[i] No listing index for {combined_path.name}; rebuilding it from the file")
+        return _flags_from_name(combined_path, df), _listing_rows(df)
+    if rows and max(rows.values()) >= len(df):
+        # Rows were removed from the file since; row numbers are only kept for unchanged files
+        rows = _listing_rows(df)
+    return maps, rows
+
+
+def _row_has_link(df: pd.DataFrame, idx: int, link: str) -> bool:
+    if df.at[idx, "listing_link"] == link:
+        return True
+    return "merged_links" in df.columns and link in _list_cell(df.at[idx, "merged_links"])
+
+
+def _map_unchanged(path: Path, entry: Optional[Dict[str, Any]]) -> bool:
+    if not entry or "mtime_ns" not in entry:
+        return False
+    try:
+        st = path.stat()
+    except OSError:
+        return False
+    return st.st_mtime_ns == entry["mtime_ns"] and st.st_size == entry["size"]
+
+
+def _retract_maps(combined: pd.DataFrame, flags: Dict[str, int]) -> List[int]:
+    """Take the given map files (name -> flag) out of combined: their (map file, position,
+    search volume) entries and flag columns. Returns the rows that lost entries."""
+    for flag in flags.values():
+        if f"query_filename{flag}" in combined.columns:
+            combined[f"query_filename{flag}"] = False
+    touched: List[int] = []
+    if "map_files" not in combined.columns:
+        return touched
+    for idx, cell in combined["map_files"].items():
+        maps = _list_cell(cell)
+        keep = [k for k, m in enumerate(maps) if m not in flags]
+        if len(keep) == len(maps):
             continue
-        # Ensure status column exists and is string-typed
-        if "status" not in df.columns:
-            df["status"] = "pending"
-        df["status"] = df["status"].astype(str)
-        df.loc[df["status"].isna() | (df["status"].str.strip() == "") | (df["status"].str.lower() == "nan"), "status"] = "pending"
-
-        # Normalize listing_link for robust matching
-        series = df.get("listing_link")
-        if series is None:
-            # Nothing to match on in this file
-            try:
-                p.parent.mkdir(parents=True, exist_ok=True)
-                df.to_excel(p, index=False)
-            except Exception as e:
-                safe_print(f"[!] Failed to write updated statuses for {p.name}: {e}")
+        combined.at[idx, "map_files"] = [maps[k] for k in keep]
+        for col in ("position", "search_volume"):
+            if col in combined.columns:
+                values = _list_cell(combined.at[idx, col])
+                combined.at[idx, col] = [values[k] for k in keep if k < len(values)] + values[len(maps):]
+        touched.append(idx)
+    return touched
+
+
+def _sort_by_map_order(combined: pd.DataFrame, idx: int, flag_of: Dict[str, int]) -> None:
+    # A full run lists a listing's entries in map-file order (the order of the flags)
+    maps = _list_cell(combined.at[idx, "map_files"])
+    positions = _list_cell(combined.at[idx, "position"])
+    volumes = _list_cell(combined.at[idx, "search_volume"]) if "search_volume" in combined.columns else []
+    if len(positions) != len(maps):
+        return
+    order = sorted(range(len(maps)), key=lambda k: flag_of.get(maps[k], 0))
+    if order == list(range(len(maps))):
+        return
+    combined.at[idx, "map_files"] = [maps[k] for k in order]
+    combined.at[idx, "position"] = [positions[k] for k in order]
+    if len(volumes) == len(maps):
+        combined.at[idx, "search_volume"] = [volumes[k] for k in order]
+
+
+def _store_statuses(store: LeadsStore, paths: List[Path], included_links: Iterable[str]) -> None:
+    """Set the membership statuses of the given map files in the store, adding the map
+    files scraped without --db first (they have no memberships to update)."""
+    registered = store.register_map_files(paths)
+    if registered:
+        safe_print(f"[i] Added {registered} map file(s) scraped without --db to {store.path.name}")
+    store.set_membership_statuses([p.name for p in paths], set(included_links))
+
+
+def run_append(
+    input_paths: List[Path],
+    append_to: str,
+    min_rating: float = 4.2,
+    export: Optional[str] = None,
+    use_db: bool = False,
+    engine: str = "rows",
+    jobs: int = 1,
+) -> int:
+    """Merge only new or changed map files into an existing combined file.
+
+    Existing rows keep their status, evaluation columns and positions; they only gain
+    new (map file, position) pairs, empty fields and flags. A changed map file first
+    loses its earlier pairs and flag, so it is counted once. New listings are appended
+    as pending. Map files already merged and unchanged since are not read at all, and
+    only the new/changed map files get their status column updated.
+    """
+    phases = PhaseTimings()
+    out_path = COMBINED_DIR / append_to
+    combined = read_frame(out_path)
+    known_maps, listing_rows = load_listing_index(out_path, combined)
+
+    todo = [p for p in input_paths if not _map_unchanged(p, known_maps.get(p.name))]
+    skipped = len(input_paths) - len(todo)
+    if not todo:
+        safe_print(f"[i] {append_to} already has every given map file merged; nothing to do")
+        return 0
+
+    # Known map files keep their flag column; new ones get the next free number
+    existing_flags = [int(c[len("query_filename"):]) for c in combined.columns if c.startswith("query_filename") and c[len("query_filename"):].isdigit()]
+    next_flag = max(existing_flags + [m["flag"] for m in known_maps.values()] + [0]) + 1
+    source_flags: Dict[str, int] = {}
+    for p in todo:
+        if p.name in known_maps:
+            source_flags[p.name] = known_maps[p.name]["flag"]
+        else:
+            source_flags[p.name] = next_flag
+            next_flag += 1
+
+    frames, total_before, full_frames = load_map_frames(todo, min_rating, jobs, keep_full=not use_db and _keep_full_frames(todo))
+    new_rows_df = pd.concat(frames, ignore_index=True)
+    phases.lap("load")
+    if engine == "groupby":
+        merged = merge_frame_by_listing(new_rows_df, source_flags).to_dict(orient="records")
+    else:
+        merged = merge_rows_by_listing(new_rows_df.to_dict(orient="records"), source_flags)
+
+    flag_cols = [f"query_filename{i}" for i in source_flags.values()]
+    for col in flag_cols:
+        if col not in combined.columns:
+            combined[col] = False
+    for col in _FOLD_COLUMNS:
+        if col in combined.columns and combined[col].dtype != object:
+            # Cells may now receive lists or mixed values
+            combined[col] = combined[col].astype(object)
+
+    # A changed map file was folded in before: take its old entries and flag out first,
+    # so its listings count once, with its current positions, as in a full run
+    changed = {name: flag for name, flag in source_flags.items() if name in known_maps}
+    touched = set(_retract_maps(combined, changed)) if changed else set()
+
+    appended: List[Dict[str, Any]] = []
+    updated = 0
+    for agg in merged:
+        link = agg["listing_link"]
+        idx = listing_rows.get(link)
+        if idx is not None and not _row_has_link(combined, idx, link):
+            # The file was edited since the index was saved
+            listing_rows = _listing_rows(combined)
+            idx = listing_rows.get(link)
+        if idx is None:
+            listing_rows[link] = len(combined) + len(appended)
+            appended.append(agg)
             continue
+        cur = {col: combined.at[idx, col] for col in _FOLD_COLUMNS + tuple(flag_cols) if col in combined.columns}
+        for col in _LIST_COLUMNS:
+            cur[col] = _list_cell(cur.get(col))
+        cur["categories"] = _parse_categories_value(cur.get("categories"))
+        if fold_listing(cur, agg, flag_cols):
+            for col, value in cur.items():
+                combined.at[idx, col] = value
+            updated += 1
+            touched.add(idx)
+    if changed:
+        flag_of = {name: entry["flag"] for name, entry in known_maps.items()}
+        flag_of.update(source_flags)
+        for idx in touched:
+            _sort_by_map_order(combined, idx, flag_of)
+
+    if appended:
+        new_df = pd.DataFrame(appended)
+        for col in combined.columns:
+            if col.startswith("query_filename") and col not in new_df.columns:
+                new_df[col] = False
+        combined = pd.concat([combined, new_df[[c for c in new_df.columns if c in combined.columns]]], ignore_index=True)
+    phases.lap("merge")
 
-        norm_links = series.astype(str).str.strip()
-        valid = norm_links.notna() & (norm_links != "") & (norm_links.str.lower() != "nan")
-        in_combined = valid & norm_links.isin(included_links)
+    write_frame(out_path, combined)
+    safe_print(f"[✓] Combined updated: {out_path}")
+    if export == "xlsx" and out_path.suffix != ".xlsx":
+        safe_print(f"[✓] Exported: {export_xlsx(out_path)}")
+    phases.lap("write")
 
-        # Set 'success' where included; everything else -> 'pending'
-        df.loc[in_combined, "status"] = "success"
-        df.loc[~in_combined, "status"] = "pending"
+    included_links = set(k for k in listing_rows if k.strip())
+    if use_db:
+        store = LeadsStore()
         try:
-            p.parent.mkdir(parents=True, exist_ok=True)
-            df.to_excel(p, index=False)
-        except Exception as e:
-            safe_print(f"[!] Failed to write updated statuses for {p.name}: {e}")
+            _store_statuses(store, todo, included_links)
+            store.add_combined_rows(append_to, combined.to_dict(orient="records"))
+        finally:
+            store.close()
+        safe_print(f"[✓] Updated status of {len(todo)} source files in {store.path.name}")
+    else:
+        update_input_files_status(todo, included_links, full_frames, jobs)
+        safe_print(f"[✓] Updated status in {len(todo)} source files")
+
+    maps = dict(known_maps)
+    maps.update({p.name: _map_entry(p, source_flags[p.name]) for p in todo})
+    save_listing_index(out_path, maps, combined)
+    phases.lap("status")
+    safe_print(f"[i] Map files merged: {len(todo)} (unchanged, skipped: {skipped})")
+    safe_print(f"[i] Rows read: {total_before}, after rating filter: {len(new_rows_df)}")
+    safe_print(f"[i] Listings appended: {len(appended)}, existing listings updated: {updated}")
+    safe_print(f"[i] Rows in combined: {len(combined)}")
+    safe_print(f"[i] Wall time: {phases.describe()}")
+    return 0
+
+
+def build_combined_filename(file_names: List[str], storage_format: Optional[str] = None) -> str:
+    """Output filename (short, Windows-safe)."""
+    # Determine extension from --format, else from the first file
+    ext = storage_format or (file_names[0].split(".")[-1] if "." in file_names[0] else "xlsx")
+    joined = "__".join([fn.rsplit(".", 1)[0] for fn in file_names])
+    # If too long, fall back to hashed name to avoid MAX_PATH issues on Windows
+    if len(joined) > 120:
+        digest = hashlib.md5("__".join(file_names).encode("utf-8")).hexdigest()[:10]
+        return f"combined_{len(file_names)}_{digest}.{ext}"
+    return f"{joined}.{ext}"
+
 
+# Out-of-core mode (--max-memory-mb). Rows are hash-partitioned by listing_link into
+# spill files, one map file at a time, and the in-memory size of each partition is measured
+# as its rows are spilled. Each partition is then merged on its own; one whose merge would
+# not fit in the cap is first split again on further digits of the hash. The partitions'
+# results are k-way merged back into first-appearance order while the combined file is
+# streamed out, one row per partition in memory (in passes of at most _MERGE_FAN_IN
+# partitions). Parquet map files are read and their statuses rewritten in batches of rows
+# (xlsx ones whole), and freed memory is handed back to the OS after every map file and
+# partition, so the process stays within the cap above its size after imports.
+_SPILL_EXPANSION = 12  # rough in-memory bytes of loaded rows per byte on disk; sets the first partition count
+# Peak bytes of merging a partition per (measured) byte of its rows, by engine: the rows
+# engine holds the frame, its records and the merged listings at once
+_MERGE_EXPANSION = {"rows": 7, "groupby": 3}
+_MERGE_FAN_IN = 64
+_SPILL_BATCH_ROWS = 1000  # rows of a parquet map file read (or rewritten) at a time
+# Below this, reading and writing the files (library buffers, allocator arenas) would not
+# leave room in the cap for any rows
+MIN_MEMORY_MB = 64
+# Combined columns whose shape differs from a map file's; reviews_count stays int64 like
+# the in-memory run writes it (read back as float only where it has nulls, as there)
+_COMBINED_ARROW_TYPES = {
+    "position": "list<int64>",
+    "search_volume": "list<double>",
+    "map_files": "list<string>",
+}
 
-def run(files_arg: str, min_rating: float = 4.2) -> int:
+
+def _link_hashes(links: pd.Series) -> np.ndarray:
+    """Stable 64-bit hash of each stripped listing_link (the same in every run and process)."""
+    return pd.util.hash_array(links.astype(str).str.strip().to_numpy(dtype=object))
+
+
+def _append_pickle(path: Path, obj: Any) -> None:
+    with open(path, "ab") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_pickles(path: Path) -> Iterator[Any]:
+    if not path.exists():
+        return
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _release_memory() -> None:
+    """Hand freed heap pages back to the OS, so the process size follows the live data."""
+    gc.collect()
+    if "pyarrow" in sys.modules:
+        sys.modules["pyarrow"].default_memory_pool().release_unused()
+    try:
+        # glibc keeps freed pages of its arenas mapped; elsewhere this is a no-op
+        ctypes.CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class _HashSpill:
+    """Spill files of rows split by a digit of their link hash, (hash // divisor) % fan.
+
+    Rows are buffered until the buffers hold `budget` bytes, so each spill file gets chunks
+    of many rows, in the order they were added. sizes[k] is the in-memory size of the rows
+    of paths[k], measured as they are added."""
+
+    def __init__(self, paths: List[Path], divisor: int, budget: float):
+        self.paths = paths
+        self.divisor = divisor
+        self.budget = budget
+        self.sizes = [0] * len(paths)
+        self._buffers: List[List[pd.DataFrame]] = [[] for _ in paths]
+        self._buffered = 0
+
+    def add(self, df: pd.DataFrame) -> None:
+        digits = (_link_hashes(df["listing_link"]) // np.uint64(self.divisor)) % np.uint64(len(self.paths))
+        # Measured once per frame (deep sizes walk every cell) and shared out by rows
+        row_bytes = df.memory_usage(deep=True).sum() / max(1, len(df))
+        for k, chunk in df.groupby(digits, sort=False):
+            size = int(len(chunk) * row_bytes)
+            self._buffers[int(k)].append(chunk)
+            self.sizes[int(k)] += size
+            self._buffered += size
+        if self._buffered > self.budget:
+            self.flush()
+
+    def flush(self) -> None:
+        # One buffer at a time, so only one is ever held twice (as chunks and concatenated)
+        for k, path in enumerate(self.paths):
+            if self._buffers[k]:
+                chunk = pd.concat(self._buffers[k], ignore_index=True)
+                self._buffers[k] = []
+                _append_pickle(path, chunk)
+                del chunk
+        self._buffered = 0
+
+
+def _reduce_streams(paths: List[Path], spill_dir: Path) -> List[Path]:
+    """Merge spill files of _first-ordered rows in passes until at most _MERGE_FAN_IN are left."""
+    paths = list(paths)
+    passes = 0
+    while len(paths) > _MERGE_FAN_IN:
+        group, paths = paths[:_MERGE_FAN_IN], paths[_MERGE_FAN_IN:]
+        out = spill_dir / f"pass-{passes}.pkl"
+        passes += 1
+        with open(out, "wb") as f:
+            for row in heapq.merge(*(_read_pickles(g) for g in group), key=lambda r: r["_first"]):
+                pickle.dump(row, f, protocol=pickle.HIGHEST_PROTOCOL)
+        for g in group:
+            g.unlink()
+        paths.append(out)
+    return paths
+
+
+def run_external(
+    files: List[str],
+    input_paths: List[Path],
+    out_name: str,
+    max_memory_mb: float,
+    min_rating: float = 4.2,
+    export: Optional[str] = None,
+    use_db: bool = False,
+    engine: str = "rows",
+) -> int:
+    """deduplicate.run() for corpora that do not fit in memory; same combined rows and order."""
+    phases = PhaseTimings()
+    source_flags = {name: i + 1 for i, name in enumerate(files)}
+    flag_cols = [f"query_filename{i + 1}" for i in range(len(files))]
+    columns = [
+        "listing_link",
+        "position",
+        "name",
+        "categories",
+        "website",
+        "phone",
+        "address",
+        "reviews_count",
+        "rating",
+        "source_file",
+        "search_volume",
+        "map_files",
+        "status",
+    ] + flag_cols
+
+    on_disk = sum(p.stat().st_size for p in input_paths)
+    cap_bytes = max_memory_mb * 1024 * 1024
+    n_parts = max(1, math.ceil(on_disk * _SPILL_EXPANSION / cap_bytes))
+    # Largest measured partition (rows in memory) whose merge fits in half the cap, and the
+    # rows buffered before a spill; the rest is headroom for what the allocator keeps
+    part_budget = cap_bytes / 2 / _MERGE_EXPANSION[engine]
+    spill_budget = cap_bytes / 8
+    COMBINED_DIR.mkdir(parents=True, exist_ok=True)
+    # Next to the output, so spilling needs no space on another disk
+    spill_dir = Path(tempfile.mkdtemp(prefix=".dedupe-spill-", dir=COMBINED_DIR))
+    try:
+        total_before = total_after_rating = valid_count = 0
+        seq = 0
+        spill = _HashSpill([spill_dir / f"rows-{k}.pkl" for k in range(n_parts)], 1, spill_budget)
+        for path in input_paths:
+            for df, before in iter_map_rows(path, min_rating, _SPILL_BATCH_ROWS):
+                total_before += before
+                total_after_rating += len(df)
+                df = df.drop(columns=["status"], errors="ignore")
+                # Global row order, to put the listings back in first-appearance order at the end
+                df["_seq"] = np.arange(seq, seq + len(df))
+                seq += len(df)
+                df = df[_valid_link_mask(df["listing_link"])]
+                valid_count += len(df)
+                spill.add(df)
+                del df
+            _release_memory()
+        spill.flush()
+        phases.lap("partition")
+
+        included: List[np.ndarray] = []
+        merged_paths: List[Path] = []
+        # (spill file, its measured size, divisor): the file holds the rows whose link hash
+        # has one value modulo divisor, so it splits on the next digit, hash // divisor
+        pending = [(path, size, n_parts) for path, size in zip(spill.paths, spill.sizes) if size]
+        next_id = n_parts
+        splits = 0
+        while pending:
+            rows_path, size, divisor = pending.pop()
+            fan = math.ceil(size / part_budget)
+            if fan > 1 and divisor * fan < 2 ** 64:
+                sub = _HashSpill([spill_dir / f"rows-{next_id + i}.pkl" for i in range(fan)], divisor, spill_budget)
+                next_id += fan
+                # Chunks were appended in global row order, and each split keeps it
+                for chunk in _read_pickles(rows_path):
+                    sub.add(chunk)
+                    del chunk
+                sub.flush()
+                rows_path.unlink()
+                filled = [i for i in range(fan) if sub.sizes[i]]
+                if len(filled) > 1:
+                    splits += 1
+                    pending.extend((sub.paths[i], sub.sizes[i], divisor * fan) for i in filled)
+                    continue
+                # Every row has the same next digit (one listing, say): merge it as it is
+                rows_path = sub.paths[filled[0]]
+            part = pd.concat(list(_read_pickles(rows_path)), ignore_index=True)
+            if engine == "groupby":
+                merged = merge_frame_by_listing(part, source_flags).to_dict(orient="records")
+            else:
+                merged = merge_rows_by_listing(part.to_dict(orient="records"), source_flags)
+            # Listings come out in first-appearance order, i.e. by increasing first _seq
+            firsts = part.drop_duplicates("listing_link")["_seq"].tolist()
+            merged_path = spill_dir / f"merged-{len(merged_paths)}.pkl"
+            with open(merged_path, "wb") as f:
+                for row, first in zip(merged, firsts):
+                    row["_first"] = first
+                    pickle.dump(row, f, protocol=pickle.HIGHEST_PROTOCOL)
+            merged_paths.append(merged_path)
+            included.append(_link_hashes(pd.Series([r["listing_link"] for r in merged], dtype=object)))
+            del part, merged, firsts
+            rows_path.unlink()
+            _release_memory()
+        included_hashes = np.unique(np.concatenate(included)) if included else np.array([], dtype=np.uint64)
+        del included
+        n_merged = len(merged_paths)
+        merged_paths = _reduce_streams(merged_paths, spill_dir)
+        phases.lap("merge")
+
+        def combined_rows() -> Iterator[Dict[str, Any]]:
+            return heapq.merge(*(_read_pickles(m) for m in merged_paths), key=lambda r: r["_first"])
+
+        out_path = COMBINED_DIR / out_name
+        types = {**_COMBINED_ARROW_TYPES, **{c: "bool" for c in flag_cols}}
+        written = write_map_results(out_path, combined_rows(), columns, types)
+        # A listing index of an earlier in-memory run would describe other rows
+        _index_path(out_path).unlink(missing_ok=True)
+        safe_print(f"[✓] Combined written: {out_path}")
+        if export == "xlsx" and out_path.suffix != ".xlsx":
+            safe_print(f"[✓] Exported: {export_xlsx(out_path)}")
+        phases.lap("write")
+
+        if use_db:
+            store = LeadsStore()
+            try:
+                links = (str(r["listing_link"]).strip() for r in combined_rows())
+                _store_statuses(store, input_paths, links)
+                store.add_combined_rows(out_name, ({c: r.get(c) for c in columns} for r in combined_rows()))
+            finally:
+                store.close()
+            safe_print(f"[✓] Updated status of {len(input_paths)} source files in {store.path.name}")
+        else:
+            # One batch of one map file in memory at a time
+            for p in input_paths:
+                try:
+                    rewrite_frame(p, lambda df: _set_statuses(df, included_hashes=included_hashes), _SPILL_BATCH_ROWS)
+                except Exception as e:
+                    safe_print(f"[!] Failed to write updated statuses for {p.name}: {e}")
+                _release_memory()
+            safe_print(f"[✓] Updated status in {len(input_paths)} source files")
+        phases.lap("status")
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    safe_print(f"[i] Rows before: {total_before}")
+    safe_print(f"[i] Removed by rating (< {min_rating}): {total_before - total_after_rating}")
+    safe_print(f"[i] Removed by deduplication: {valid_count - len(included_hashes)}")
+    safe_print(f"[i] Removed due to missing listing_link: {total_after_rating - valid_count}")
+    safe_print(f"[i] Rows in combined (added to target): {written}")
+    safe_print(
+        f"[i] Out-of-core: {n_parts} partition(s), {splits} split again, {n_merged} merged"
+        f" for a {max_memory_mb:g} MB cap"
+    )
+    safe_print(f"[i] Wall time: {phases.describe()}")
+    return 0
+
+
+def run(
+    files_arg: str,
+    min_rating: float = 4.2,
+    storage_format: Optional[str] = None,
+    export: Optional[str] = None,
+    use_db: bool = False,
+    engine: str = "rows",
+    resolve: bool = False,
+    append_to: Optional[str] = None,
+    jobs: int = 1,
+    max_memory_mb: Optional[float] = None,
+) -> int:
+    phases = PhaseTimings()
     files = [f.strip() for f in files_arg.split(",") if f.strip()]
     if not files:
         safe_print("No input files provided. Nothing to do.")
@@ -256,24 +1119,27 @@ def run(files_arg: str, min_rating: float = 4.2) -> int:
     # Assign a stable index for source flags
     source_flags = {name: i + 1 for i, name in enumerate(files)}
 
+    if append_to and (COMBINED_DIR / append_to).exists():
+        if resolve:
+            safe_print("[!] --resolve is not applied with --append-to; new rows are matched by listing_link")
+        return run_append(input_paths, append_to, min_rating, export, use_db, engine, jobs)
+
+    if max_memory_mb:
+        if max_memory_mb < MIN_MEMORY_MB:
+            safe_print(f"[!] --max-memory-mb must be at least {MIN_MEMORY_MB}")
+            return 1
+        if resolve:
+            safe_print("[!] --resolve is not applied with --max-memory-mb")
+        out_name = append_to or build_combined_filename(files, storage_format)
+        return run_external(files, input_paths, out_name, max_memory_mb, min_rating, export, use_db, engine)
+
     # Load and filter
-    frames: List[pd.DataFrame] = []
-    total_before = 0
-    total_after_rating = 0
-    for path in input_paths:
-        df = read_map_file(path)
-        # Preserve original source_file from the map rows if present (e.g., query filename)
-        # Do NOT overwrite it with the map filename. Instead, record the map filename separately.
-        if "source_file" not in df.columns:
-            df["source_file"] = None
-        df["map_file"] = path.name
-        total_before += len(df)
-        # Normalize categories before merging to ensure lists come through
-        if "categories" in df.columns:
-            df["categories"] = _normalize_categories_series(df["categories"])
-        df = filter_min_rating(df, min_rating)
-        total_after_rating += len(df)
-        frames.append(df)
+    # Without the store the map files are rewritten with their statuses; keep them whole for that if they are small
+    frames, total_before, full_frames = load_map_frames(
+        input_paths, min_rating, jobs, keep_full=not use_db and _keep_full_frames(input_paths)
+    )
+    total_after_rating = sum(len(df) for df in frames)
+    phases.lap("load")
 
     if not frames:
         safe_print("No rows after filtering.")
@@ -281,13 +1147,28 @@ def run(files_arg: str, min_rating: float = 4.2) -> int:
 
     all_rows_df = pd.concat(frames, ignore_index=True)
 
-    # Convert rows to dicts for custom merge
-    rows = all_rows_df.to_dict(orient="records")
-    merged = merge_rows_by_listing(rows, source_flags)
+    if engine == "groupby":
+        out_df = merge_frame_by_listing(all_rows_df, source_flags)
+    else:
+        # Convert rows to dicts for custom merge
+        rows = all_rows_df.to_dict(orient="records")
+        out_df = pd.DataFrame(merge_rows_by_listing(rows, source_flags))
+    phases.lap("merge")
+
+    # Input rows are matched by their own link, also when resolution folds it into another listing
+    included_links = set(
+        s for s in out_df["listing_link"].dropna().astype(str).str.strip().tolist()
+        if s and s.lower() != "nan"
+    )
 
     # Build final DataFrame in a consistent column order
     # Include query_filename{i} columns in order of input
     flag_cols = [f"query_filename{i+1}" for i in range(len(files))]
+    resolution_stats = None
+    if resolve:
+        resolved, resolution_stats = resolve_entities(out_df.to_dict(orient="records"), flag_cols)
+        out_df = pd.DataFrame(resolved)
+        phases.lap("resolve")
     base_cols = [
         "listing_link",
         "position",
@@ -304,7 +1185,6 @@ def run(files_arg: str, min_rating: float = 4.2) -> int:
         "status",
     ] + flag_cols
 
-    out_df = pd.DataFrame(merged)
     # add any missing flag columns
     for c in flag_cols:
         if c not in out_df.columns:
@@ -329,58 +1209,123 @@ def run(files_arg: str, min_rating: float = 4.2) -> int:
     removed_by_dedup = int(valid_count - unique_links)
     added_to_target = int(len(out_df))  # should equal unique_links
 
-    # Output filename (short, Windows-safe)
-    def build_combined_filename(file_names: List[str]) -> str:
-        # Determine extension from first file
-        ext = (file_names[0].split(".")[-1] if "." in file_names[0] else "xlsx")
-        joined = "__".join([fn.rsplit(".", 1)[0] for fn in file_names])
-        # If too long, fall back to hashed name to avoid MAX_PATH issues on Windows
-        if len(joined) > 120:
-            digest = hashlib.md5("__".join(file_names).encode("utf-8")).hexdigest()[:10]
-            return f"combined_{len(file_names)}_{digest}.{ext}"
-        return f"{joined}.{ext}"
-
-    out_name = build_combined_filename(files)
+    out_name = append_to or build_combined_filename(files, storage_format)
     out_path = COMBINED_DIR / out_name
-    out_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Write combined
-    out_df.to_excel(out_path, index=False)
+    write_frame(out_path, out_df)
     safe_print(f"[✓] Combined written: {out_path}")
+    if export == "xlsx" and out_path.suffix != ".xlsx":
+        safe_print(f"[✓] Exported: {export_xlsx(out_path)}")
+    phases.lap("write")
 
     # Update input files statuses
-    included_links = set(
-        s for s in out_df["listing_link"].dropna().astype(str).str.strip().tolist()
-        if s and s.lower() != "nan"
-    )
-    update_input_files_status(input_paths, included_links)
-
-    safe_print(f"[✓] Updated status in {len(input_paths)} source files")
+    if use_db:
+        # Single UPDATE per map file instead of rewriting it; the map files become views
+        store = LeadsStore()
+        try:
+            _store_statuses(store, input_paths, included_links)
+            store.add_combined_rows(out_name, out_df.to_dict(orient="records"))
+        finally:
+            store.close()
+        safe_print(f"[✓] Updated status of {len(input_paths)} source files in {store.path.name}")
+    else:
+        update_input_files_status(input_paths, included_links, full_frames, jobs)
+        safe_print(f"[✓] Updated status in {len(input_paths)} source files")
+    # After the status update, so the recorded map file signatures are the final ones
+    save_listing_index(out_path, {p.name: _map_entry(p, source_flags[p.name]) for p in input_paths}, out_df)
+    phases.lap("status")
     safe_print(f"[i] Rows before: {before_total}")
     safe_print(f"[i] Removed by rating (< {min_rating}): {removed_by_rating}")
     safe_print(f"[i] Removed by deduplication: {removed_by_dedup}")
     safe_print(f"[i] Removed due to missing listing_link: {removed_no_link}")
+    if resolution_stats is not None:
+        safe_print(f"[i] Entity resolution: {resolution_stats.describe()}")
     safe_print(f"[i] Rows in combined (added to target): {added_to_target}")
+    safe_print(f"[i] Wall time: {phases.describe()}")
     return 0
 
 
 def main() -> int:
     if not DEBUG:
         parser = argparse.ArgumentParser(description="Deduplicate & merge map files")
-        parser.add_argument("files", type=str, help="Comma-separated list of .xlsx filenames located in ./data/maps/")
+        parser.add_argument("files", type=str, help="Comma-separated list of map filenames (.xlsx or .parquet) located in ./data/maps/")
         parser.add_argument(
             "--min-rating",
             type=float,
             default=4.2,
             help="Minimum rating threshold (inclusive). Rows with lower rating are filtered out.",
         )
+        parser.add_argument(
+            "--format",
+            choices=list(STORAGE_FORMATS),
+            default=None,
+            help="Storage format of the combined file (default: that of the first input file).",
+        )
+        parser.add_argument(
+            "--export",
+            choices=["xlsx"],
+            default=None,
+            help="Also write an xlsx copy of the combined file to data/export/combined/.",
+        )
+        parser.add_argument(
+            "--db",
+            action="store_true",
+            help="Record statuses and the combined rows in data/leads.db instead of rewriting the map files.",
+        )
+        parser.add_argument(
+            "--engine",
+            choices=list(DEDUPE_ENGINES),
+            default="rows",
+            help="Merge engine: rows (record-by-record) or groupby (vectorized, same output).",
+        )
+        parser.add_argument(
+            "--resolve",
+            action="store_true",
+            help="Also merge listings of the same business under different links (CID, phone, domain, name+address).",
+        )
+        parser.add_argument(
+            "--append-to",
+            type=str,
+            default=None,
+            help="Combined file in ./data/combined/ to merge only new or changed map files into (created if missing).",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Worker processes that load and normalize map files (default: 1, 0 = one per CPU).",
+        )
+        parser.add_argument(
+            "--max-memory-mb",
+            type=float,
+            default=None,
+            help=f"Dedupe out of core, staying within this many MB above the process size after imports"
+            f" (at least {MIN_MEMORY_MB}; xlsx map files are read whole, parquet ones in batches).",
+        )
         args = parser.parse_args()
         files = args.files
         min_rating = args.min_rating
+        storage_format = args.format
+        export = args.export
+        use_db = args.db
+        engine = args.engine
+        resolve = args.resolve
+        append_to = args.append_to
+        jobs = args.jobs
+        max_memory_mb = args.max_memory_mb
     else:
         files = "attic_insulation_denver_@39_7400428_-105_0508011_11z.xlsx,insulation_companies_denver_@39_7400428_-105_0508011_11z.xlsx,insulation_denver_colorado_@39_7400428_-105_0508011_11z.xlsx,spray_foam_insulation_denver_@39_7400428_-105_0508011_11z.xlsx"
         min_rating = 4.2
-    return run(files, min_rating)
+        storage_format = None
+        export = None
+        use_db = False
+        engine = "rows"
+        resolve = False
+        append_to = None
+        jobs = 1
+        max_memory_mb = None
+    return run(files, min_rating, storage_format, export, use_db, engine, resolve, append_to, jobs, max_memory_mb)
 
 
 if __name__ == "__main__":
@@ -18,7 +18,8 @@ from src.evaluator_gui import (
     show_info_no_website,
     show_nav_error,
 )
-from src.io_helpers import safe_print
+from src.io_helpers import safe_print, read_frame, write_frame
+from src.leads_store import LeadsStore
 
 @dataclass
 class EvalRowRef:
@@ -29,8 +30,10 @@ class EvalRowRef:
 
 
 class EvaluatorApp:
-    def __init__(self, files: List[str], filter_status: Optional[str] = None):
+    def __init__(self, files: List[str], filter_status: Optional[str] = None, use_db: bool = False):
         self.files = files
+        # With a store, statuses and evaluations are single-row updates in data/leads.db
+        self.store: Optional[LeadsStore] = LeadsStore() if use_db else None
         self.filter_status = (filter_status or "").strip().lower() or None
         self.file_paths: List[Path] = [COMBINED_DIR / f for f in files]
         self.results_paths: List[Path] = [RESULTS_DIR / f for f in files]
@@ -61,7 +64,12 @@ class EvaluatorApp:
             if not p.exists():
                 show_missing_file(p)
                 continue
-            df = pd.read_excel(p)
+            df = read_frame(p, use_cache=True)
+            if self.store is not None and "listing_link" in df.columns:
+                self.store.add_combined_rows(p.name, df.to_dict(orient="records"))
+                statuses = self.store.evaluation_statuses(p.name)
+                links = df["listing_link"].astype(str).str.strip()
+                df["status"] = [statuses.get(l, s) for l, s in zip(links, df.get("status", [""] * len(df)))]
             # Optional filtering by status (pending|good|bad|okay) applied to the parent combined file
             if self.filter_status and "status" in df.columns:
                 mask = df["status"].astype(str).str.strip().str.lower() == self.filter_status
@@ -250,6 +258,12 @@ class EvaluatorApp:
         notes_text = get_notes(self)
         eval_time = dt.datetime.now().isoformat(timespec="seconds")
 
+        if self.store is not None:
+            # data/results/<file> is then a view: python -m src.leads_store export results <file>
+            listing_link = str(ref.data.get("listing_link") or "").strip()
+            self.store.save_evaluation(ref.file_path.name, listing_link, rating, notes_text, eval_time)
+            return
+
         # Append to results file for the corresponding input file
         out_path = self.results_paths[ref.file_index]
         out_path.parent.mkdir(parents=True, exist_ok=True)
@@ -261,21 +275,25 @@ class EvaluatorApp:
 
         try:
             if out_path.exists():
-                df_old = pd.read_excel(out_path)
+                df_old = read_frame(out_path, use_cache=True)
                 df_new = pd.concat([df_old, pd.DataFrame([new_row])], ignore_index=True)
             else:
                 df_new = pd.DataFrame([new_row])
-            df_new.to_excel(out_path, index=False)
+            write_frame(out_path, df_new)
         except Exception as e:
             safe_print(f"[!] Failed to save result to {out_path.name}: {e}")
 
     def _load_existing_eval(self, ref) -> Optional[Dict[str, Any]]:
         """Return the most recent saved evaluation row for this listing_link, if any."""
+        if self.store is not None:
+            listing_link = str(ref.data.get("listing_link") or "").strip()
+            return self.store.last_evaluation(ref.file_path.name, listing_link)
         out_path = self.results_paths[ref.file_index]
         if not out_path.exists():
             return None
         try:
-            df = pd.read_excel(out_path)
+            # Runs on every click; the loader's cache makes repeated reads free until the file changes
+            df = read_frame(out_path, columns=["listing_link", "eval_rating", "notes"], use_cache=True)
         except Exception:
             return None
         listing_link = str(ref.data.get("listing_link") or "").strip()
@@ -291,11 +309,12 @@ class EvaluatorApp:
 
     def _update_parent_status(self, rating: str) -> None:
         ref = self._current_row()
-        if ref is None:
+        if ref is None or self.store is not None:
+            # The store already updated the status together with the evaluation
             return
         p = ref.file_path
         try:
-            df = pd.read_excel(p)
+            df = read_frame(p, use_cache=True)
         except Exception as e:
             safe_print(f"[!] Could not read parent combined file for status update: {e}")
             return
@@ -318,7 +337,7 @@ class EvaluatorApp:
             except Exception:
                 pass
         try:
-            df.to_excel(p, index=False)
+            write_frame(p, df)
         except Exception as e:
             safe_print(f"[!] Failed to write parent combined file: {e}")
 
@@ -334,15 +353,17 @@ class EvaluatorApp:
                 self.pw.stop()
         except Exception:
             pass
+        if self.store is not None:
+            self.store.close()
 
 
-def run(files_arg: str, filter_status: Optional[str] = None) -> int:
+def run(files_arg: str, filter_status: Optional[str] = None, use_db: bool = False) -> int:
     files = [f.strip() for f in files_arg.split(",") if f.strip()]
     if not files:
         safe_print("No input files provided. Nothing to do.")
         return 1
 
-    app = EvaluatorApp(files, filter_status=filter_status)
+    app = EvaluatorApp(files, filter_status=filter_status, use_db=use_db)
     app.run()
     return 0
 
@@ -353,7 +374,7 @@ def main(argv: Optional[List[str]] = None) -> int:
         parser.add_argument(
             "files",
             type=str,
-            help="Comma-separated list of .xlsx filenames located in ./data/combined/",
+            help="Comma-separated list of combined filenames (.xlsx or .parquet) located in ./data/combined/",
         )
         parser.add_argument(
             "--filter",
@@ -361,13 +382,20 @@ def main(argv: Optional[List[str]] = None) -> int:
             choices=["pending", "good", "bad", "okay"],
             help="Filter rows by status in the combined file (pending|good|bad|okay)",
         )
+        parser.add_argument(
+            "--db",
+            action="store_true",
+            help="Read statuses from and save evaluations to data/leads.db instead of the xlsx files.",
+        )
         args = parser.parse_args(argv)
         files = args.files
         filter_status = args.filter
+        use_db = args.db
     else:
         files = "combined_4_25c77f6ea7.xlsx"
         filter_status = None
-    return run(files, filter_status)
+        use_db = False
+    return run(files, filter_status, use_db)
 
 
 if __name__ == "__main__":
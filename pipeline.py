@@ -9,14 +9,15 @@ from typing import List
 from scraper import run as scraper_run, read_queries_xlsx, query_to_human_slug, QUERIES_DIR, MAPS_DIR
 from deduplicate import run as dedup_run, COMBINED_DIR
 from evaluator import run as evaluator_run
+from src.io_helpers import STORAGE_FORMATS
 
 
 def safe_print(msg: str) -> None:
     print(msg, flush=True)
 
 
-def _expected_map_filenames(query_file: Path) -> List[str]:
-    """Return a list of expected MAP .xlsx filenames (slug.xlsx) for rows with status == 'success'.
+def _expected_map_filenames(query_file: Path, storage_format: str = "xlsx") -> List[str]:
+    """Return a list of expected MAP filenames (slug.<format>) for rows with status == 'success'.
     Uses scraper.read_queries_xlsx to ensure normalized columns.
     """
     df = read_queries_xlsx(query_file)
@@ -31,10 +32,10 @@ def _expected_map_filenames(query_file: Path) -> List[str]:
     else:
         urls = df.loc[mask_success, "query_url"].astype(str).tolist()
     slugs = [query_to_human_slug(u) for u in urls]
-    return [f"{slug}.xlsx" for slug in slugs]
+    return [f"{slug}.{storage_format}" for slug in slugs]
 
 
-def run_pipeline(query_filename: str, rescrape: bool = False, min_rating: float = 4.2) -> int:
+def run_pipeline(query_filename: str, rescrape: bool = False, min_rating: float = 4.2, storage_format: str = "xlsx") -> int:
     # 1) Validate query file exists under data/queries
     query_path = QUERIES_DIR / query_filename
     if not query_path.exists():
@@ -43,12 +44,12 @@ def run_pipeline(query_filename: str, rescrape: bool = False, min_rating: float
 
     # 2) Run scraper for that file
     safe_print(f"[→] Scraping from {query_filename}...")
-    rc = scraper_run(query_filename, rescrape)
+    rc = scraper_run(query_filename, rescrape, storage_format=storage_format)
     if rc != 0:
         safe_print("[!] Scraper returned non-zero exit code; continuing best-effort.")
 
     # 3) Determine which map files to deduplicate
-    candidates = _expected_map_filenames(query_path)
+    candidates = _expected_map_filenames(query_path, storage_format)
     existing = [name for name in candidates if (MAPS_DIR / name).exists()]
     if not existing:
         safe_print("[!] No map files found to combine after scraping.")
@@ -101,8 +102,14 @@ def main(argv: List[str] | None = None) -> int:
         default=4.2,
         help="Minimum rating threshold for deduplication (inclusive).",
     )
+    parser.add_argument(
+        "--format",
+        choices=list(STORAGE_FORMATS),
+        default="xlsx",
+        help="Storage format of the map and combined files (parquet needs pyarrow).",
+    )
     args = parser.parse_args(argv)
-    return run_pipeline(args.query_file, rescrape=args.rescrape, min_rating=args.min_rating)
+    return run_pipeline(args.query_file, rescrape=args.rescrape, min_rating=args.min_rating, storage_format=args.format)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,26 @@
 import argparse
 import sys
 
-from typing import List, Dict, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from src.config.base import DEBUG, HEADLESS, QUERIES_DIR, MAPS_DIR
-from src.scroller import scroll_results_stub
-from src.types.scraper import ScrapeConfig
-from src.io_helpers import safe_print, read_queries_xlsx, write_map_results_xlsx, update_queries_status, query_to_human_slug
-from src.parse_gbp_listing import extract_businesses_from_html
-from src.playwright_utils import launch_persistent_context
+from src.scroller import CARD_FALLBACK_SELECTOR, FeedPage
+from src.types.scraper import ScrapeConfig, QueryTask, QueryResult
+from src.io_helpers import (
+    safe_print, read_queries_xlsx, write_map_results, update_queries_status, query_to_human_slug,
+    export_xlsx, STORAGE_FORMATS,
+)
+from src.html_backends import HTML_BACKENDS
+from src.maps_response_parser import MapsResponseCollector
+from src.pleper_panel import PANEL_SELECTOR, PANEL_CHANGE_JS, PANEL_EXTRACT_JS, pleper_result_from_payload
+from src.timing import ListingTimings
+from src.journal import QueryCheckpoint, QueryStatusJournal
+from src.enrichment_cache import EnrichmentCache
+from src.page_steps import run_steps
+from src.query_flow import QueryFlow, scrape_listing_steps
+from src.leads_store import LeadsStore
+from src.playwright_utils import launch_persistent_context, install_request_routing
+from src.worker_pool import QueryWorkerPool
+from src.async_scraper import AsyncQueryEngine
 from playwright.sync_api import BrowserContext
 
 def normalize_status(value: Optional[str]) -> str:
@@ -31,7 +44,7 @@ def should_process_row(status_value: Optional[str], rescrape: bool) -> Tuple[boo
     # empty, pending, error, or anything else -> process
     return True, "pending/error/empty"
 
-def click_on_the_listing(item):
+def click_on_the_listing(page, item):
     # Click interactive child or container
     clickable = item.locator(".hfpxzc").first
     for _ in range(20):
@@ -65,121 +78,78 @@ def check_listing_has_image(page):
         pass
     return False
 
-def open_pleper_panel(page, lastId):
-    panel = page.locator(".single_listing_info_window").first
-    for _ in range(40):
-        try:
-            page.wait_for_timeout(250)
-            cur_id = panel.get_attribute("id") or ""
-            if cur_id != lastId:
-                return panel, cur_id
-        except Exception:
-            pass
-        page.wait_for_timeout(250)
-    return None, lastId
-
-def scrape_pleper_panel(panel):
-    result = {}
-    # Extract company name (first <strong>)
+def open_pleper_panel(page, lastId, timeout_ms: int = 20000):
+    """Wait until the PlePer panel shows a listing other than lastId.
+    Returns (panel, new_id), or (None, lastId) if it did not change within timeout_ms.
+    """
     try:
-        company = (panel.locator("strong").first.text_content() or "").strip()
-        if company:
-            result["gbp_company"] = company
+        changed = page.evaluate(PANEL_CHANGE_JS, [PANEL_SELECTOR, lastId, timeout_ms])
     except Exception:
-        pass
+        changed = None
+    if not changed:
+        return None, lastId
+    return page.locator(PANEL_SELECTOR).first, changed.get("id") or ""
 
-    # Extract verification from <small>
+def scrape_pleper_panel(panel):
+    # One roundtrip for company, verification and the whole table
     try:
-        small_txt = (panel.locator("small").first.text_content() or "").strip().lower()
-        if "not verified" in small_txt:
-            result["gbp_is_verified"] = False
-        elif "verified" in small_txt:
-            result["gbp_is_verified"] = True
+        return pleper_result_from_payload(panel.evaluate(PANEL_EXTRACT_JS))
     except Exception:
-        pass
+        return {}
 
-    # Parse table rows using count()/nth()
-    try:
-        result["attributes"] = -1
-        rows = panel.locator("tr")
-        rc = rows.count()
-        for idx in range(1, rc):  # skip header row at 0
-            row = rows.nth(idx)
-            tds = row.locator("td")
-            if tds.count() < 2:
-                continue
-            key = (tds.nth(0).text_content() or "").strip()
-            val_txt = (tds.nth(1).text_content() or "").strip()
-            if key.startswith("Categories"):
-                result["categories"] = [p.strip() for p in val_txt.split(",") if p.strip()]
-            elif key.startswith("Place ID"):
-                result["place_id"] = val_txt
-            elif key.startswith("CID"):
-                result["CID"] = val_txt
-            elif key.startswith("Business Profile ID"):
-                result["business_profile_id"] = val_txt
-            elif key.startswith("Coordinates"):
-                try:
-                    parts = [p.strip() for p in val_txt.split(",")]
-                    if len(parts) >= 2:
-                        result["coordinates"] = [float(parts[0]), float(parts[1])]
-                except Exception:
-                    pass
-            elif key.startswith("KG ID"):
-                result["kg_id"] = "https://www.google.com/search?kgmid=" + val_txt
-            elif key.startswith("Attributes"):
-                try:
-                    result["attributes"] = int(val_txt.split()[0])
-                except Exception:
-                    result["attributes"] = -1
-    except Exception:
-        pass
 
-    return result
+class QueryPage(FeedPage):
+    """The page calls of a query's steps (src.query_flow), made on a sync Playwright page."""
+
+    def install_routing(self, cfg: ScrapeConfig):
+        return install_request_routing(self.page, cfg)
+
+    def watch_responses(self, collector: MapsResponseCollector) -> None:
+        self.page.on("response", collector.on_response)
+
+    def goto(self, url: str, timeout_ms: int) -> None:
+        self.page.goto(url, timeout=timeout_ms)
 
+    def collect(self, collector: MapsResponseCollector, source_file: str) -> List[Dict]:
+        return collector.collect(self.page, source_file)
 
-def scrape_listing(page, item, lastId):
-    result = {}
-    result["gbp_has_image"] = True
-    if not click_on_the_listing(item): return result, lastId
+    def card(self, i: int):
+        return self.page.locator(CARD_FALLBACK_SELECTOR).nth(i)
 
-    page.wait_for_timeout(1000)
+    def click_listing(self, item) -> bool:
+        return click_on_the_listing(self.page, item)
 
-    panel, lastId = open_pleper_panel(page, lastId)
-    if not panel is None:
-        result = {**scrape_pleper_panel(panel), **result}
+    def open_panel(self, lastId, timeout_ms: int):
+        return open_pleper_panel(self.page, lastId, timeout_ms)
 
-    result["gbp_has_image"] = check_listing_has_image(page)
+    def scrape_panel(self, panel) -> Dict:
+        return scrape_pleper_panel(panel)
 
-    return result, lastId
+    def has_image(self) -> bool:
+        return check_listing_has_image(self.page)
+
+    def is_closed(self) -> bool:
+        return self.page.is_closed()
+
+def scrape_listing(page, item, lastId, cfg: Optional[ScrapeConfig] = None, timings: Optional[ListingTimings] = None):
+    return run_steps(scrape_listing_steps(item, lastId, cfg, timings), QueryPage(page))
         
-def process_query(url: str, source_file: str, cfg: ScrapeConfig, context: BrowserContext) -> Tuple[str, List[Dict]]:
+def process_query(
+    url: str, source_file: str, cfg: ScrapeConfig, context: BrowserContext, cache: Optional[EnrichmentCache] = None
+) -> Tuple[str, Iterator[Dict]]:
     """Navigate to the URL, scroll (stub), and extract real data.
-    Returns (slug, rows)
+    Listings with a fresh entry in `cache` are not clicked.
+    Returns (slug, rows); rows is a generator meant to be streamed into the map writer.
     """
+    flow = QueryFlow(url, source_file, cfg, cache)
+    resumed = flow.resumed_rows()
+    if resumed is not None:
+        return flow.slug, resumed
+
     page = context.new_page()
     page.set_default_timeout(30000)
-    lastId = None
     try:
-        page.goto(url, timeout=cfg.navigation_timeout_ms)
-        scroll_results_stub(page, cfg)
-
-        html = page.content()
-        rows = extract_businesses_from_html(html, source_file)
-
-        try:
-            locator = page.locator("div.Nv2PK")
-            count = locator.count()
-
-            for i in range(count):
-                item = locator.nth(i)
-                scraped_item, lastId = scrape_listing(page, item, lastId)
-                rows[i] = {**rows[i], **scraped_item}
-                
-        except Exception:
-            pass
-        slug = query_to_human_slug(url)
-        return slug, rows
+        return flow.slug, run_steps(flow.steps(), QueryPage(page))
     finally:
         try:
             page.close()
@@ -189,7 +159,68 @@ def process_query(url: str, source_file: str, cfg: ScrapeConfig, context: Browse
 
 # --- CLI and orchestration ---
 
-def run(files_arg: str, rescrape: bool) -> int:
+def run_query_task(
+    task: QueryTask, file_name: str, cfg: ScrapeConfig, context: BrowserContext, cache: Optional[EnrichmentCache] = None
+) -> QueryResult:
+    """Scrape one pending row. Errors are captured on the result instead of raised."""
+    try:
+        slug, rows_out = process_query(task.url, file_name, cfg, context, cache)
+    except Exception as e:
+        return QueryResult(task=task, error=e)
+    return QueryResult(task=task, slug=slug, rows=rows_out)
+
+
+def record_query_result(
+    df, result: QueryResult, cfg: Optional[ScrapeConfig] = None, store: Optional[LeadsStore] = None, query_file: str = ""
+) -> bool:
+    """Write the map file for a finished query and set its row status. Returns True on success.
+    With a store, the listings and the status are recorded there as well."""
+    cfg = cfg or ScrapeConfig()
+    task = result.task
+    rows = result.rows
+    try:
+        if result.error is not None:
+            raise result.error
+        # Attach search_volume to each output row as it streams to the writer
+        if task.search_volume is not None:
+            rows = ({**r, "search_volume": task.search_volume} for r in rows)
+        out_path = MAPS_DIR / f"{result.slug}.{cfg.storage_format}"
+        if store is not None:
+            rows = store.stream_map_rows(out_path.name, rows)
+        written = write_map_results(out_path, rows)
+        if cfg.export_xlsx and out_path.suffix != ".xlsx":
+            export_xlsx(out_path)
+        # The map file now holds everything the journal had
+        QueryCheckpoint(result.slug, enabled=False).discard()
+        df.at[task.idx, "status"] = "success"
+        if store is not None:
+            store.set_query_status(query_file, task.idx, "success", result.slug)
+        safe_print(f"[✓] Success: {result.slug} ({written} results)")
+        return True
+    except Exception as e:
+        df.at[task.idx, "status"] = "error"
+        if store is not None:
+            # Closing the half-consumed stream rolls back its listings before the status commit
+            if hasattr(rows, "close"):
+                rows.close()
+            store.set_query_status(query_file, task.idx, "error")
+        safe_print(f"[!] Error: {query_to_human_slug(task.url)} ({e})")
+        return False
+
+
+def run(
+    files_arg: str,
+    rescrape: bool,
+    workers: int = 1,
+    engine: str = "sync",
+    listing_source: str = "dom",
+    lean: bool = False,
+    cache_ttl_days: float = 14.0,
+    html_backend: str = "bs4",
+    storage_format: str = "xlsx",
+    export: Optional[str] = None,
+    use_db: bool = False,
+) -> int:
     input_files = [f.strip() for f in files_arg.split(",") if f.strip()]
     if not input_files:
         safe_print("No input files provided. Nothing to do.")
@@ -202,10 +233,30 @@ def run(files_arg: str, rescrape: bool) -> int:
             safe_print(f"[!] Error: Input file not found: {name} (looked in {QUERIES_DIR})")
             return 1
 
-    cfg = ScrapeConfig()
-
-    # One persistent context for the whole run to optimize performance and save profile/cookies
-    context, pw_cm = launch_persistent_context(headless=HEADLESS)
+    cfg = ScrapeConfig(
+        workers=max(1, workers), engine=engine, listing_source=listing_source, lean=lean, rescrape=rescrape,
+        cache_ttl_days=cache_ttl_days, html_backend=html_backend,
+        storage_format=storage_format, export_xlsx=export == "xlsx",
+    )
+    # Shared by every query (and worker) of the run, persisted across runs
+    # --rescrape clicks every listing again; the cache is only refreshed then
+    cache = EnrichmentCache(cfg.cache_ttl_days, refresh=rescrape) if cfg.cache_ttl_days > 0 else None
+    # Statuses and listings in data/leads.db instead of rewriting the queries file
+    store = LeadsStore() if use_db else None
+
+    pool = None
+    async_engine = None
+    context = None
+    pw_cm = None
+    if cfg.engine == "async":
+        # Pages of one persistent context, driven by one event loop
+        safe_print(f"[i] Using async engine with {cfg.workers} concurrent page(s)")
+    elif cfg.workers > 1:
+        # Each worker owns its own persistent context; rows are spread across them
+        safe_print(f"[i] Using {cfg.workers} workers")
+    else:
+        # One persistent context for the whole run to optimize performance and save profile/cookies
+        context, pw_cm = launch_persistent_context(headless=HEADLESS)
 
     try:
         for file_name in input_files:
@@ -231,8 +282,21 @@ def run(files_arg: str, rescrape: bool) -> int:
                 continue
             if "status" not in df.columns:
                 df["status"] = ""
-
-            # Iterate rows
+            pending_rows = None
+            if store is not None:
+                # The store is the source of truth for statuses once a row is known to it
+                store.sync_queries(file_name, df)
+                store.apply_query_statuses(file_name, df)
+                pending_rows = set(store.pending_query_rows(file_name))
+            # Without a store, statuses of finished rows are journaled until the xlsx is rewritten.
+            # Replaying it here means a crash only costs the query that was in flight
+            status_journal = QueryStatusJournal(file_name, enabled=cfg.journal and store is None)
+            replayed = status_journal.apply(df)
+            if replayed:
+                safe_print(f"[i] Replayed {replayed} row status(es) from the journal of {file_name}")
+
+            # Collect the rows that need scraping
+            tasks: List[QueryTask] = []
             for idx, row in df.iterrows():
                 url = str(row.get("query_url", "")).strip()
                 status_val = row.get("status", "")
@@ -245,37 +309,52 @@ def run(files_arg: str, rescrape: bool) -> int:
                     safe_print("[⏸] Pending: (empty query_url)")
                     continue
 
+                if pending_rows is not None and not rescrape and int(idx) not in pending_rows:
+                    skipped_count += 1
+                    safe_print(f"[→] Skipped: {query_to_human_slug(url)} (already success)")
+                    continue
                 do_process, reason = should_process_row(status_val, rescrape)
                 if not do_process:
                     skipped_count += 1
                     safe_print(f"[→] Skipped: {query_to_human_slug(url)} ({reason})")
                     continue
 
-                # Process this query
-                try:
-                    slug, rows_out = process_query(url, file_name, cfg, context)
-                    # Attach search_volume to each output row
-                    if search_volume is not None:
-                        try:
-                            for r in rows_out:
-                                r["search_volume"] = search_volume
-                        except Exception:
-                            pass
-                    out_path = MAPS_DIR / f"{slug}.xlsx"
-                    write_map_results_xlsx(out_path, rows_out)
-                    df.at[idx, "status"] = "success"
+                tasks.append(QueryTask(idx=idx, url=url, search_volume=search_volume))
+
+            # Process the queries, one at a time or spread over the worker pool.
+            # Each query writes its own maps/<slug>.xlsx, so the output does not depend on the worker.
+            # Browsers are launched once, on the first file that has work, and reused
+            if tasks and cfg.engine == "async" and async_engine is None:
+                async_engine = AsyncQueryEngine(cfg.workers, HEADLESS)
+            elif tasks and cfg.engine != "async" and cfg.workers > 1 and pool is None:
+                pool = QueryWorkerPool(cfg.workers, HEADLESS)
+            if async_engine is not None:
+                results = async_engine.imap_unordered(tasks, file_name, cfg, cache)
+            elif pool is not None:
+                results = pool.imap_unordered(
+                    tasks, lambda task, ctx, fn=file_name: run_query_task(task, fn, cfg, ctx, cache)
+                )
+            else:
+                results = (run_query_task(task, file_name, cfg, context, cache) for task in tasks)
+
+            for result in results:
+                ok = record_query_result(df, result, cfg, store, file_name)
+                status_journal.record(result.task.idx, result.task.url, df.at[result.task.idx, "status"], result.slug)
+                if ok:
                     success_count += 1
-                    safe_print(f"[✓] Success: {slug} ({len(rows_out)} results)")
-                except Exception as e:
-                    df.at[idx, "status"] = "error"
+                else:
                     error_count += 1
-                    safe_print(f"[!] Error: {query_to_human_slug(url)} ({e})")
 
-            # Write updated statuses back to the query file
-            try:
-                update_queries_status(file_path, df)
-            except Exception as e:
-                safe_print(f"[!] Error writing status updates for {file_name}: {e}")
+            # Write updated statuses back to the query file (with --db it is a view, exported on demand)
+            if store is None:
+                try:
+                    update_queries_status(file_path, df)
+                    # Compacted into the queries file
+                    status_journal.discard()
+                except Exception as e:
+                    safe_print(f"[!] Error writing status updates for {file_name}: {e}")
+            else:
+                safe_print(f"[i] Statuses stored in {store.path.name}; python -m src.leads_store export queries {file_name}")
 
             # Count remaining pendings
             pending_count += int((df["status"].str.lower() == "pending").sum())
@@ -287,14 +366,26 @@ def run(files_arg: str, rescrape: bool) -> int:
                 f"Success: {success_count} | Error: {error_count} | Pending: {pending_count} | Skipped: {skipped_count}"
             )
 
+        if cache is not None:
+            safe_print(f"[i] Enrichment cache (run): {cache.stats.describe()}")
         return 0
     finally:
+        if cache is not None:
+            cache.close()
+        if store is not None:
+            store.close()
+        if pool is not None:
+            pool.close()
+        if async_engine is not None:
+            async_engine.close()
         try:
-            context.close()
+            if context is not None:
+                context.close()
         except Exception:
             pass
         try:
-            pw_cm.stop()
+            if pw_cm is not None:
+                pw_cm.stop()
         except Exception:
             pass
 
@@ -312,16 +403,95 @@ def main(argv: Optional[List[str]] = None) -> int:
         parser.add_argument(
             "--rescrape",
             action="store_true",
-            help="Force re-process all rows regardless of their current status.",
+            help="Force re-process all rows regardless of their current status. Every listing is clicked again; "
+            "the enrichment cache is not read, only refreshed, and leftover query journals are discarded.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of browser workers scraping query rows concurrently (default: 1). Workers after the "
+            "first use copies of the browser profile in browser_profile_workers/, seeded once from the main "
+            "profile; delete that folder to pick up later logins or extension settings.",
+        )
+        parser.add_argument(
+            "--engine",
+            choices=["sync", "async"],
+            default="sync",
+            help="sync: one browser per worker thread. async: --workers pages in one browser on one event loop.",
+        )
+        parser.add_argument(
+            "--listing-source",
+            choices=["intercept", "dom"],
+            default="dom",
+            help="dom (default): parse the page HTML. intercept: decode listings from the Maps search responses "
+            "(DOM parsing as fallback); listings that never get a card in the feed keep a link built from their "
+            "feature id, which differs from the card links of dom map files, so deduplicate such mixes with --resolve.",
+        )
+        parser.add_argument(
+            "--lean",
+            action="store_true",
+            help="Block images, media, fonts and map tiles while scraping.",
+        )
+        parser.add_argument(
+            "--cache-ttl-days",
+            type=float,
+            default=14.0,
+            help="Reuse PlePer data of listings enriched within this many days by any query (0 disables the cache; "
+            "not read with --rescrape).",
+        )
+        parser.add_argument(
+            "--html-backend",
+            choices=list(HTML_BACKENDS),
+            default="bs4",
+            help="Tree used to parse result cards in DOM mode; all produce identical rows (selectolax is optional, falls back to lxml).",
+        )
+        parser.add_argument(
+            "--format",
+            choices=list(STORAGE_FORMATS),
+            default="xlsx",
+            help="Storage format of data/maps/<slug>.* (parquet needs pyarrow).",
+        )
+        parser.add_argument(
+            "--export",
+            choices=["xlsx"],
+            default=None,
+            help="Also write an xlsx copy of each map file to data/export/maps/ (for --format parquet).",
+        )
+        parser.add_argument(
+            "--db",
+            action="store_true",
+            help="Keep statuses and listings in data/leads.db instead of rewriting the queries file.",
         )
 
         args = parser.parse_args(argv)
         files = args.files
         rescrape = args.rescrape
+        workers = args.workers
+        engine = args.engine
+        listing_source = args.listing_source
+        lean = args.lean
+        cache_ttl_days = args.cache_ttl_days
+        html_backend = args.html_backend
+        storage_format = args.format
+        export = args.export
+        use_db = args.db
     else:
         files = "example.xlsx"
         rescrape = True
-    return run(files, rescrape)
+        workers = 1
+        engine = "sync"
+        listing_source = "dom"
+        lean = False
+        cache_ttl_days = 14.0
+        html_backend = "bs4"
+        storage_format = "xlsx"
+        export = None
+        use_db = False
+    return run(
+        files, rescrape, workers, engine, listing_source, lean, cache_ttl_days, html_backend, storage_format, export,
+        use_db,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+# Async twins of the sync scraping functions in scraper.py (same selectors, waits
+# and PlePer mapping), so many pages can be in flight from a single event loop. The
+# per-query logic itself lives once in src.query_flow; AsyncQueryPage awaits its steps.
+import asyncio
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from playwright.async_api import BrowserContext
+
+from src.maps_response_parser import MapsResponseCollector
+from src.playwright_utils import launch_persistent_context_async, install_request_routing_async
+from src.pleper_panel import PANEL_SELECTOR, PANEL_CHANGE_JS, PANEL_EXTRACT_JS, pleper_result_from_payload
+from src.enrichment_cache import EnrichmentCache
+from src.scroller import CARD_FALLBACK_SELECTOR, AsyncFeedPage
+from src.page_steps import run_steps_async
+from src.query_flow import QueryFlow
+from src.types.scraper import ScrapeConfig, QueryTask, QueryResult
+
+
+async def click_on_the_listing_async(page, item) -> bool:
+    # Click interactive child or container
+    clickable = item.locator(".hfpxzc").first
+    for _ in range(20):
+        try:
+            if await clickable.get_attribute("jsaction"):
+                await clickable.click(timeout=5000)
+                return True
+        except Exception:
+            pass
+        try:
+            await item.click(timeout=5000)
+            break
+        except Exception:
+            await page.wait_for_timeout(250)
+    return False
+
+
+async def check_listing_has_image_async(page) -> bool:
+    try:
+        src = await page.locator(".ZKCDEc").first.locator("img").first.get_attribute("src")
+        return "default_geocode" not in src
+    except Exception:
+        pass
+    return False
+
+
+async def open_pleper_panel_async(page, lastId, timeout_ms: int = 20000):
+    try:
+        changed = await page.evaluate(PANEL_CHANGE_JS, [PANEL_SELECTOR, lastId, timeout_ms])
+    except Exception:
+        changed = None
+    if not changed:
+        return None, lastId
+    return page.locator(PANEL_SELECTOR).first, changed.get("id") or ""
+
+
+async def scrape_pleper_panel_async(panel) -> Dict:
+    try:
+        return pleper_result_from_payload(await panel.evaluate(PANEL_EXTRACT_JS))
+    except Exception:
+        return {}
+
+
+class AsyncQueryPage(AsyncFeedPage):
+    """scraper.QueryPage on an async Playwright page."""
+
+    async def install_routing(self, cfg: ScrapeConfig):
+        return await install_request_routing_async(self.page, cfg)
+
+    async def watch_responses(self, collector: MapsResponseCollector) -> None:
+        self.page.on("response", collector.on_response_async)
+
+    async def goto(self, url: str, timeout_ms: int) -> None:
+        await self.page.goto(url, timeout=timeout_ms)
+
+    async def collect(self, collector: MapsResponseCollector, source_file: str) -> List[Dict]:
+        return await collector.collect_async(self.page, source_file)
+
+    async def card(self, i: int):
+        return self.page.locator(CARD_FALLBACK_SELECTOR).nth(i)
+
+    async def click_listing(self, item) -> bool:
+        return await click_on_the_listing_async(self.page, item)
+
+    async def open_panel(self, lastId, timeout_ms: int):
+        return await open_pleper_panel_async(self.page, lastId, timeout_ms)
+
+    async def scrape_panel(self, panel) -> Dict:
+        return await scrape_pleper_panel_async(panel)
+
+    async def has_image(self) -> bool:
+        return await check_listing_has_image_async(self.page)
+
+    async def is_closed(self) -> bool:
+        return self.page.is_closed()
+
+
+async def process_query_async(
+    url: str, source_file: str, cfg: ScrapeConfig, context: BrowserContext, cache: Optional[EnrichmentCache] = None
+) -> Tuple[str, Iterator[Dict]]:
+    """Async twin of scraper.process_query. Returns (slug, rows), rows as a generator."""
+    flow = QueryFlow(url, source_file, cfg, cache)
+    resumed = flow.resumed_rows()
+    if resumed is not None:
+        return flow.slug, resumed
+
+    page = await context.new_page()
+    page.set_default_timeout(30000)
+    try:
+        return flow.slug, await run_steps_async(flow.steps(), AsyncQueryPage(page))
+    finally:
+        try:
+            await page.close()
+        except Exception:
+            pass
+
+
+class AsyncQueryEngine:
+    """Runs queries as concurrent pages of one persistent context on one event loop.
+
+    The loop is owned by the engine and driven from the calling thread, so
+    imap_unordered() has the same shape as QueryWorkerPool.imap_unordered() and the
+    caller can record each result (status, map file, logging) as soon as it lands.
+    At most `workers` pages are open at once.
+    """
+
+    def __init__(self, workers: int, headless: bool):
+        self.workers = max(1, int(workers))
+        self.loop = asyncio.new_event_loop()
+        self.context, self.pw_cm = self.loop.run_until_complete(launch_persistent_context_async(headless))
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _run_task(
+        self, task: QueryTask, file_name: str, cfg: ScrapeConfig, cache: Optional[EnrichmentCache]
+    ) -> QueryResult:
+        if self._slots is None:
+            # Created lazily so it binds to the engine's loop
+            self._slots = asyncio.Semaphore(self.workers)
+        async with self._slots:
+            try:
+                slug, rows_out = await process_query_async(task.url, file_name, cfg, self.context, cache)
+            except Exception as e:
+                return QueryResult(task=task, error=e)
+            return QueryResult(task=task, slug=slug, rows=rows_out)
+
+    def imap_unordered(
+        self, tasks: List[QueryTask], file_name: str, cfg: ScrapeConfig, cache: Optional[EnrichmentCache] = None
+    ) -> Iterator[QueryResult]:
+        """Schedule every task and yield results in completion order."""
+        pending = {self.loop.create_task(self._run_task(task, file_name, cfg, cache)) for task in tasks}
+        while pending:
+            done, pending = self.loop.run_until_complete(
+                asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            )
+            for fut in done:
+                yield fut.result()
+
+    def close(self) -> None:
+        try:
+            self.loop.run_until_complete(self.context.close())
+        except Exception:
+            pass
+        try:
+            self.loop.run_until_complete(self.pw_cm.stop())
+        except Exception:
+            pass
+        self.loop.close()
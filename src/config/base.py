@@ -14,3 +14,7 @@ PLEPER_DIR = EXTENSIONS_DIR / "PlePer"
 DEBUG_DIR = DATA_DIR / "debug"
 COMBINED_DIR = DATA_DIR / "combined"
 RESULTS_DIR = DATA_DIR / "results"
+WORKER_PROFILES_DIR = PROJECT_ROOT / "browser_profile_workers"
+JOURNAL_DIR = DATA_DIR / "journal"
+ENRICHMENT_CACHE_PATH = DATA_DIR / "enrichment_cache.sqlite"
+LEADS_DB_PATH = DATA_DIR / "leads.db"
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.config.base import ENRICHMENT_CACHE_PATH
+from src.listing_keys import listing_identity
+
+# What scrape_listing adds to a row; only these are cached
+ENRICHMENT_FIELDS = (
+    "gbp_company",
+    "gbp_is_verified",
+    "place_id",
+    "CID",
+    "business_profile_id",
+    "kg_id",
+    "attributes",
+    "coordinates",
+    "categories",
+    "gbp_has_image",
+)
+
+# A result without any of these means the panel never rendered; not worth caching
+_PANEL_FIELDS = ("gbp_is_verified", "place_id", "CID", "kg_id")
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def describe(self) -> str:
+        total = self.hits + self.misses
+        ratio = (100.0 * self.hits / total) if total else 0.0
+        return f"{self.hits} hits / {self.misses} misses ({ratio:.0f}% hit rate)"
+
+
+class EnrichmentCache:
+    """Persistent PlePer enrichment cache shared across queries and runs.
+
+    Keyed by listing_identity() (CID when available), so the same business found by
+    overlapping queries is clicked only once per TTL. Backed by SQLite and safe to
+    share between the worker threads of one run. With refresh (--rescrape) nothing is
+    read from it, but freshly scraped enrichment is still stored.
+    """
+
+    def __init__(self, ttl_days: float, path: Path = ENRICHMENT_CACHE_PATH, refresh: bool = False):
+        self.ttl_sec = ttl_days * 86400
+        self.refresh = refresh
+        self.path = path
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS enrichment (key TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, row: Dict[str, Any], stats: Optional[CacheStats] = None) -> Optional[Dict[str, Any]]:
+        """Fresh cached enrichment for the row's listing, counting a hit or a miss."""
+        if self.refresh:
+            return None
+        key = listing_identity(row)
+        hit = None
+        if key is not None:
+            with self._lock:
+                cur = self._conn.execute(
+                    "SELECT data FROM enrichment WHERE key = ? AND fetched_at >= ?",
+                    (key, time.time() - self.ttl_sec),
+                )
+                found = cur.fetchone()
+            if found:
+                try:
+                    hit = json.loads(found[0])
+                except Exception:
+                    hit = None
+        with self._lock:
+            for s in (self.stats, stats):
+                if s is None:
+                    continue
+                if hit is None:
+                    s.misses += 1
+                else:
+                    s.hits += 1
+        return hit
+
+    def put(self, row: Dict[str, Any], data: Dict[str, Any]) -> None:
+        key = listing_identity(row)
+        if key is None or not any(f in data for f in _PANEL_FIELDS):
+            return
+        payload = {k: data[k] for k in ENRICHMENT_FIELDS if k in data}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO enrichment (key, data, fetched_at) VALUES (?, ?, ?)",
+                (key, json.dumps(payload, default=str), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        try:
+            self._conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,321 @@
+# Second-stage dedupe of merged listings (rows of merge_rows_by_listing). The same
+# business can reach a combined file under several links (viewport/session fragments,
+# re-captured links), so rows are matched in order of confidence:
+#   identity      same CID / place id / canonical link (listing_identity), merged as is
+#   phone         same normalized phone, confirmed by a similar name or the same address
+#   domain        same registrable website domain, confirmed by a similar name and no
+#                 conflicting address (chains share a domain across locations)
+#   name_address  same street number and first name token, confirmed by similar names
+#                 and similar addresses
+# Candidates are only compared inside a block (rows sharing a key), never all pairs;
+# blocks larger than BLOCK_LIMIT are skipped (a shared call center or a directory site).
+import re
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from src.listing_keys import listing_identity
+
+RULES = ("identity", "phone", "domain", "name_address")
+BLOCK_LIMIT = 50
+NAME_SIMILARITY = 0.5
+ADDRESS_SIMILARITY = 0.6
+
+# Hosts many unrelated businesses use as their "website"; a match on them means nothing
+SHARED_HOSTS = {
+    "facebook.com",
+    "instagram.com",
+    "linkedin.com",
+    "twitter.com",
+    "x.com",
+    "yelp.com",
+    "google.com",
+    "goo.gl",
+    "linktr.ee",
+    "nextdoor.com",
+    "angi.com",
+    "homeadvisor.com",
+    "thumbtack.com",
+    "houzz.com",
+    "bbb.org",
+    "yellowpages.com",
+}
+# Site builders that give every customer a subdomain; there the full host identifies the site
+HOSTING_SUFFIXES = ("business.site", "wixsite.com", "square.site", "godaddysites.com", "weebly.com", "wordpress.com")
+# Second-level labels under which the registrable domain has three labels (example.co.uk)
+SECOND_LEVEL = {"co", "com", "net", "org", "gov", "edu", "ac"}
+
+NAME_STOPWORDS = {"the", "and", "llc", "inc", "co", "corp", "corporation", "company", "ltd", "pllc", "lp"}
+ADDRESS_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "road": "rd",
+    "drive": "dr",
+    "boulevard": "blvd",
+    "lane": "ln",
+    "court": "ct",
+    "place": "pl",
+    "parkway": "pkwy",
+    "highway": "hwy",
+    "suite": "ste",
+    "unit": "ste",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_VIEWPORT_RE = re.compile(r"/@[^/?]*")
+# Host of a URL with or without scheme (urlparse is several times slower per row)
+_HOST_RE = re.compile(r"^(?:[a-z][a-z0-9+.-]*://)?(?:[^@/?#]*@)?([^:/?#]+)")
+
+
+def _text(v: Any) -> str:
+    if v is None or (isinstance(v, float) and v != v):
+        return ""
+    return str(v).strip()
+
+
+def canonical_identity(row: Dict[str, Any]) -> Optional[str]:
+    """listing_identity() with viewport segments (/@lat,lng,zoom) dropped from link fallbacks."""
+    ident = listing_identity(row)
+    if ident is not None and ident.startswith("url:"):
+        ident = _VIEWPORT_RE.sub("", ident).rstrip("/")
+    return ident
+
+
+def normalize_phone(v: Any) -> Optional[str]:
+    digits = re.sub(r"\D", "", _text(v))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def registrable_domain(v: Any) -> Optional[str]:
+    url = _text(v).lower()
+    if not url:
+        return None
+    m = _HOST_RE.match(url)
+    host = m.group(1) if m else ""
+    if host.startswith("www."):
+        host = host[4:]
+    labels = [p for p in host.split(".") if p]
+    if len(labels) < 2:
+        return None
+    if any(host == s or host.endswith("." + s) for s in HOSTING_SUFFIXES):
+        return host
+    take = 3 if len(labels) >= 3 and labels[-2] in SECOND_LEVEL and len(labels[-1]) == 2 else 2
+    domain = ".".join(labels[-take:])
+    return None if domain in SHARED_HOSTS else domain
+
+
+def name_token_list(v: Any) -> Tuple[str, ...]:
+    """Name tokens in the order the name has them, stopwords dropped."""
+    text = _text(v).lower().replace("&", " and ").replace("'", "")
+    return tuple(t for t in _TOKEN_RE.findall(text) if t not in NAME_STOPWORDS)
+
+
+def name_tokens(v: Any) -> FrozenSet[str]:
+    return frozenset(name_token_list(v))
+
+
+def address_tokens(v: Any) -> Tuple[str, ...]:
+    return tuple(ADDRESS_ABBREVIATIONS.get(t, t) for t in _TOKEN_RE.findall(_text(v).lower()))
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Record:
+    __slots__ = ("name", "first_name", "address", "address_set", "phone", "domain")
+
+    def __init__(self, row: Dict[str, Any]):
+        tokens = name_token_list(row.get("name"))
+        self.name = frozenset(tokens)
+        self.first_name = tokens[0] if tokens else None
+        self.address = address_tokens(row.get("address"))
+        self.address_set = frozenset(self.address)
+        self.phone = normalize_phone(row.get("phone"))
+        self.domain = registrable_domain(row.get("website"))
+
+
+def _street_number(rec: _Record) -> Optional[str]:
+    return next((t for t in rec.address if t.isdigit()), None)
+
+
+def _same_address(a: _Record, b: _Record) -> bool:
+    if not a.address or _jaccard(a.address_set, b.address_set) < ADDRESS_SIMILARITY:
+        return False
+    # Neighbouring locations share most tokens; the street number tells them apart
+    na, nb = _street_number(a), _street_number(b)
+    return na is None or nb is None or na == nb
+
+
+def _confirm_phone(a: _Record, b: _Record) -> bool:
+    return _jaccard(a.name, b.name) >= NAME_SIMILARITY or _same_address(a, b)
+
+
+def _confirm_domain(a: _Record, b: _Record) -> bool:
+    if _jaccard(a.name, b.name) < NAME_SIMILARITY:
+        return False
+    # One location per domain unless the addresses say otherwise
+    return not (a.address and b.address) or _same_address(a, b)
+
+
+def _confirm_name_address(a: _Record, b: _Record) -> bool:
+    return _jaccard(a.name, b.name) >= NAME_SIMILARITY and _same_address(a, b)
+
+
+def _name_address_key(rec: _Record) -> Optional[Tuple[str, str]]:
+    number = _street_number(rec)
+    if number is None or rec.first_name is None:
+        return None
+    # The first token, not the smallest: an extra word ("Zeta Dental Clinic") must not move the key
+    return number, rec.first_name
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, a: int, b: int) -> bool:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        # The earlier row stays the root, so it represents the group
+        if rb < ra:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        return True
+
+
+class ResolutionStats:
+    def __init__(self) -> None:
+        self.merges: Dict[str, int] = {rule: 0 for rule in RULES}
+        self.comparisons = 0
+        self.skipped_blocks = 0
+
+    def describe(self) -> str:
+        per_rule = ", ".join(f"{rule} {n}" for rule, n in self.merges.items())
+        return (
+            f"{sum(self.merges.values())} merges ({per_rule}); "
+            f"{self.comparisons} comparisons, {self.skipped_blocks} oversized blocks skipped"
+        )
+
+
+def _block(keys: List[Optional[Any]]) -> Dict[Any, List[int]]:
+    blocks: Dict[Any, List[int]] = {}
+    for i, key in enumerate(keys):
+        if key is not None:
+            blocks.setdefault(key, []).append(i)
+    return blocks
+
+
+def _match_blocks(
+    blocks: Dict[Any, List[int]],
+    records: List[_Record],
+    confirm: Callable[[_Record, _Record], bool],
+    uf: _UnionFind,
+    stats: ResolutionStats,
+    rule: str,
+) -> None:
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        if len(members) > BLOCK_LIMIT:
+            stats.skipped_blocks += 1
+            continue
+        for x, i in enumerate(members):
+            for j in members[x + 1:]:
+                if uf.find(i) == uf.find(j):
+                    continue
+                stats.comparisons += 1
+                if confirm(records[i], records[j]) and uf.union(i, j):
+                    stats.merges[rule] += 1
+
+
+def fold_listing(out: Dict[str, Any], row: Dict[str, Any], flag_cols: List[str]) -> bool:
+    """Fold a merged listing into another the way rows are merged; returns whether out changed.
+
+    out's position/map_files/search_volume must be lists it owns. New (map_file, position)
+    pairs are appended, empty scalars and categories filled, flags OR-ed; nothing else moves.
+    """
+    changed = False
+    pairs = set(zip(out["map_files"], out["position"]))
+    maps = list(row.get("map_files") or [])
+    positions = list(row.get("position") or [])
+    volumes = list(row.get("search_volume") or [])
+    for k, map_name in enumerate(maps):
+        if k >= len(positions):
+            break
+        pair = (map_name, positions[k])
+        if pair in pairs:
+            continue
+        pairs.add(pair)
+        out["map_files"].append(map_name)
+        out["position"].append(positions[k])
+        out["search_volume"].append(volumes[k] if k < len(volumes) else None)
+        changed = True
+    for key in ("name", "website", "phone", "address", "reviews_count", "rating", "source_file"):
+        if not _text(out.get(key)) and _text(row.get(key)):
+            out[key] = row.get(key)
+            changed = True
+    if not out.get("categories") and isinstance(row.get("categories"), list) and row.get("categories"):
+        out["categories"] = row.get("categories")
+        changed = True
+    for col in flag_cols:
+        if row.get(col) and not out.get(col):
+            out[col] = True
+            changed = True
+    return changed
+
+
+def _merge_group(group: List[Dict[str, Any]], flag_cols: List[str]) -> Dict[str, Any]:
+    """Fold merged listings of one business into the first."""
+    out = dict(group[0])
+    if len(group) == 1:
+        out["merged_links"] = []
+        return out
+    out["position"] = list(out.get("position") or [])
+    out["map_files"] = list(out.get("map_files") or [])
+    out["search_volume"] = list(out.get("search_volume") or [])
+    for row in group[1:]:
+        fold_listing(out, row, flag_cols)
+    out["merged_links"] = [row.get("listing_link") for row in group[1:]]
+    return out
+
+
+def resolve_entities(rows: List[Dict[str, Any]], flag_cols: List[str]) -> Tuple[List[Dict[str, Any]], ResolutionStats]:
+    """Merge rows that describe the same business; returns (rows, stats).
+
+    Rows keep their order of first appearance; every merged group is represented by
+    its earliest row, which gains a merged_links list with the links folded into it.
+    """
+    stats = ResolutionStats()
+    uf = _UnionFind(len(rows))
+    records = [_Record(r) for r in rows]
+
+    # Exact identity needs no confirmation: every row of a block is the same listing
+    for members in _block([canonical_identity(r) for r in rows]).values():
+        for j in members[1:]:
+            if uf.union(members[0], j):
+                stats.merges["identity"] += 1
+
+    _match_blocks(_block([r.phone for r in records]), records, _confirm_phone, uf, stats, "phone")
+    _match_blocks(_block([r.domain for r in records]), records, _confirm_domain, uf, stats, "domain")
+    _match_blocks(_block([_name_address_key(r) for r in records]), records, _confirm_name_address, uf, stats, "name_address")
+
+    groups: Dict[int, List[Dict[str, Any]]] = {}
+    for i, row in enumerate(rows):
+        groups.setdefault(uf.find(i), []).append(row)
+    # Roots are the earliest rows of their groups, so dict order is first-appearance order
+    return [_merge_group(g, flag_cols) for g in groups.values()], stats
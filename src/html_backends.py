@@ -0,0 +1,157 @@
+# Interchangeable HTML tree backends for the Maps card parser. The extraction rules in
+# maps_item_parser only use the handful of operations below, so the same rules run on
+# BeautifulSoup, raw lxml (precompiled XPath) or selectolax (lexbor, optional).
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # optional dependency
+    LexborHTMLParser = None
+
+HTML_BACKENDS = ("bs4", "lxml", "selectolax")
+
+
+class BS4Backend:
+    """Reference backend: BeautifulSoup nodes and CSS select."""
+
+    name = "bs4"
+
+    def parse(self, html: str) -> Any:
+        # lxml is several times faster; html.parser keeps working where it is not installed
+        try:
+            return BeautifulSoup(html, "lxml")
+        except Exception:
+            return BeautifulSoup(html, "html.parser")
+
+    def select(self, node, css: str) -> List[Any]:
+        return node.select(css)
+
+    def select_one(self, node, css: str) -> Optional[Any]:
+        return node.select_one(css)
+
+    def text(self, node, sep: str = " ") -> str:
+        return node.get_text(sep)
+
+    def attr(self, node, name: str, default: Any = None) -> Any:
+        return node.get(name, default)
+
+    def descendants(self, node, tags: Sequence[str]) -> List[Any]:
+        return node.find_all(list(tags), recursive=True)
+
+
+def _class_xpath(cls: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+
+
+def _css_to_xpath(css: str) -> str:
+    """Translate the simple selectors the card parser uses (tag, .class chains, [attr], [attr=value])
+    into a descendant XPath. Not a general CSS translator."""
+    m = re.fullmatch(r"([a-z0-9]+)((?:\.[\w-]+)*)((?:\[[\w-]+(?:=[\w-]+)?\])*)", css)
+    if not m:
+        raise ValueError(f"Unsupported selector for the lxml backend: {css}")
+    tag, classes, attrs = m.groups()
+    preds = [_class_xpath(c) for c in classes.split(".") if c]
+    for name, value in re.findall(r"\[([\w-]+)(?:=([\w-]+))?\]", attrs):
+        preds.append(f"@{name}='{value}'" if value else f"@{name}")
+    return f".//{tag}" + "".join(f"[{p}]" for p in preds)
+
+
+class LxmlBackend:
+    """lxml.html tree; selectors are compiled to XPath once and cached."""
+
+    name = "lxml"
+
+    def __init__(self) -> None:
+        self._compiled: Dict[str, etree.XPath] = {}
+
+    def _xpath(self, css: str) -> etree.XPath:
+        xp = self._compiled.get(css)
+        if xp is None:
+            xp = self._compiled[css] = etree.XPath(_css_to_xpath(css))
+        return xp
+
+    def parse(self, html: str) -> Any:
+        return lxml_html.document_fromstring(html)
+
+    def select(self, node, css: str) -> List[Any]:
+        return self._xpath(css)(node)
+
+    def select_one(self, node, css: str) -> Optional[Any]:
+        found = self._xpath(css)(node)
+        return found[0] if found else None
+
+    def text(self, node, sep: str = " ") -> str:
+        # Same strings as bs4's get_text(): element text and tails, comments skipped
+        parts = []
+        stack = [(node, False)]
+        while stack:
+            el, done = stack.pop()
+            if done:
+                # A tail follows the element's own subtree
+                if el is not node and el.tail:
+                    parts.append(el.tail)
+                continue
+            if isinstance(el.tag, str) and el.text:
+                parts.append(el.text)
+            stack.append((el, True))
+            stack.extend((child, False) for child in reversed(el))
+        return sep.join(parts)
+
+    def attr(self, node, name: str, default: Any = None) -> Any:
+        return node.get(name, default)
+
+    def descendants(self, node, tags: Sequence[str]) -> List[Any]:
+        return list(node.iterdescendants(*tags))
+
+
+class SelectolaxBackend:
+    """selectolax/lexbor tree (C parser and selector engine)."""
+
+    name = "selectolax"
+
+    def parse(self, html: str) -> Any:
+        return LexborHTMLParser(html).root
+
+    def select(self, node, css: str) -> List[Any]:
+        # lexbor matches the node itself too; bs4 only looks at descendants
+        return [n for n in node.css(css) if n.mem_id != node.mem_id]
+
+    def select_one(self, node, css: str) -> Optional[Any]:
+        for n in node.css(css):
+            if n.mem_id != node.mem_id:
+                return n
+        return None
+
+    def text(self, node, sep: str = " ") -> str:
+        return node.text(deep=True, separator=sep)
+
+    def attr(self, node, name: str, default: Any = None) -> Any:
+        value = node.attributes.get(name, default)
+        # Valueless attributes come back as None; bs4 reports them as ""
+        return "" if value is None and name in node.attributes else value
+
+    def descendants(self, node, tags: Sequence[str]) -> List[Any]:
+        wanted = set(tags)
+        it = node.traverse(include_text=False)
+        next(it, None)  # the node itself
+        return [n for n in it if n.tag in wanted]
+
+
+_BACKENDS: Dict[str, Any] = {}
+
+
+def get_html_backend(name: str = "bs4"):
+    """Backend instance by name. selectolax falls back to lxml when it is not installed."""
+    if name not in HTML_BACKENDS:
+        raise ValueError(f"Unknown HTML backend '{name}' (expected one of {', '.join(HTML_BACKENDS)})")
+    if name == "selectolax" and LexborHTMLParser is None:
+        name = "lxml"
+    backend = _BACKENDS.get(name)
+    if backend is None:
+        backend = _BACKENDS[name] = {"bs4": BS4Backend, "lxml": LxmlBackend, "selectolax": SelectolaxBackend}[name]()
+    return backend
@@ -1,6 +1,12 @@
+import copy
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook
 import re
 from urllib.parse import urlparse, parse_qs, unquote_plus
 
@@ -12,7 +18,7 @@ def read_queries_xlsx(file_path: Path) -> pd.DataFrame:
     """Read the queries Excel. Expect columns: 'query_url', 'status'.
     Optionally accepts 'search_volume'. Columns matched case-insensitively.
     """
-    df = pd.read_excel(file_path)
+    df = read_frame(file_path)
     # Normalize columns
     cols = {c.lower().strip(): c for c in df.columns}
     url_col = None
@@ -40,16 +46,380 @@ def read_queries_xlsx(file_path: Path) -> pd.DataFrame:
     return df.rename(columns={url_col: "query_url", status_col: "status", sv_col: "search_volume"})
 
 
-def write_map_results_xlsx(file_path: Path, rows: List[Dict]) -> None:
-    df = pd.DataFrame(rows)
+# Column order of data/maps/<slug>.xlsx: card fields, PlePer enrichment, then query metadata
+MAP_COLUMNS = (
+    "name",
+    "categories",
+    "rating",
+    "reviews_count",
+    "address",
+    "phone",
+    "website",
+    "listing_link",
+    "status",
+    "position",
+    "source_file",
+    "gbp_company",
+    "gbp_is_verified",
+    "place_id",
+    "CID",
+    "business_profile_id",
+    "kg_id",
+    "attributes",
+    "coordinates",
+    "gbp_has_image",
+    "search_volume",
+)
+
+
+def _excel_cell(value):
+    # Same cell values DataFrame.to_excel produced: containers as their repr, NaN as empty
+    if isinstance(value, (list, tuple, dict, set)):
+        return str(value)
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def write_map_results_xlsx(file_path: Path, rows: Iterable[Dict], columns: Sequence[str] = MAP_COLUMNS) -> int:
+    """Stream rows into a map file and return how many were written.
+
+    Uses openpyxl's write-only mode, so rows go to disk as they are consumed and
+    memory stays flat however many listings a query has. The header is the fixed
+    `columns` schema; keys outside it are not written. The file is written under a
+    temporary name and renamed into place, so a crash never leaves a partial map file.
+    """
     file_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_excel(file_path, index=False)
+    tmp_path = file_path.with_name(f".{file_path.name}.tmp")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(columns))
+    count = 0
+    try:
+        for row in rows:
+            ws.append([_excel_cell(row.get(c)) for c in columns])
+            count += 1
+        wb.save(tmp_path)
+        os.replace(tmp_path, file_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        _forget_frame(file_path)
+    return count
+
+
+# Storage formats of the intermediate stages (data/maps, data/combined, data/results).
+# Parquet keeps list columns typed and reads many times faster; xlsx stays the default
+# and the export format for humans. Parquet needs the optional pyarrow package.
+STORAGE_FORMATS = ("xlsx", "parquet")
+EXPORT_DIR_NAME = "export"
+
+# Arrow type of each map column; list columns stay lists instead of their repr
+_MAP_ARROW_TYPES = {
+    "name": "string",
+    "categories": "list<string>",
+    "rating": "double",
+    "reviews_count": "int64",
+    "address": "string",
+    "phone": "string",
+    "website": "string",
+    "listing_link": "string",
+    "status": "string",
+    "position": "int64",
+    "source_file": "string",
+    "gbp_company": "string",
+    "gbp_is_verified": "bool",
+    "place_id": "string",
+    "CID": "string",  # up to 2**64, too big for int64
+    "business_profile_id": "string",
+    "kg_id": "string",
+    "attributes": "int64",
+    "coordinates": "list<double>",
+    "gbp_has_image": "bool",
+    "search_volume": "double",  # non-numeric volumes are stored as null
+}
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _coerce(value, kind: str):
+    if _is_missing(value):
+        return None
+    try:
+        if kind == "string":
+            return str(value)
+        if kind == "double":
+            return float(value)
+        if kind == "int64":
+            return int(value)
+        if kind == "bool":
+            return bool(value)
+        if kind.startswith("list<"):
+            if not isinstance(value, (list, tuple)):
+                return None
+            inner = kind[5:-1]
+            return [_coerce(v, inner) for v in value]
+    except (TypeError, ValueError):
+        return None
+    return value
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("The parquet storage format needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def _arrow_type(pa, kind: str):
+    if kind.startswith("list<"):
+        return pa.list_(_arrow_type(pa, kind[5:-1]))
+    return {"string": pa.string(), "double": pa.float64(), "int64": pa.int64(), "bool": pa.bool_()}[kind]
+
+
+def write_map_results_parquet(
+    file_path: Path,
+    rows: Iterable[Dict],
+    columns: Sequence[str] = MAP_COLUMNS,
+    batch_size: int = 500,
+    types: Optional[Dict[str, str]] = None,
+) -> int:
+    """Parquet twin of write_map_results_xlsx: streamed in row groups of batch_size, typed, atomic.
+    `types` overrides the Arrow type of columns whose shape differs from a map file's."""
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    types = {**_MAP_ARROW_TYPES, **(types or {})}
+    kinds = [types.get(c, "string") for c in columns]
+    schema = pa.schema([(c, _arrow_type(pa, k)) for c, k in zip(columns, kinds)])
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = file_path.with_name(f".{file_path.name}.tmp")
+    count = 0
+    try:
+        with pq.ParquetWriter(str(tmp_path), schema) as writer:
+            batch: List[Dict] = []
+            for row in rows:
+                batch.append({c: _coerce(row.get(c), k) for c, k in zip(columns, kinds)})
+                count += 1
+                if len(batch) >= batch_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    batch = []
+            if batch or count == 0:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        os.replace(tmp_path, file_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        _forget_frame(file_path)
+    return count
+
+
+def write_map_results(
+    file_path: Path, rows: Iterable[Dict], columns: Sequence[str] = MAP_COLUMNS, types: Optional[Dict[str, str]] = None
+) -> int:
+    """Stream rows into a map file in the format given by its suffix (.xlsx or .parquet).
+    Other stage files with a known column list can be streamed the same way."""
+    if file_path.suffix == ".parquet":
+        return write_map_results_parquet(file_path, rows, columns, types=types)
+    return write_map_results_xlsx(file_path, rows, columns)
+
+
+def _lists_from_arrow(df: pd.DataFrame) -> pd.DataFrame:
+    # pyarrow hands list cells back as numpy arrays; the pipeline works with plain lists
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: v.tolist() if isinstance(v, np.ndarray) else v)
+    return df
+
+
+def _excel_engine() -> str:
+    # calamine (Rust) reads xlsx several times faster than openpyxl; optional
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return "openpyxl"
+
+
+EXCEL_ENGINE = _excel_engine()
+
+# In-process cache of loaded frames: (path, columns) -> (mtime_ns, size, frame), least
+# recently used first. Opt-in and small: it serves interactive re-reads of the same few
+# files (the evaluator), not batch stages that read every file once.
+_FRAME_CACHE: "OrderedDict[Tuple[str, Optional[Tuple[str, ...]]], Tuple[int, int, pd.DataFrame]]" = OrderedDict()
+_FRAME_CACHE_LOCK = threading.Lock()
+FRAME_CACHE_SIZE = 8
+
+
+def _forget_frame(path: Path) -> None:
+    key_path = str(path.resolve())
+    with _FRAME_CACHE_LOCK:
+        for key in [k for k in _FRAME_CACHE if k[0] == key_path]:
+            del _FRAME_CACHE[key]
+
+
+def _load_frame(path: Path, columns: Optional[Sequence[str]]) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        wanted = None
+        if columns is not None:
+            present = set(pq.read_schema(path).names)
+            wanted = [c for c in columns if c in present]
+        return _lists_from_arrow(pd.read_parquet(path, columns=wanted))
+    usecols = None
+    if columns is not None:
+        wanted_set = set(columns)
+        usecols = lambda c: c in wanted_set  # noqa: E731 - missing columns are simply absent
+    return pd.read_excel(path, engine=EXCEL_ENGINE, usecols=usecols)
+
+
+def _own_copy(df: pd.DataFrame) -> pd.DataFrame:
+    # DataFrame.copy() shares the list/dict cells; a caller editing one in place must not edit the cache
+    out = df.copy()
+    for col in out.columns:
+        if out[col].dtype == object:
+            out[col] = out[col].map(lambda v: copy.deepcopy(v) if isinstance(v, (list, dict)) else v)
+    return out
+
+
+def read_frame(path: Path, columns: Optional[Sequence[str]] = None, use_cache: bool = False) -> pd.DataFrame:
+    """Read a stage file by suffix: .parquet (list columns as lists) or .xlsx.
+
+    The shared loader of every stage. columns loads only those columns (ones the file
+    lacks are skipped). With use_cache, frames are kept per (path, columns) for the last
+    FRAME_CACHE_SIZE reads and reused while the file's mtime and size are unchanged;
+    callers always get their own copy, list cells included.
+    """
+    if not use_cache:
+        return _load_frame(path, columns)
+    key = (str(path.resolve()), tuple(columns) if columns is not None else None)
+    st = path.stat()
+    with _FRAME_CACHE_LOCK:
+        hit = _FRAME_CACHE.get(key)
+        if hit is not None:
+            _FRAME_CACHE.move_to_end(key)
+    if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        return _own_copy(hit[2])
+    df = _load_frame(path, columns)
+    with _FRAME_CACHE_LOCK:
+        _FRAME_CACHE[key] = (st.st_mtime_ns, st.st_size, df)
+        _FRAME_CACHE.move_to_end(key)
+        while len(_FRAME_CACHE) > FRAME_CACHE_SIZE:
+            _FRAME_CACHE.popitem(last=False)
+    return _own_copy(df)
+
+
+def iter_frame(path: Path, columns: Optional[Sequence[str]] = None, batch_rows: int = 1000) -> Iterator[pd.DataFrame]:
+    """read_frame in batches of at most batch_rows rows, so one batch is in memory at a time.
+    Only parquet files can be read in parts; an xlsx file comes as one batch."""
+    if path.suffix != ".parquet":
+        yield _load_frame(path, columns)
+        return
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    wanted = None if columns is None else [c for c in columns if c in pf.schema_arrow.names]
+    for batch in pf.iter_batches(batch_size=batch_rows, columns=wanted):
+        yield _lists_from_arrow(batch.to_pandas())
+
+
+def rewrite_frame(path: Path, fn: Callable[[pd.DataFrame], pd.DataFrame], batch_rows: int = 1000) -> None:
+    """Replace a stage file with fn applied to its rows, atomically.
+
+    A parquet file is rewritten batch by batch (fn sees batch_rows rows at a time and must
+    not add columns after the first batch), keeping the types of the columns it already
+    had; an xlsx file is read and written whole."""
+    if path.suffix != ".parquet":
+        write_frame(path, fn(_load_frame(path, None)))
+        return
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    writer = None
+    try:
+        for batch in pf.iter_batches(batch_size=batch_rows):
+            df = fn(_lists_from_arrow(batch.to_pandas()))
+            if writer is None:
+                inferred = pa.Schema.from_pandas(df, preserve_index=False)
+                known = pf.schema_arrow
+                schema = pa.schema([
+                    known.field(c) if c in known.names and not pa.types.is_null(known.field(c).type) else inferred.field(c)
+                    for c in df.columns
+                ])
+                writer = pq.ParquetWriter(str(tmp_path), schema)
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+        if writer is None:
+            # No rows: the file is small enough to go through whole
+            write_frame(path, fn(_load_frame(path, None)))
+            return
+        writer.close()
+        os.replace(tmp_path, path)
+    finally:
+        if writer is not None and writer.is_open:
+            writer.close()
+        if tmp_path.exists():
+            tmp_path.unlink()
+        _forget_frame(path)
+
+
+def _text_scalars(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    for col in out.columns:
+        if out[col].dtype == object:
+            out[col] = out[col].map(lambda v: v if _is_missing(v) or isinstance(v, (list, tuple, dict)) else str(v))
+    return out
+
+
+def write_frame(path: Path, df: pd.DataFrame) -> None:
+    """Write a stage file by suffix, replacing it atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        if path.suffix == ".parquet":
+            pa = _require_pyarrow()
+            try:
+                df.to_parquet(tmp_path, index=False)
+            except (pa.ArrowTypeError, pa.ArrowInvalid):
+                # Mixed scalars in one column (e.g. phones read as numbers and as text): store them as text
+                _text_scalars(df).to_parquet(tmp_path, index=False)
+        else:
+            df.to_excel(tmp_path, index=False, engine="openpyxl")
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        _forget_frame(path)
+
+
+def with_format(file_name: str, fmt: str) -> str:
+    """Same deterministic stem, suffix of the given storage format."""
+    return f"{file_name.rsplit('.', 1)[0] if '.' in file_name else file_name}.{fmt}"
+
+
+def export_xlsx(path: Path) -> Path:
+    """Write an xlsx copy of a stage file for humans: data/export/<stage>/<stem>.xlsx.
+    List columns become their repr, as in the xlsx stage files."""
+    out = path.parent.parent / EXPORT_DIR_NAME / path.parent.name / f"{path.stem}.xlsx"
+    df = read_frame(path)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: str(v) if isinstance(v, (list, tuple, dict)) else v)
+    write_frame(out, df)
+    return out
 
 
 def update_queries_status(file_path: Path, df: pd.DataFrame) -> None:
     # Simply write back the normalized df
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_excel(file_path, index=False)
+    write_frame(file_path, df)
 
 slug_illegal_pattern = re.compile(r"[\\/:*?\"<>|]+")
 collapse_spaces_pattern = re.compile(r"\s+")
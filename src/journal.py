@@ -0,0 +1,173 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.config.base import JOURNAL_DIR
+from src.listing_keys import listing_identity
+
+
+def append_jsonl(path: Path, record: Dict[str, Any]) -> None:
+    """Append one JSON record and fsync, so it survives a crash right after."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield records in order. A torn last line (crash mid-write) is ignored."""
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except Exception:
+                continue
+
+
+def listing_key(row: Dict[str, Any]) -> str:
+    """listing_identity() of the row, so a listing is recognized across sessions whose links
+    differ (viewport/session fragments); the feed position when the row has none."""
+    ident = listing_identity(row)
+    if ident is not None:
+        return ident
+    return f"position:{row.get('position')}"
+
+
+def _journaled_key(key: str) -> str:
+    # Journals written before listing_key used identities are keyed by the raw link
+    if key.startswith("http"):
+        return listing_identity({"listing_link": key}) or key
+    return key
+
+
+class QueryCheckpoint:
+    """Crash-safe progress of one query: data/journal/<slug>.jsonl.
+
+    Records, in append order:
+    - {"type": "rows", "rows": [...]}: the parsed result list, written once after scrolling
+    - {"type": "listing", "key": ..., "data": {...}}: one per enriched listing, as it completes,
+      keyed by listing_key() (the listing's identity, not its link)
+
+    On the next attempt the first rows snapshot stays authoritative and journaled
+    listings are not clicked again. When every listing is journaled the query is
+    rebuilt without opening a page. The journal is deleted once maps/<slug>.xlsx
+    has been written. With enabled=False it tracks the same state in memory only;
+    with fresh=True a leftover journal is deleted instead of resumed (--rescrape).
+    """
+
+    def __init__(self, slug: str, enabled: bool = True, fresh: bool = False):
+        self.enabled = enabled
+        self.path = JOURNAL_DIR / f"{slug}.jsonl"
+        self.snapshot: Optional[List[Dict[str, Any]]] = None
+        self.enriched: Dict[str, Dict[str, Any]] = {}
+        self.resumed = 0
+        if enabled and fresh:
+            self.discard()
+        elif enabled:
+            for rec in read_jsonl(self.path):
+                if rec.get("type") == "rows" and self.snapshot is None and rec.get("rows"):
+                    self.snapshot = rec["rows"]
+                elif rec.get("type") == "listing" and rec.get("key"):
+                    self.enriched[_journaled_key(rec["key"])] = rec.get("data") or {}
+            self.resumed = len(self.enriched)
+        self.rows: List[Dict[str, Any]] = self.snapshot or []
+        self._keys = {listing_key(r) for r in self.rows}
+
+    def is_complete(self) -> bool:
+        """True when a previous attempt journaled every listing of its snapshot."""
+        return bool(self.snapshot) and all(listing_key(r) in self.enriched for r in self.snapshot)
+
+    def scroll_target(self) -> Optional[int]:
+        """Cards the feed must hold to reach the last listing still missing, or None to scroll fully."""
+        if not self.snapshot:
+            return None
+        missing = [i for i, r in enumerate(self.snapshot, start=1) if listing_key(r) not in self.enriched]
+        # One extra batch of slack in case the feed order shifted a little
+        return (max(missing) + 20) if missing else 0
+
+    def begin(self, fresh_rows: List[Dict[str, Any]]) -> None:
+        """Adopt this attempt's parsed rows unless an earlier snapshot exists."""
+        if self.snapshot is None:
+            self.snapshot = fresh_rows
+            if self.enabled and fresh_rows:
+                append_jsonl(self.path, {"type": "rows", "rows": fresh_rows})
+        self.rows = self.snapshot
+        self._keys = {listing_key(r) for r in self.rows}
+
+    def needs_enrichment(self, row: Dict[str, Any]) -> bool:
+        key = listing_key(row)
+        return key in self._keys and key not in self.enriched
+
+    def record(self, row: Dict[str, Any], data: Dict[str, Any]) -> None:
+        key = listing_key(row)
+        self.enriched[key] = data
+        if self.enabled:
+            append_jsonl(self.path, {"type": "listing", "key": key, "data": data})
+
+    def missing(self) -> List[Dict[str, Any]]:
+        """Snapshot rows without enrichment, e.g. listings no card of this attempt's feed matched."""
+        return [r for r in self.rows if listing_key(r) not in self.enriched]
+
+    def compose(self) -> Iterator[Dict[str, Any]]:
+        """Yield the rows with their enrichment merged in, one at a time."""
+        for r in self.rows:
+            yield {**r, **self.enriched.get(listing_key(r), {})}
+
+    def discard(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class QueryStatusJournal:
+    """Write-ahead log of row statuses for one queries file: data/journal/status/<file>.jsonl.
+
+    Every finished row appends {"idx", "url", "status", "slug"} right away, so a crash
+    loses at most the query in flight. apply() replays it onto a freshly read queries
+    file (rows are matched by index and URL, so an edited file is never mislabeled);
+    once the statuses have been written into the xlsx the journal is discarded.
+    """
+
+    def __init__(self, query_file: str, enabled: bool = True):
+        self.enabled = enabled
+        self.path = JOURNAL_DIR / "status" / f"{query_file}.jsonl"
+
+    def apply(self, df) -> int:
+        """Set the journaled statuses on df (the last record per row wins). Returns how many rows changed."""
+        if not self.enabled:
+            return 0
+        latest: Dict[Any, Dict[str, Any]] = {}
+        for rec in read_jsonl(self.path):
+            latest[rec.get("idx")] = rec
+        applied = 0
+        for idx, rec in latest.items():
+            if idx not in df.index:
+                continue
+            if str(df.at[idx, "query_url"]).strip() != rec.get("url"):
+                continue
+            if df.at[idx, "status"] != rec.get("status"):
+                df.at[idx, "status"] = rec.get("status")
+                applied += 1
+        return applied
+
+    def record(self, idx: Any, url: str, status: str, slug: Optional[str] = None) -> None:
+        if self.enabled:
+            # DataFrame labels are numpy ints, which json would only write as strings
+            if hasattr(idx, "item"):
+                idx = idx.item()
+            append_jsonl(self.path, {"idx": idx, "url": url, "status": status, "slug": slug})
+
+    def discard(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
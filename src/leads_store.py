@@ -0,0 +1,361 @@
+# Optional SQLite store (data/leads.db) for the bookkeeping the stages otherwise do by
+# rewriting whole spreadsheets. With --db, status changes are single-row UPDATEs and
+# pending rows come from an index scan; the xlsx files become views generated on demand:
+#   python -m src.leads_store export {queries,maps,combined,results} <file name>
+import argparse
+import datetime as dt
+import json
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+from src.config.base import LEADS_DB_PATH, QUERIES_DIR, MAPS_DIR, COMBINED_DIR, RESULTS_DIR
+from src.io_helpers import read_frame, write_frame, write_map_results, safe_print
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    query_file TEXT NOT NULL,
+    row_idx INTEGER NOT NULL,
+    query_url TEXT,
+    search_volume TEXT,
+    status TEXT NOT NULL DEFAULT '',
+    slug TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (query_file, row_idx)
+);
+CREATE INDEX IF NOT EXISTS idx_queries_status ON queries (query_file, status);
+
+CREATE TABLE IF NOT EXISTS listings (
+    listing_link TEXT PRIMARY KEY,
+    place_id TEXT,
+    cid TEXT,
+    data TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_listings_place_id ON listings (place_id);
+CREATE INDEX IF NOT EXISTS idx_listings_cid ON listings (cid);
+
+CREATE TABLE IF NOT EXISTS map_memberships (
+    map_file TEXT NOT NULL,
+    listing_link TEXT NOT NULL,
+    position INTEGER,
+    source_file TEXT,
+    search_volume TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    PRIMARY KEY (map_file, listing_link)
+);
+CREATE INDEX IF NOT EXISTS idx_memberships_link ON map_memberships (listing_link);
+CREATE INDEX IF NOT EXISTS idx_memberships_status ON map_memberships (map_file, status);
+
+CREATE TABLE IF NOT EXISTS evaluations (
+    combined_file TEXT NOT NULL,
+    listing_link TEXT NOT NULL,
+    row_idx INTEGER,
+    data TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    eval_rating TEXT,
+    eval_time TEXT,
+    notes TEXT,
+    PRIMARY KEY (combined_file, listing_link)
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_status ON evaluations (combined_file, status);
+"""
+
+# Per-listing fields kept in listings.data; the rest of a map row is membership data
+_MEMBERSHIP_FIELDS = ("listing_link", "position", "source_file", "search_volume", "status")
+
+
+def _now() -> str:
+    return dt.datetime.now().isoformat(timespec="seconds")
+
+
+def _text(v: Any) -> Optional[str]:
+    if v is None or (isinstance(v, float) and v != v):
+        return None
+    return str(v)
+
+
+def _url(v: Any) -> Optional[str]:
+    return (_text(v) or "").strip() or None
+
+
+def _json(v: Dict[str, Any]) -> str:
+    return json.dumps(v, ensure_ascii=False, default=str)
+
+
+class LeadsStore:
+    """Queries, listings, map memberships and evaluations in one SQLite file.
+
+    Used from one thread per process (the stages record results on their main thread).
+    """
+
+    def __init__(self, path: Path = LEADS_DB_PATH):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+    # --- queries ---
+
+    def sync_queries(self, query_file: str, df: pd.DataFrame) -> None:
+        """Bring the store's rows of a queries file in line with the file.
+
+        Rows are matched by index and URL: a new row, or a row whose URL changed (rows were
+        inserted, removed or edited), takes the file's URL, search volume and status and
+        loses its slug; a row whose URL is unchanged keeps its stored status. Rows no
+        longer in the file are dropped."""
+        now = _now()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO queries (query_file, row_idx, query_url, search_volume, status, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(query_file, row_idx) DO UPDATE SET"
+                " status = CASE WHEN query_url IS excluded.query_url THEN status ELSE excluded.status END,"
+                " slug = CASE WHEN query_url IS excluded.query_url THEN slug ELSE NULL END,"
+                " updated_at = CASE WHEN query_url IS excluded.query_url THEN updated_at ELSE excluded.updated_at END,"
+                " query_url = excluded.query_url, search_volume = excluded.search_volume",
+                [
+                    (query_file, int(idx), _url(row.get("query_url")), _text(row.get("search_volume")),
+                     (_text(row.get("status")) or "").strip().lower(), now)
+                    for idx, row in df.iterrows()
+                ],
+            )
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS _rows (row_idx INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM _rows")
+            self.conn.executemany("INSERT OR IGNORE INTO _rows VALUES (?)", [(int(i),) for i in df.index])
+            self.conn.execute(
+                "DELETE FROM queries WHERE query_file = ? AND row_idx NOT IN (SELECT row_idx FROM _rows)",
+                (query_file,),
+            )
+
+    def query_statuses(self, query_file: str) -> Dict[int, Tuple[Optional[str], str]]:
+        """(query URL, status) of every stored row of a queries file, by row index."""
+        cur = self.conn.execute("SELECT row_idx, query_url, status FROM queries WHERE query_file = ?", (query_file,))
+        return {r["row_idx"]: (r["query_url"], r["status"]) for r in cur}
+
+    def apply_query_statuses(self, query_file: str, df: pd.DataFrame) -> int:
+        """Set the stored statuses on df, for rows whose URL is still the stored one (as
+        QueryStatusJournal.apply does). Returns how many rows changed."""
+        if "status" not in df.columns:
+            df["status"] = ""
+        applied = 0
+        for idx, (url, status) in self.query_statuses(query_file).items():
+            if idx not in df.index or _url(df.at[idx, "query_url"]) != url:
+                continue
+            if df.at[idx, "status"] != status:
+                df.at[idx, "status"] = status
+                applied += 1
+        return applied
+
+    def pending_query_rows(self, query_file: str) -> List[int]:
+        """Rows not yet scraped successfully (index scan on (query_file, status)).
+        Call sync_queries first, so the stored rows are the file's."""
+        cur = self.conn.execute(
+            "SELECT row_idx FROM queries WHERE query_file = ? AND status != 'success' ORDER BY row_idx",
+            (query_file,),
+        )
+        return [r["row_idx"] for r in cur]
+
+    def set_query_status(self, query_file: str, row_idx: int, status: str, slug: Optional[str] = None) -> None:
+        self.conn.execute(
+            "UPDATE queries SET status = ?, slug = COALESCE(?, slug), updated_at = ? WHERE query_file = ? AND row_idx = ?",
+            (status, slug, _now(), query_file, int(row_idx)),
+        )
+        self.conn.commit()
+
+    # --- listings and map memberships ---
+
+    def stream_map_rows(self, map_file: str, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Pass rows through unchanged while upserting their listings and memberships, so the
+        store is filled in the same pass that writes the map file. Commits once exhausted."""
+        now = _now()
+        self.conn.execute("DELETE FROM map_memberships WHERE map_file = ?", (map_file,))
+        try:
+            for row in rows:
+                link = _text(row.get("listing_link"))
+                if link:
+                    data = {k: v for k, v in row.items() if k not in _MEMBERSHIP_FIELDS}
+                    self.conn.execute(
+                        "INSERT INTO listings (listing_link, place_id, cid, data, updated_at) VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT(listing_link) DO UPDATE SET place_id = COALESCE(excluded.place_id, place_id),"
+                        " cid = COALESCE(excluded.cid, cid), data = excluded.data, updated_at = excluded.updated_at",
+                        (link, _text(row.get("place_id")), _text(row.get("CID")), _json(data), now),
+                    )
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO map_memberships"
+                        " (map_file, listing_link, position, source_file, search_volume, status)"
+                        " VALUES (?, ?, ?, ?, ?, 'pending')",
+                        (map_file, link, row.get("position"), _text(row.get("source_file")),
+                         _text(row.get("search_volume"))),
+                    )
+                yield row
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def add_map_rows(self, map_file: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """Upsert the listings of one map file and replace its memberships. Returns the row count."""
+        return sum(1 for _ in self.stream_map_rows(map_file, rows))
+
+    def register_map_files(self, paths: Sequence[Path]) -> int:
+        """Add the memberships of map files the store has none for (scraped without --db),
+        read from the files themselves. Returns how many files were added."""
+        added = 0
+        for path in paths:
+            known = self.conn.execute(
+                "SELECT 1 FROM map_memberships WHERE map_file = ? LIMIT 1", (path.name,)
+            ).fetchone()
+            if known is not None:
+                continue
+            df = read_frame(path)
+            df = df.astype(object).where(df.notna(), None)
+            self.add_map_rows(path.name, df.to_dict(orient="records"))
+            added += 1
+        return added
+
+    def set_membership_statuses(self, map_files: List[str], included_links: Set[str]) -> int:
+        """deduplicate's status rule: 'success' for links in the combined output, else 'pending'.
+        Only map files with memberships are updated (see register_map_files). Returns how
+        many memberships were updated."""
+        updated = 0
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS _included (listing_link TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM _included")
+            self.conn.executemany("INSERT OR IGNORE INTO _included VALUES (?)", [(l,) for l in included_links])
+            for map_file in map_files:
+                cur = self.conn.execute(
+                    "UPDATE map_memberships SET status = CASE WHEN listing_link IN (SELECT listing_link FROM _included)"
+                    " THEN 'success' ELSE 'pending' END WHERE map_file = ?",
+                    (map_file,),
+                )
+                updated += cur.rowcount
+        return updated
+
+    # --- evaluations ---
+
+    def add_combined_rows(self, combined_file: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Register the rows of a combined file; earlier evaluations of the same listing are kept."""
+        with self.conn:
+            for idx, row in enumerate(rows):
+                link = _text(row.get("listing_link"))
+                if not link:
+                    continue
+                data = _json({k: v for k, v in row.items() if k != "status"})
+                self.conn.execute(
+                    "INSERT INTO evaluations (combined_file, listing_link, row_idx, data) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(combined_file, listing_link) DO UPDATE SET row_idx = excluded.row_idx, data = excluded.data",
+                    (combined_file, link, idx, data),
+                )
+
+    def evaluation_statuses(self, combined_file: str) -> Dict[str, str]:
+        cur = self.conn.execute(
+            "SELECT listing_link, status FROM evaluations WHERE combined_file = ?", (combined_file,)
+        )
+        return {r["listing_link"]: r["status"] for r in cur}
+
+    def save_evaluation(self, combined_file: str, listing_link: str, rating: str, notes: str, eval_time: str) -> None:
+        """Record a rating: one UPDATE sets the parent status and the evaluation together."""
+        self.conn.execute(
+            "UPDATE evaluations SET status = ?, eval_rating = ?, notes = ?, eval_time = ?"
+            " WHERE combined_file = ? AND listing_link = ?",
+            (rating, rating, notes, eval_time, combined_file, listing_link),
+        )
+        self.conn.commit()
+
+    def last_evaluation(self, combined_file: str, listing_link: str) -> Optional[Dict[str, Any]]:
+        cur = self.conn.execute(
+            "SELECT eval_rating, notes, eval_time FROM evaluations"
+            " WHERE combined_file = ? AND listing_link = ? AND eval_rating IS NOT NULL",
+            (combined_file, listing_link),
+        )
+        r = cur.fetchone()
+        return dict(r) if r else None
+
+    # --- views ---
+
+    def queries_view(self, query_file: str) -> pd.DataFrame:
+        cur = self.conn.execute(
+            "SELECT query_url, status, search_volume FROM queries WHERE query_file = ? ORDER BY row_idx", (query_file,)
+        )
+        return pd.DataFrame([dict(r) for r in cur], columns=["query_url", "status", "search_volume"])
+
+    def map_rows(self, map_file: str) -> Iterable[Dict[str, Any]]:
+        cur = self.conn.execute(
+            "SELECT m.listing_link, m.position, m.source_file, m.search_volume, m.status, l.data"
+            " FROM map_memberships m JOIN listings l ON l.listing_link = m.listing_link"
+            " WHERE m.map_file = ? ORDER BY m.position",
+            (map_file,),
+        )
+        for r in cur:
+            yield {**json.loads(r["data"]), "listing_link": r["listing_link"], "position": r["position"],
+                   "source_file": r["source_file"], "search_volume": r["search_volume"], "status": r["status"]}
+
+    def combined_view(self, combined_file: str, evaluated_only: bool = False) -> pd.DataFrame:
+        sql = "SELECT data, status, eval_rating, eval_time, notes FROM evaluations WHERE combined_file = ?"
+        if evaluated_only:
+            sql += " AND eval_rating IS NOT NULL"
+        rows = []
+        for r in self.conn.execute(sql + " ORDER BY row_idx", (combined_file,)):
+            row = {**json.loads(r["data"]), "status": r["status"]}
+            if evaluated_only:
+                row.update(eval_rating=r["eval_rating"], eval_time=r["eval_time"], notes=r["notes"])
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def export(self, kind: str, name: str) -> Path:
+        """Regenerate the xlsx/parquet file of one stage from the store, at its usual path."""
+        if kind == "queries":
+            out = QUERIES_DIR / name
+            if out.exists():
+                # The queries file is user input: only its status column is regenerated
+                df = read_frame(out)
+                self.apply_query_statuses(name, df)
+            else:
+                df = self.queries_view(name)
+            write_frame(out, df)
+        elif kind == "maps":
+            out = MAPS_DIR / name
+            write_map_results(out, self.map_rows(name))
+        elif kind == "combined":
+            out = COMBINED_DIR / name
+            write_frame(out, self.combined_view(name))
+        elif kind == "results":
+            out = RESULTS_DIR / name
+            write_frame(out, self.combined_view(name, evaluated_only=True))
+        else:
+            raise ValueError(f"Unknown view '{kind}'")
+        return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate stage files from data/leads.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="Write a stage file from the store")
+    exp.add_argument("kind", choices=["queries", "maps", "combined", "results"])
+    exp.add_argument("names", type=str, help="Comma-separated file names, as used by the stage")
+    args = parser.parse_args(argv)
+
+    store = LeadsStore()
+    try:
+        for name in [n.strip() for n in args.names.split(",") if n.strip()]:
+            safe_print(f"[✓] Exported {store.export(args.kind, name)}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
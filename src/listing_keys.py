@@ -0,0 +1,70 @@
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote
+
+# "!1s0x876c...:0x1a2b..." inside a Maps place link; the second hex half is the CID
+FID_IN_LINK_RE = re.compile(r"!1s(0x[0-9a-f]+):(0x[0-9a-f]+)", re.IGNORECASE)
+
+
+def _is_blank(v: Any) -> bool:
+    return v is None or (isinstance(v, float) and v != v) or (isinstance(v, str) and not v.strip())
+
+
+def cid_from_link(link: Any) -> Optional[str]:
+    """Decimal CID embedded in a Maps place link, if any."""
+    if not isinstance(link, str):
+        return None
+    m = FID_IN_LINK_RE.search(unquote(link))
+    if not m:
+        return None
+    try:
+        return str(int(m.group(2), 16))
+    except ValueError:
+        return None
+
+
+def listing_identity(row: Dict[str, Any]) -> Optional[str]:
+    """Stable identifier of a listing, independent of how its link was captured.
+
+    Prefers the CID (from the link's feature id or a CID column), then the place id,
+    then the link without its query string. Returns None when nothing usable exists.
+    """
+    cid = cid_from_link(row.get("listing_link"))
+    if cid is None and not _is_blank(row.get("CID")):
+        try:
+            cid = str(int(str(row.get("CID")).strip()))
+        except ValueError:
+            cid = None
+    if cid is not None:
+        return f"cid:{cid}"
+    place_id = row.get("place_id")
+    if not _is_blank(place_id):
+        return f"pid:{str(place_id).strip()}"
+    link = row.get("listing_link")
+    if not _is_blank(link):
+        return "url:" + str(link).strip().split("?", 1)[0]
+    return None
+
+
+def match_cards_to_rows(links: List[Optional[str]], rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+    """Index of the row behind each result card, matched by listing_identity of the card's link.
+
+    Rows decoded from intercepted payloads need not follow the feed's card order (the
+    initial state can carry extra records, sponsored cards shift the rest), so a card is
+    never paired with a row by position. Cards without a link, or whose listing no row
+    carries, map to None and must not be clicked. Each row is matched at most once, and a
+    matched row takes the card's link, so it is stored exactly as the DOM parser stores it.
+    """
+    by_identity: Dict[str, int] = {}
+    for i, row in enumerate(rows):
+        ident = listing_identity(row)
+        if ident is not None:
+            by_identity.setdefault(ident, i)
+    matches: List[Optional[int]] = []
+    for link in links:
+        ident = listing_identity({"listing_link": link}) if isinstance(link, str) and link.startswith("http") else None
+        i = by_identity.pop(ident, None) if ident is not None else None
+        if i is not None:
+            rows[i]["listing_link"] = link
+        matches.append(i)
+    return matches
@@ -8,6 +8,8 @@ from typing import Optional, Dict, Any
 
 from bs4 import BeautifulSoup
 
+from src.html_backends import get_html_backend
+
 
 @dataclass
 class MapsItem:
@@ -80,41 +82,46 @@ def parse_maps_item_container(container_html: str) -> MapsItem:
 
 
 def parse_maps_item_soup(container) -> MapsItem:
+    return parse_maps_item_node(container, get_html_backend("bs4"))
+
+
+def parse_maps_item_node(container, backend) -> MapsItem:
+    """Extract a MapsItem from a card node of any backend in src.html_backends."""
     item = MapsItem()
 
     # Listing link and name
-    a = container.select_one("a.hfpxzc")
-    if a:
-        href = a.get("href", "")
+    a = backend.select_one(container, "a.hfpxzc")
+    if a is not None:
+        href = backend.attr(a, "href", "")
         if href.startswith("http"):
             item.listing_link = href
         # aria-label often equals the business name
-        item.name = _clean_text(a.get("aria-label"))
+        item.name = _clean_text(backend.attr(a, "aria-label"))
 
     # Fallback name from headline div
     if not item.name:
-        name_div = container.select_one("div.qBF1Pd")
-        if name_div:
-            item.name = _clean_text(name_div.get_text(" "))
+        name_div = backend.select_one(container, "div.qBF1Pd")
+        if name_div is not None:
+            item.name = _clean_text(backend.text(name_div))
 
     # Rating and reviews
-    rating_wrap = container.select_one("span.ZkP5Je[aria-label]")
-    if rating_wrap:
-        rating_val = rating_wrap.select_one("span.MW4etd")
-        if rating_val:
-            item.rating = _extract_float(rating_val.get_text())
-        reviews_val = rating_wrap.select_one("span.UY7F9")
-        if reviews_val:
-            item.reviews_count = _extract_int(reviews_val.get_text())
+    rating_wrap = backend.select_one(container, "span.ZkP5Je[aria-label]")
+    if rating_wrap is not None:
+        rating_val = backend.select_one(rating_wrap, "span.MW4etd")
+        if rating_val is not None:
+            item.rating = _extract_float(backend.text(rating_val, ""))
+        reviews_val = backend.select_one(rating_wrap, "span.UY7F9")
+        if reviews_val is not None:
+            item.reviews_count = _extract_int(backend.text(reviews_val, ""))
 
     # Categories (explicit list if present)
     # Example container: <div class="category-list-display btn-gmb-category-tool"> ... </div>
-    explicit_cat_div = container.select_one("div.category-list-display")
-    if explicit_cat_div:
+    explicit_cat_div = backend.select_one(container, "div.category-list-display")
+    if explicit_cat_div is not None:
         # Collect text from likely elements; skip empty/icon-only bits
         raw_parts = []
-        for el in explicit_cat_div.find_all(["a", "span", "div"], recursive=True):
-            txt = _clean_text(el.get_text(" "))
+        for el in backend.descendants(explicit_cat_div, ("a", "span", "div")):
+            txt = _clean_text(backend.text(el))
             if txt:
                 raw_parts.append(txt)
         # Also split on common separators
@@ -136,19 +143,19 @@ def parse_maps_item_soup(container) -> MapsItem:
         item.categories = deduped
 
     # Category, address, phone, and status lines live in W4Efsd blocks
-    w_blocks = container.select("div.W4Efsd")
+    w_blocks = backend.select(container, "div.W4Efsd")
 
     # First block with category/address can be nested; flatten text segments
     category = None
     address = None
     for block in w_blocks:
-        text = _clean_text(block.get_text(" "))
+        text = _clean_text(backend.text(block))
         if not text:
             continue
         # Identify phone line by known class
-        phone_span = block.select_one("span.UsdlK")
-        if phone_span:
-            item.phone = _clean_text(phone_span.get_text())
+        phone_span = backend.select_one(block, "span.UsdlK")
+        if phone_span is not None:
+            item.phone = _clean_text(backend.text(phone_span, ""))
         # A status line often contains "Closed"/"Open" or "Opens"/"Closes"
         if any(kw in text.lower() for kw in ("open", "closed", "closes", "opens")) and not item.status:
             item.status = text
@@ -172,16 +179,16 @@ def parse_maps_item_soup(container) -> MapsItem:
     # Website
     # Try by aria-label that starts with "Visit <Name>'s website"
     website_a = None
-    for cand in container.select("a[aria-label]"):
-        aria = (cand.get("aria-label") or "").lower()
+    for cand in backend.select(container, "a[aria-label]"):
+        aria = (backend.attr(cand, "aria-label") or "").lower()
         if "website" in aria:
             website_a = cand
             break
     # Fallback by data-value
-    if not website_a:
-        website_a = container.select_one("a[data-value=Website]")
-    if website_a and website_a.get("href").startswith("http"):
-        item.website = website_a.get("href")
+    if website_a is None:
+        website_a = backend.select_one(container, "a[data-value=Website]")
+    if website_a is not None and backend.attr(website_a, "href").startswith("http"):
+        item.website = backend.attr(website_a, "href")
 
     return item
 
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, quote_plus, urlparse
+
+from src.maps_item_parser import MapsItem, _clean_text, _is_noise_category, _normalize_category
+
+# Google prefixes its JSON payloads with this anti-XSSI guard
+XSSI_PREFIX = ")]}'"
+
+# Feature id of a place, e.g. "0x876c7f5e2e7f6c7b:0x1234abcd"; the second half is the CID in hex
+FID_RE = re.compile(r"^0x[0-9a-f]+:0x[0-9a-f]+$", re.IGNORECASE)
+
+# Search and pagination payloads of the results feed
+SEARCH_RESPONSE_MARKERS = ("tbm=map", "/maps/search")
+
+# Serializes the embedded initial state; it carries the first page of results
+INITIAL_STATE_JS = "() => { const s = window.APP_INITIALIZATION_STATE; return s ? JSON.stringify(s) : null; }"
+
+
+def is_search_response(url: str) -> bool:
+    return any(marker in url for marker in SEARCH_RESPONSE_MARKERS)
+
+
+def _dig(node: Any, *path: int) -> Any:
+    """Safe nested index into the positional arrays Maps uses; None when missing."""
+    for i in path:
+        if not isinstance(node, list) or i >= len(node) or i < -len(node):
+            return None
+        node = node[i]
+    return node
+
+
+def _loads_payload(text: str) -> Any:
+    """Decode a Maps JSON payload, tolerating the XSSI guard and the {"d": "..."} envelope."""
+    if not text:
+        return None
+    s = text.lstrip()
+    if s.startswith(XSSI_PREFIX):
+        s = s[len(XSSI_PREFIX):]
+    # Pagination responses may end with a /*""*/ marker
+    if s.rstrip().endswith('/*""*/'):
+        s = s.rstrip()[: -len('/*""*/')]
+    try:
+        data = json.loads(s)
+    except Exception:
+        return None
+    if isinstance(data, dict) and isinstance(data.get("d"), str):
+        return _loads_payload(data["d"])
+    return data
+
+
+def _is_place_record(node: Any) -> bool:
+    return (
+        isinstance(node, list)
+        and len(node) > 11
+        and isinstance(node[11], str)
+        and isinstance(node[10], str)
+        and bool(FID_RE.match(node[10]))
+    )
+
+
+def _iter_place_records(node: Any) -> Iterator[list]:
+    """Yield every place record in a decoded payload, in document order.
+
+    Record positions shift between Maps releases, so instead of a fixed path the
+    tree is walked and records are recognized by shape (name at [11], feature id at [10]).
+    Strings that are themselves guarded payloads (as in the initial state) are decoded too.
+    """
+    stack = [node]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, list):
+            if _is_place_record(cur):
+                yield cur
+                continue
+            stack.extend(reversed(cur))
+        elif isinstance(cur, str) and cur.startswith(XSSI_PREFIX):
+            nested = _loads_payload(cur)
+            if nested is not None:
+                stack.append(nested)
+
+
+def _website_from(raw: Optional[str]) -> Optional[str]:
+    if not isinstance(raw, str) or not raw:
+        return None
+    if raw.startswith("/url?"):
+        q = parse_qs(urlparse(raw).query).get("q")
+        raw = q[0] if q else ""
+    return raw if raw.startswith("http") else None
+
+
+def decode_place_record(rec: list) -> Dict[str, Any]:
+    """Turn one positional place record into a row with the same keys as the DOM parser."""
+    item = MapsItem()
+    item.name = _clean_text(_dig(rec, 11))
+
+    cats = _dig(rec, 13)
+    if isinstance(cats, list):
+        item.categories = [
+            _normalize_category(c) for c in cats if isinstance(c, str) and c.strip() and not _is_noise_category(c)
+        ]
+
+    rating = _dig(rec, 4, 7)
+    if isinstance(rating, (int, float)):
+        item.rating = float(rating)
+    reviews = _dig(rec, 4, 8)
+    if isinstance(reviews, int):
+        item.reviews_count = reviews
+
+    address = _dig(rec, 39)
+    if not isinstance(address, str):
+        lines = _dig(rec, 2)
+        address = ", ".join(p for p in lines if isinstance(p, str)) if isinstance(lines, list) else None
+    item.address = _clean_text(address)
+
+    phone = _dig(rec, 178, 0, 0)
+    item.phone = _clean_text(phone) if isinstance(phone, str) else None
+    item.website = _website_from(_dig(rec, 7, 0))
+
+    fid = rec[10]
+    # Not the href a card carries (that one has coordinates and more segments): rows with a
+    # card take its link in match_cards_to_rows; the rest keep this one, so they only meet
+    # their dom-parsed twins through listing_identity (deduplicate --resolve)
+    if item.name:
+        item.listing_link = f"https://www.google.com/maps/place/{quote_plus(item.name)}/data=!4m2!3m1!1s{fid}"
+    else:
+        item.listing_link = f"https://www.google.com/maps/place/data=!4m2!3m1!1s{fid}"
+
+    row = item.to_dict()
+    place_id = _dig(rec, 78)
+    if isinstance(place_id, str) and place_id:
+        row["place_id"] = place_id
+    try:
+        row["CID"] = str(int(fid.split(":")[1], 16))
+    except Exception:
+        pass
+    lat, lng = _dig(rec, 9, 2), _dig(rec, 9, 3)
+    if isinstance(lat, (int, float)) and isinstance(lng, (int, float)):
+        row["coordinates"] = [float(lat), float(lng)]
+    return row
+
+
+def decode_search_payload(text: str) -> List[Dict[str, Any]]:
+    """Decode all place records from one search/pagination response body or initial state."""
+    data = _loads_payload(text)
+    if data is None:
+        return []
+    rows: List[Dict[str, Any]] = []
+    for rec in _iter_place_records(data):
+        try:
+            rows.append(decode_place_record(rec))
+        except Exception:
+            continue
+    return rows
+
+
+class MapsResponseCollector:
+    """Collects the Maps search payloads a page receives while it scrolls.
+
+    Attach on_response (sync pages) or on_response_async (async pages) to
+    page.on("response") before navigating. Each body is read as its response
+    arrives, while Playwright still holds it; bodies that cannot be read are
+    counted in failed. collect()/collect_async() merge them once scrolling is done.
+    """
+
+    def __init__(self) -> None:
+        # Bodies in arrival order; None where the read failed or is still pending
+        self.bodies: List[Optional[str]] = []
+        self.failed = 0
+        self._pending: List[asyncio.Future] = []
+
+    def on_response(self, response) -> None:
+        try:
+            if not is_search_response(response.url):
+                return
+        except Exception:
+            return
+        try:
+            self.bodies.append(response.text())
+        except Exception:
+            self.failed += 1
+
+    def on_response_async(self, response) -> None:
+        try:
+            if not is_search_response(response.url):
+                return
+        except Exception:
+            return
+        # Keep the arrival slot; the body is read by a task collect_async waits for
+        slot = len(self.bodies)
+        self.bodies.append(None)
+        self._pending.append(asyncio.ensure_future(self._read_async(response, slot)))
+
+    async def _read_async(self, response, slot: int) -> None:
+        try:
+            self.bodies[slot] = await response.text()
+        except Exception:
+            self.failed += 1
+
+    def _merge(self, payloads: List[str], source_file: str) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        seen = set()
+        for text in payloads:
+            for row in decode_search_payload(text):
+                key = row.get("listing_link")
+                if key in seen:
+                    continue
+                seen.add(key)
+                row["position"] = len(rows) + 1
+                row["source_file"] = source_file
+                rows.append(row)
+        return rows
+
+    def collect(self, page, source_file: str) -> List[Dict[str, Any]]:
+        """Rows from the initial state followed by every intercepted page, deduplicated in order."""
+        payloads: List[str] = []
+        try:
+            state = page.evaluate(INITIAL_STATE_JS)
+            if state:
+                payloads.append(state)
+        except Exception:
+            pass
+        payloads.extend(b for b in self.bodies if b is not None)
+        return self._merge(payloads, source_file)
+
+    async def collect_async(self, page, source_file: str) -> List[Dict[str, Any]]:
+        payloads: List[str] = []
+        try:
+            state = await page.evaluate(INITIAL_STATE_JS)
+            if state:
+                payloads.append(state)
+        except Exception:
+            pass
+        if self._pending:
+            await asyncio.gather(*self._pending)
+            self._pending = []
+        payloads.extend(b for b in self.bodies if b is not None)
+        return self._merge(payloads, source_file)
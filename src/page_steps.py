@@ -0,0 +1,44 @@
+# Page logic written once for the sync and the async Playwright API. The logic is a
+# generator that yields each page call it needs as a step, (method name, args); a driver
+# performs the step on an adapter and sends the result back in, or throws the exception
+# the call raised into the generator, so its try/except blocks work as in plain code.
+# Adapters hold nothing but those calls: the sync one makes them, the async one awaits
+# them under the same method names.
+#   state = yield "evaluate", (FEED_WATCH_JS, args)
+#   stats = run_steps(scroll_steps(cfg), FeedPage(page))
+#   stats = await run_steps_async(scroll_steps(cfg), AsyncFeedPage(page))
+from typing import Any, Generator, Tuple, TypeVar
+
+T = TypeVar("T")
+Step = Tuple[str, Tuple[Any, ...]]
+Steps = Generator[Step, Any, T]
+
+
+def run_steps(steps: Steps[T], adapter: Any) -> T:
+    """Run the steps to completion on a sync adapter; returns what the generator returns."""
+    reply: Any = None
+    error: Any = None
+    while True:
+        try:
+            name, args = steps.send(reply) if error is None else steps.throw(error)
+        except StopIteration as done:
+            return done.value
+        try:
+            reply, error = getattr(adapter, name)(*args), None
+        except Exception as e:
+            reply, error = None, e
+
+
+async def run_steps_async(steps: Steps[T], adapter: Any) -> T:
+    """run_steps on an async adapter, whose methods are awaited."""
+    reply: Any = None
+    error: Any = None
+    while True:
+        try:
+            name, args = steps.send(reply) if error is None else steps.throw(error)
+        except StopIteration as done:
+            return done.value
+        try:
+            reply, error = await getattr(adapter, name)(*args), None
+        except Exception as e:
+            reply, error = None, e
@@ -1,36 +1,69 @@
-from typing import List, Dict
-from bs4 import BeautifulSoup
-from src.maps_item_parser import parse_maps_item_container
+from typing import Dict, Iterator, List
+from src.html_backends import get_html_backend
+from src.maps_item_parser import parse_maps_item_node
 
-def extract_businesses_from_html(html: str, source_file: str) -> List[Dict]:
-    """Parse all visible result items from a Google Maps results page HTML.
+CONTAINER_SELECTOR = "div.Nv2PK.tH5CWc.THOPZb"
+CONTAINER_FALLBACK_SELECTOR = "div.Nv2PK"
+
+
+def _select_containers(doc, backend) -> List:
+    containers = backend.select(doc, CONTAINER_SELECTOR)
+    if not containers:
+        containers = backend.select(doc, CONTAINER_FALLBACK_SELECTOR)
+    return containers
+
+
+def _row_from_container(container, position: int, source_file: str, backend) -> Dict:
+    try:
+        item = parse_maps_item_node(container, backend)
+        data = item.to_dict()
+    except Exception as e:
+        # On parse failure, continue but record minimal info
+        data = {"name": None, "categories": [], "rating": None, "reviews_count": None,
+                "address": None, "phone": None, "website": None, "listing_link": None,
+                "status": f"parse_error: {e}"}
+
+    # Augment with position and source
+    data["position"] = position
+    data["source_file"] = source_file
+    return data
+
+
+def iter_businesses_from_html(html: str, source_file: str, backend: str = "bs4") -> Iterator[Dict]:
+    """Yield the result items of a Google Maps results page HTML one row at a time.
 
     Targets containers with classes: Nv2PK tH5CWc THOPZb. Falls back to Nv2PK if none found.
-    Uses parse_maps_item_container() to extract a MapsItem from each container's HTML.
+    The page is parsed once and each container node is handed to parse_maps_item_node() in place.
+    backend picks the HTML tree implementation (see src.html_backends); the rows are identical.
     """
-    try:
-        soup = BeautifulSoup(html, "html.parser")
-    except Exception:
-        soup = BeautifulSoup(html, "lxml")  # fallback if available at runtime
+    be = get_html_backend(backend)
+    doc = be.parse(html)
+    for idx, el in enumerate(_select_containers(doc, be), start=1):
+        yield _row_from_container(el, idx, source_file, be)
 
-    containers = soup.select("div.Nv2PK.tH5CWc.THOPZb")
-    if not containers:
-        containers = soup.select("div.Nv2PK")
-
-    rows: List[Dict] = []
-    for idx, el in enumerate(containers, start=1):
-        try:
-            item = parse_maps_item_container(str(el))
-            data = item.to_dict()
-        except Exception as e:
-            # On parse failure, continue but record minimal info
-            data = {"name": None, "categories": [], "rating": None, "reviews_count": None,
-                    "address": None, "phone": None, "website": None, "listing_link": None,
-                    "status": f"parse_error: {e}"}
-
-        # Augment with position and source
-        data["position"] = idx
-        data["source_file"] = source_file
-        rows.append(data)
-
-    return rows
+
+def extract_businesses_from_html(html: str, source_file: str, backend: str = "bs4") -> List[Dict]:
+    """Parse all visible result items from a Google Maps results page HTML (see iter_businesses_from_html)."""
+    return list(iter_businesses_from_html(html, source_file, backend))
+
+
+class CardRowCollector:
+    """Parses result cards batch by batch while the feed is still scrolling.
+
+    Pass feed as the on_cards callback of scroll_results_stub. Only the current
+    batch of card HTML is held at any time; rows accumulate in feed order with the
+    same positions extract_businesses_from_html would assign.
+    """
+
+    def __init__(self, source_file: str, backend: str = "bs4"):
+        self.source_file = source_file
+        self.backend = get_html_backend(backend)
+        self.rows: List[Dict] = []
+
+    def feed(self, cards_html: List[str]) -> None:
+        if not cards_html:
+            return
+        # One document per batch instead of one per card
+        doc = self.backend.parse("".join(cards_html))
+        for el in _select_containers(doc, self.backend):
+            self.rows.append(_row_from_container(el, len(self.rows) + 1, self.source_file, self.backend))
@@ -1,15 +1,21 @@
 from src.config.base import PROFILE_DIR
 from playwright.sync_api import sync_playwright,  BrowserContext
+from playwright.async_api import async_playwright, BrowserContext as AsyncBrowserContext
 from src.extentions import build_extension_args
-from typing import Tuple
+from src.types.scraper import ScrapeConfig
+from collections import Counter
+from pathlib import Path
+from typing import Optional, Tuple
 
-def launch_persistent_context(headless: bool) -> Tuple[BrowserContext, any]:
+def launch_persistent_context(headless: bool, profile_dir: Optional[Path] = None) -> Tuple[BrowserContext, any]:
     """Launch a persistent Chromium context that saves cookies/profile under PROFILE_DIR.
     If the GBP Everywhere extension is present (unpacked) under GBP_EVERYWHERE_DIR,
     load it. Returns (context, pw_controller) so the caller can close both.
+    Pass profile_dir to use a different profile (Chromium locks a profile to one process).
     """
     pw = sync_playwright().start()
-    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    profile_dir = profile_dir or PROFILE_DIR
+    profile_dir.mkdir(parents=True, exist_ok=True)
 
     args = []
     # Load supported unpacked extensions if present (GBP Everywhere, PlePer)
@@ -19,7 +25,7 @@ def launch_persistent_context(headless: bool) -> Tuple[BrowserContext, any]:
         pass
 
     context = pw.chromium.launch_persistent_context(
-        user_data_dir=str(PROFILE_DIR.resolve()),
+        user_data_dir=str(profile_dir.resolve()),
         headless=headless,
         viewport={"width": 1280, "height": 900},
         args=args,
@@ -28,3 +34,124 @@ def launch_persistent_context(headless: bool) -> Tuple[BrowserContext, any]:
     context.set_default_timeout(30000)
     return context, pw
 
+
+
+async def launch_persistent_context_async(headless: bool, profile_dir: Optional[Path] = None) -> Tuple[AsyncBrowserContext, any]:
+    """Async twin of launch_persistent_context (same profile, extensions and viewport)."""
+    pw = await async_playwright().start()
+    profile_dir = profile_dir or PROFILE_DIR
+    profile_dir.mkdir(parents=True, exist_ok=True)
+
+    args = []
+    try:
+        args.extend(build_extension_args())
+    except Exception:
+        pass
+
+    context = await pw.chromium.launch_persistent_context(
+        user_data_dir=str(profile_dir.resolve()),
+        headless=headless,
+        viewport={"width": 1280, "height": 900},
+        args=args,
+    )
+    context.set_default_timeout(30000)
+    return context, pw
+
+
+# --- Lean mode: request routing ---
+
+class RouteStats:
+    """Per-page network accounting for lean mode.
+
+    Allowed bytes come from the Content-Length of the responses that did load
+    (chunked responses without one are counted in unsized). Blocked requests are
+    never downloaded, so they are counted by resource type rather than by size;
+    compare allowed bytes of a run with and without --lean to see the savings.
+    """
+
+    def __init__(self) -> None:
+        self.blocked = Counter()
+        self.allowed_requests = 0
+        self.allowed_bytes = 0
+        self.unsized = 0
+
+    def on_response(self, response) -> None:
+        try:
+            self.allowed_requests += 1
+            length = response.headers.get("content-length")
+            if length is None:
+                self.unsized += 1
+            else:
+                self.allowed_bytes += int(length)
+        except Exception:
+            pass
+
+    def describe(self) -> str:
+        blocked_total = sum(self.blocked.values())
+        by_type = ", ".join(f"{k} {v}" for k, v in self.blocked.most_common())
+        return (
+            f"allowed {self.allowed_requests} req / {self.allowed_bytes / 1_000_000:.2f} MB "
+            f"({self.unsized} unsized), blocked {blocked_total} req" + (f" ({by_type})" if by_type else "")
+        )
+
+
+def should_block_request(resource_type: str, url: str, cfg: ScrapeConfig) -> bool:
+    """Lean mode rule: keep allow-listed URLs, drop heavy resource types and map tiles."""
+    if any(p in url for p in cfg.lean_allowed_url_patterns):
+        return False
+    if resource_type in cfg.lean_blocked_resource_types:
+        return True
+    return any(p in url for p in cfg.lean_blocked_url_patterns)
+
+
+def install_request_routing(page, cfg: ScrapeConfig) -> RouteStats:
+    """Count the page's traffic and, with cfg.lean, abort what the scraper never reads.
+    Note that Playwright disables the HTTP cache for pages with a route installed.
+    """
+    stats = RouteStats()
+    page.on("response", stats.on_response)
+    if not cfg.lean:
+        return stats
+
+    def handler(route):
+        req = route.request
+        try:
+            if should_block_request(req.resource_type, req.url, cfg):
+                stats.blocked[req.resource_type] += 1
+                route.abort()
+            else:
+                route.continue_()
+        except Exception:
+            # A route left unhandled hangs its request until the page times out
+            try:
+                route.continue_()
+            except Exception:
+                pass
+
+    page.route("**/*", handler)
+    return stats
+
+
+async def install_request_routing_async(page, cfg: ScrapeConfig) -> RouteStats:
+    """Async twin of install_request_routing."""
+    stats = RouteStats()
+    page.on("response", stats.on_response)
+    if not cfg.lean:
+        return stats
+
+    async def handler(route):
+        req = route.request
+        try:
+            if should_block_request(req.resource_type, req.url, cfg):
+                stats.blocked[req.resource_type] += 1
+                await route.abort()
+            else:
+                await route.continue_()
+        except Exception:
+            try:
+                await route.continue_()
+            except Exception:
+                pass
+
+    await page.route("**/*", handler)
+    return stats
@@ -0,0 +1,96 @@
+from typing import Any, Dict, Optional
+
+# Shared by the sync (scraper.py) and async (src/async_scraper.py) engines
+
+PANEL_SELECTOR = ".single_listing_info_window"
+
+# Resolves with the panel id as soon as the panel exists and its id differs from
+# lastId (PlePer swaps the id whenever it renders another listing), or null after
+# timeoutMs. Driven by a MutationObserver instead of polling get_attribute("id").
+PANEL_CHANGE_JS = r"""
+([sel, lastId, timeoutMs]) => new Promise((resolve) => {
+  const changed = () => {
+    const el = document.querySelector(sel);
+    return el && el.id !== lastId ? { id: el.id } : null;
+  };
+  const now = changed();
+  if (now) return resolve(now);
+  const timer = setTimeout(() => { obs.disconnect(); resolve(null); }, timeoutMs);
+  const obs = new MutationObserver(() => {
+    const hit = changed();
+    if (hit) {
+      clearTimeout(timer);
+      obs.disconnect();
+      resolve(hit);
+    }
+  });
+  obs.observe(document.body, { childList: true, subtree: true, attributes: true, attributeFilter: ["id"] });
+})
+"""
+
+# Reads the whole panel in one roundtrip: company (first <strong>), verification
+# text (first <small>) and the cell texts of every table row after the header.
+PANEL_EXTRACT_JS = r"""
+(panel) => {
+  const text = (el) => (el ? el.textContent || "" : null);
+  const rows = Array.from(panel.querySelectorAll("tr")).slice(1).map(
+    (tr) => Array.from(tr.querySelectorAll("td")).map((td) => td.textContent || "")
+  );
+  return { company: text(panel.querySelector("strong")), small: text(panel.querySelector("small")), rows };
+}
+"""
+
+
+def apply_pleper_verification(result: Dict[str, Any], small_txt: str) -> None:
+    """Set gbp_is_verified from the panel's <small> text ("Verified" / "Not Verified")."""
+    small_txt = (small_txt or "").strip().lower()
+    if "not verified" in small_txt:
+        result["gbp_is_verified"] = False
+    elif "verified" in small_txt:
+        result["gbp_is_verified"] = True
+
+
+def apply_pleper_row(result: Dict[str, Any], key: str, val_txt: str) -> None:
+    """Map one PlePer table row (first cell = key, second cell = value) into result."""
+    key = (key or "").strip()
+    val_txt = (val_txt or "").strip()
+    if key.startswith("Categories"):
+        result["categories"] = [p.strip() for p in val_txt.split(",") if p.strip()]
+    elif key.startswith("Place ID"):
+        result["place_id"] = val_txt
+    elif key.startswith("CID"):
+        result["CID"] = val_txt
+    elif key.startswith("Business Profile ID"):
+        result["business_profile_id"] = val_txt
+    elif key.startswith("Coordinates"):
+        try:
+            parts = [p.strip() for p in val_txt.split(",")]
+            if len(parts) >= 2:
+                result["coordinates"] = [float(parts[0]), float(parts[1])]
+        except Exception:
+            pass
+    elif key.startswith("KG ID"):
+        result["kg_id"] = "https://www.google.com/search?kgmid=" + val_txt
+    elif key.startswith("Attributes"):
+        try:
+            result["attributes"] = int(val_txt.split()[0])
+        except Exception:
+            result["attributes"] = -1
+
+
+def pleper_result_from_payload(payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the enrichment dict from the PANEL_EXTRACT_JS payload."""
+    result: Dict[str, Any] = {}
+    if not payload:
+        return result
+    company = (payload.get("company") or "").strip()
+    if company:
+        result["gbp_company"] = company
+    if payload.get("small") is not None:
+        apply_pleper_verification(result, payload["small"])
+    result["attributes"] = -1
+    for cells in payload.get("rows") or []:
+        if len(cells) < 2:
+            continue
+        apply_pleper_row(result, cells[0], cells[1])
+    return result
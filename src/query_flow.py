@@ -0,0 +1,142 @@
+# The per-query scraping logic of scraper.process_query and its async twin, written once
+# as page steps (src.page_steps): matching cards to rows, the enrichment cache, the
+# checkpoint and the error paths. The two entry points only open and close the page and
+# run the steps on their adapter (scraper.QueryPage, async_scraper.AsyncQueryPage).
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from src.io_helpers import query_to_human_slug, safe_print
+from src.parse_gbp_listing import CardRowCollector
+from src.maps_response_parser import MapsResponseCollector
+from src.listing_keys import match_cards_to_rows
+from src.timing import ListingTimings
+from src.journal import QueryCheckpoint
+from src.enrichment_cache import EnrichmentCache, CacheStats
+from src.page_steps import Steps
+from src.scroller import scroll_steps, harvest_cards_steps, wait_for_categories_steps, card_links_steps, describe_scroll
+from src.types.scraper import ScrapeConfig
+
+
+def scrape_listing_steps(
+    item, lastId, cfg: Optional[ScrapeConfig] = None, timings: Optional[ListingTimings] = None
+) -> Steps[Tuple[Dict[str, Any], Any]]:
+    """Click one card and read its PlePer panel. Returns (result, id of the panel now shown)."""
+    cfg = cfg or ScrapeConfig()
+    started = time.perf_counter()
+    result = {}
+    result["gbp_has_image"] = True
+    if not (yield "click_listing", (item,)):
+        return result, lastId
+
+    clicked = time.perf_counter()
+    panel, lastId = yield "open_panel", (lastId, cfg.panel_timeout_ms)
+    if timings is not None:
+        if panel is None:
+            timings.panel.timeouts += 1
+        else:
+            timings.panel.add((time.perf_counter() - clicked) * 1000)
+    if panel is not None:
+        result = {**(yield "scrape_panel", (panel,)), **result}
+
+    result["gbp_has_image"] = yield "has_image", ()
+
+    if timings is not None:
+        timings.total.add((time.perf_counter() - started) * 1000)
+    return result, lastId
+
+
+class QueryFlow:
+    """One query of a queries file: its slug, checkpoint and the steps that scrape it."""
+
+    def __init__(self, url: str, source_file: str, cfg: ScrapeConfig, cache: Optional[EnrichmentCache] = None):
+        self.url = url
+        self.source_file = source_file
+        self.cfg = cfg
+        self.cache = cache
+        self.slug = query_to_human_slug(url)
+        self.checkpoint = QueryCheckpoint(self.slug, enabled=cfg.journal, fresh=cfg.rescrape)
+
+    def resumed_rows(self) -> Optional[Iterator[Dict]]:
+        """The rows of a query an earlier attempt journaled completely, or None to scrape it."""
+        if not self.checkpoint.is_complete():
+            return None
+        # Every listing was journaled by an earlier attempt; nothing left to scrape
+        safe_print(f"[i] Resumed {self.slug} from journal ({self.checkpoint.resumed} listings)")
+        return self.checkpoint.compose()
+
+    def steps(self) -> Steps[Iterator[Dict]]:
+        """Navigate to the URL, scroll, and extract real data on an open page.
+        Listings with a fresh entry in the cache are not clicked.
+        Returns the rows as a generator meant to be streamed into the map writer."""
+        cfg, cache, checkpoint, slug = self.cfg, self.cache, self.checkpoint, self.slug
+        lastId = None
+        timings = ListingTimings()
+        cache_stats = CacheStats()
+        route_stats = yield "install_routing", (cfg,)
+        collector = None
+        if cfg.listing_source == "intercept":
+            # Read the search payloads as they arrive; decoded after scrolling
+            collector = MapsResponseCollector()
+            yield "watch_responses", (collector,)
+
+        yield "goto", (self.url, cfg.navigation_timeout_ms)
+        card_rows = CardRowCollector(self.source_file, cfg.html_backend)
+        # DOM mode parses the cards batch by batch while the feed scrolls. With
+        # interception the cards are only a fallback, so they are pulled in one go
+        # if the intercepted payloads yielded nothing.
+        scroll_stats = yield from scroll_steps(
+            cfg, card_rows.feed if collector is None else None, checkpoint.scroll_target()
+        )
+        safe_print(f"[i] Scrolled {slug}: {describe_scroll(scroll_stats)}")
+
+        rows = (yield "collect", (collector, self.source_file)) if collector is not None else card_rows.rows
+        if collector is not None and collector.failed:
+            safe_print(f"[!] {slug}: {collector.failed} search response(s) could not be read; their listings are missing")
+        if not rows and collector is not None:
+            yield from wait_for_categories_steps(cfg)
+            card_rows.feed((yield from harvest_cards_steps()))
+            rows = card_rows.rows
+
+        # Each card is paired with its row by the listing in the card's link, never by
+        # position (intercepted rows need not follow the card order); cards no row carries
+        # are not clicked. The checkpoint decides which rows still need a click.
+        matches = match_cards_to_rows((yield from card_links_steps()), rows)
+        unmatched = sum(1 for r in matches if r is None)
+        if unmatched:
+            safe_print(f"[!] {slug}: {unmatched} of {len(matches)} cards match no listing row; not clicked")
+        checkpoint.begin(rows)
+        if checkpoint.resumed:
+            safe_print(f"[i] Resuming {slug}: {checkpoint.resumed} listings already journaled")
+        try:
+            for i, r in enumerate(matches):
+                if r is None or not checkpoint.needs_enrichment(rows[r]):
+                    continue
+                cached = cache.get(rows[r], cache_stats) if cache is not None else None
+                if cached is not None:
+                    # Enriched by another query recently; no click needed
+                    checkpoint.record(rows[r], cached)
+                    continue
+                item = yield "card", (i,)
+                scraped_item, lastId = yield from scrape_listing_steps(item, lastId, cfg, timings)
+                checkpoint.record(rows[r], scraped_item)
+                if cache is not None:
+                    cache.put(rows[r], scraped_item)
+        except Exception:
+            if (yield "is_closed", ()):
+                # Browser went away: fail the row, the journal keeps what was done
+                raise
+        missing = checkpoint.missing()
+        if missing and cache is not None:
+            # Snapshot listings no card of this feed matched can still be enriched from the cache
+            for row in missing:
+                cached = cache.get(row, cache_stats)
+                if cached is not None:
+                    checkpoint.record(row, cached)
+            missing = checkpoint.missing()
+        if missing:
+            safe_print(f"[!] {slug}: {len(missing)} listings matched no card in the feed; written without PlePer data")
+        safe_print(f"[i] PlePer timings {slug}: {timings.describe()}")
+        safe_print(f"[i] Network {slug}: {route_stats.describe()}")
+        if cache is not None:
+            safe_print(f"[i] Enrichment cache {slug}: {cache_stats.describe()}")
+        return checkpoint.compose()
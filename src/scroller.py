@@ -1,82 +1,377 @@
+from collections import deque
 from playwright.sync_api import Page
-from src.types.scraper import ScrapeConfig
+from playwright.async_api import Page as AsyncPage
+from src.types.scraper import ScrapeConfig, ScrollStats
 import time
+from typing import Callable, List, Optional
 from src.config.base import DEBUG
+from src.page_steps import Steps, run_steps, run_steps_async
 
-def scroll_results_stub(page: Page, cfg: ScrapeConfig) -> None:
-    """Stub for scrolling the results pane until no new results.
-    For now, just wait a bit to simulate activity.
+FEED_SELECTOR = '[role="feed"]'
+END_SELECTOR = ".m6QErb.XiKgde.tLjsW.eKbjU"
+CARD_SELECTOR = "div.Nv2PK.tH5CWc.THOPZb"
+CARD_FALLBACK_SELECTOR = "div.Nv2PK"
+
+# Installs a MutationObserver on the feed that keeps the card count and the
+# end-of-list marker up to date in window.__dsFeedWatch. Returns {count, ended}
+# or null while the feed is not in the DOM. Safe to call repeatedly.
+FEED_WATCH_JS = r"""
+([feedSel, endSel, primarySel, fallbackSel]) => {
+  const prev = window.__dsFeedWatch;
+  if (prev && prev.feed.isConnected) return { count: prev.count, ended: prev.ended };
+  const feed = document.querySelector(feedSel);
+  if (!feed) return null;
+  const count = () => {
+    const n = document.querySelectorAll(primarySel).length;
+    return n > 0 ? n : document.querySelectorAll(fallbackSel).length;
+  };
+  const watch = { feed, count: count(), ended: !!document.querySelector(endSel) };
+  watch.observer = new MutationObserver(() => {
+    watch.count = count();
+    watch.ended = !!document.querySelector(endSel);
+  });
+  watch.observer.observe(feed, { childList: true, subtree: true });
+  if (prev && prev.observer) prev.observer.disconnect();
+  window.__dsFeedWatch = watch;
+  return { count: watch.count, ended: watch.ended };
+}
+"""
+
+# Scroll the feed by one viewport of itself
+SCROLL_FEED_JS = r"""
+() => {
+  const w = window.__dsFeedWatch;
+  if (!w || !w.feed.isConnected) return false;
+  w.feed.scrollBy(0, w.feed.clientHeight);
+  return true;
+}
+"""
+
+# Resolves as soon as the card count grows past `prev` or the end marker shows up,
+# or with the unchanged state after timeoutMs. No polling: it rides the same
+# mutations the watch observer sees (observers fire in creation order, so the
+# counts are already fresh when this one runs).
+WAIT_FOR_GROWTH_JS = r"""
+([prev, timeoutMs]) => new Promise((resolve) => {
+  const w = window.__dsFeedWatch;
+  if (!w || !w.feed.isConnected) return resolve(null);
+  const state = () => ({ count: w.count, ended: w.ended });
+  if (w.ended || w.count > prev) return resolve(state());
+  const timer = setTimeout(() => { obs.disconnect(); resolve(state()); }, timeoutMs);
+  const obs = new MutationObserver(() => {
+    if (w.ended || w.count > prev) {
+      clearTimeout(timer);
+      obs.disconnect();
+      resolve(state());
+    }
+  });
+  obs.observe(w.feed, { childList: true, subtree: true });
+})
+"""
+
+# GBP Everywhere injects each card's categories a moment after the card renders
+CATEGORY_SELECTOR = "div.category-list-display"
+
+# Returns the outerHTML of result cards not handed out before, in document order,
+# and tags them so the next call only sees cards that appeared since. A card is only
+# handed out once it has its category block or has waited graceMs for it since it was
+# first passed over; harvesting stops at the first card still waiting, so the order holds.
+HARVEST_CARDS_JS = r"""
+([primarySel, fallbackSel, categorySel, graceMs]) => {
+  let cards = document.querySelectorAll(primarySel);
+  if (!cards.length) cards = document.querySelectorAll(fallbackSel);
+  const now = Date.now();
+  const out = [];
+  for (const el of cards) {
+    if (el.dataset.dsSeen) continue;
+    if (graceMs > 0 && !el.querySelector(categorySel)) {
+      if (!el.dataset.dsWaiting) el.dataset.dsWaiting = String(now);
+      if (now - Number(el.dataset.dsWaiting) < graceMs) break;
+    }
+    out.push(el.outerHTML);
+    el.dataset.dsSeen = "1";
+  }
+  return out;
+}
+"""
+
+# Resolves once every card not handed out yet has its category block, or after timeoutMs
+WAIT_FOR_CATEGORIES_JS = r"""
+([primarySel, fallbackSel, categorySel, timeoutMs]) => new Promise((resolve) => {
+  const pending = () => {
+    let cards = document.querySelectorAll(primarySel);
+    if (!cards.length) cards = document.querySelectorAll(fallbackSel);
+    return Array.from(cards).filter((el) => !el.dataset.dsSeen && !el.querySelector(categorySel)).length;
+  };
+  if (!pending()) return resolve(true);
+  const timer = setTimeout(() => { obs.disconnect(); resolve(false); }, timeoutMs);
+  const obs = new MutationObserver(() => {
+    if (!pending()) {
+      clearTimeout(timer);
+      obs.disconnect();
+      resolve(true);
+    }
+  });
+  obs.observe(document.body, { childList: true, subtree: true });
+})
+"""
+
+# The href of every card's listing link (null when a card has none), in the order of
+# page.locator(selector).nth(i), so a card can be matched to its row before it is clicked
+CARD_LINKS_JS = r"""
+(sel) => Array.from(document.querySelectorAll(sel)).map((el) => {
+  const a = el.querySelector("a.hfpxzc");
+  return a ? a.getAttribute("href") : null;
+})
+"""
+
+CardsCallback = Callable[[List[str]], None]
+
+
+class FeedPage:
+    """The page calls of the feed steps, made on a sync Playwright page (see src.page_steps)."""
+
+    def __init__(self, page: Optional[Page]):
+        self.page = page
+
+    def evaluate(self, js: str, arg=None):
+        return self.page.evaluate(js, arg)
+
+    def wait_for_feed(self, timeout_ms: int) -> None:
+        self.page.locator(FEED_SELECTOR).wait_for(state="visible", timeout=timeout_ms)
+
+    def wheel(self, dx: int, dy: int) -> None:
+        self.page.mouse.wheel(dx, dy)
+
+
+class AsyncFeedPage:
+    """FeedPage on an async Playwright page."""
+
+    def __init__(self, page: Optional[AsyncPage]):
+        self.page = page
+
+    async def evaluate(self, js: str, arg=None):
+        return await self.page.evaluate(js, arg)
+
+    async def wait_for_feed(self, timeout_ms: int) -> None:
+        await self.page.locator(FEED_SELECTOR).wait_for(state="visible", timeout=timeout_ms)
+
+    async def wheel(self, dx: int, dy: int) -> None:
+        await self.page.mouse.wheel(dx, dy)
+
+
+def harvest_cards_steps(grace_ms: int = 0) -> Steps[List[str]]:
+    """New cards, in feed order. With grace_ms, cards still lacking their category
+    block are held back (and the ones after them) until they waited that long."""
+    try:
+        return (yield "evaluate", (HARVEST_CARDS_JS, [CARD_SELECTOR, CARD_FALLBACK_SELECTOR, CATEGORY_SELECTOR, grace_ms])) or []
+    except Exception:
+        return []
+
+
+def wait_for_categories_steps(cfg: ScrapeConfig) -> Steps[None]:
+    """Give the cards not harvested yet up to cfg.category_grace_sec to get their categories."""
+    try:
+        yield "evaluate", (
+            WAIT_FOR_CATEGORIES_JS,
+            [CARD_SELECTOR, CARD_FALLBACK_SELECTOR, CATEGORY_SELECTOR, int(cfg.category_grace_sec * 1000)],
+        )
+    except Exception:
+        pass
+
+
+def card_links_steps() -> Steps[List[Optional[str]]]:
+    try:
+        return (yield "evaluate", (CARD_LINKS_JS, CARD_FALLBACK_SELECTOR)) or []
+    except Exception:
+        return []
+
+
+def harvest_cards(page: Page, grace_ms: int = 0) -> List[str]:
+    return run_steps(harvest_cards_steps(grace_ms), FeedPage(page))
+
+
+async def harvest_cards_async(page: AsyncPage, grace_ms: int = 0) -> List[str]:
+    return await run_steps_async(harvest_cards_steps(grace_ms), AsyncFeedPage(page))
+
+
+def wait_for_categories(page: Page, cfg: ScrapeConfig) -> None:
+    run_steps(wait_for_categories_steps(cfg), FeedPage(page))
+
+
+async def wait_for_categories_async(page: AsyncPage, cfg: ScrapeConfig) -> None:
+    await run_steps_async(wait_for_categories_steps(cfg), AsyncFeedPage(page))
+
+
+def card_links(page: Page) -> List[Optional[str]]:
+    return run_steps(card_links_steps(), FeedPage(page))
+
+
+async def card_links_async(page: AsyncPage) -> List[Optional[str]]:
+    return await run_steps_async(card_links_steps(), AsyncFeedPage(page))
+
+
+class _SettleTracker:
+    """Decides how long to wait for the next batch of cards.
+
+    The feed counts as settled once it has not grown for settle_timeout() seconds.
+    That timeout adapts to how fast batches have been arriving on this page:
+    scroll_settle_factor x the slowest recent batch, clamped to
+    [scroll_settle_min_sec, scroll_settle_max_sec].
+    """
+
+    def __init__(self, cfg: ScrapeConfig, stats: ScrollStats):
+        self.cfg = cfg
+        self.stats = stats
+        self.latencies = deque(maxlen=10)
+        self.last_progress_ts = time.perf_counter()
+
+    def settle_timeout(self) -> float:
+        if not self.latencies:
+            return self.cfg.scroll_settle_initial_sec
+        adaptive = self.cfg.scroll_settle_factor * max(self.latencies)
+        return min(self.cfg.scroll_settle_max_sec, max(self.cfg.scroll_settle_min_sec, adaptive))
+
+    def stalled_for(self) -> float:
+        return time.perf_counter() - self.last_progress_ts
+
+    def next_wait_ms(self) -> int:
+        # Wait in slices so the feed gets re-nudged while it is stalled
+        remaining = self.settle_timeout() - self.stalled_for()
+        slice_sec = max(self.cfg.scroll_pause_sec, self.settle_timeout() / 3)
+        return int(max(0.0, min(remaining, slice_sec)) * 1000)
+
+    def seed(self, state: dict) -> None:
+        # Cards already present on load are not a batch, so no latency sample
+        self.stats.cards = int(state.get("count") or 0)
+        self.stats.ended = bool(state.get("ended"))
+
+    def on_state(self, state: Optional[dict], scroll_started: float) -> None:
+        if not state:
+            return
+        count = int(state.get("count") or 0)
+        if count > self.stats.cards:
+            self.latencies.append(time.perf_counter() - scroll_started)
+            self.stats.cards = count
+            self.last_progress_ts = time.perf_counter()
+        self.stats.ended = bool(state.get("ended"))
+
+
+def _deliver(cards: List[str], on_cards: CardsCallback, stats: ScrollStats) -> int:
+    if cards:
+        t0 = time.perf_counter()
+        on_cards(cards)
+        stats.harvest_sec += time.perf_counter() - t0
+    return len(cards)
+
+
+def describe_scroll(stats: ScrollStats) -> str:
+    return (
+        f"{stats.cards} cards in {stats.total_sec:.1f}s "
+        f"(waiting {stats.wait_sec:.1f}s, scrolling {stats.scroll_sec:.1f}s, "
+        f"parsing {stats.harvest_sec:.1f}s, stop: {stats.reason})"
+    )
+
+
+def scroll_steps(
+    cfg: ScrapeConfig, on_cards: Optional[CardsCallback] = None, stop_at_cards: Optional[int] = None
+) -> Steps[ScrollStats]:
+    """Scroll the Google Maps results feed until it is settled.
+
+    Settled means the end-of-results marker appeared, or no new cards arrived within
+    the adaptive settle timeout. Waits are driven by a MutationObserver on the feed,
+    so the loop returns as soon as either happens instead of sleeping fixed amounts.
+    Returns ScrollStats with the time spent scrolling vs waiting.
+
+    With on_cards, each batch of newly appeared cards (outerHTML, in feed order) is
+    handed over right after the next scroll was issued, so parsing overlaps with
+    loading the following batch. Every card is delivered exactly once, and not before
+    it has its category block or waited cfg.category_grace_sec for it.
+
+    stop_at_cards ends the scroll early once the feed holds that many cards
+    (used when resuming a query whose first listings are already journaled).
     """
-    # Scroll the Google Maps results FEED until we see the end-of-results marker,
-    # then wait for 10 seconds as requested.
-    end_selector = ".m6QErb.XiKgde.tLjsW.eKbjU"
-    feed_locator = page.locator('[role="feed"]')
+    stats = ScrollStats()
+    started = time.perf_counter()
 
     # Ensure the feed is present/visible (best effort)
     try:
-        feed_locator.wait_for(state="visible", timeout=cfg.navigation_timeout_ms)
+        yield "wait_for_feed", (cfg.navigation_timeout_ms,)
     except Exception:
         pass
 
-    # Break out if we cannot make progress for 60 seconds
-    # Progress is defined as an increase in the number of result item containers on the page
-    stuck_threshold_sec = 60
-    last_progress_ts = time.time()
-    # Initial listing count
     try:
-        count_primary = page.locator("div.Nv2PK.tH5CWc.THOPZb").count()
-        last_count = count_primary if count_primary > 0 else page.locator("div.Nv2PK").count()
+        state = yield "evaluate", (FEED_WATCH_JS, [FEED_SELECTOR, END_SELECTOR, CARD_SELECTOR, CARD_FALLBACK_SELECTOR])
     except Exception:
-        last_count = 0
+        state = None
+    if state is None:
+        # No results feed (e.g. Maps jumped straight to a single place)
+        stats.reason = "no feed"
+        stats.total_sec = time.perf_counter() - started
+        return stats
+
+    tracker = _SettleTracker(cfg, stats)
+    tracker.seed(state)
+    stats.reason = "debug"
+    delivered = 0
+    grace_ms = int(cfg.category_grace_sec * 1000)
 
     while not DEBUG:
-        try:
-            if page.locator(end_selector).count() > 0:
-                break
-        except Exception:
-            # If querying fails intermittently, keep trying
-            pass
+        if stats.ended:
+            stats.reason = "end marker"
+            break
+        if stop_at_cards is not None and stats.cards >= stop_at_cards:
+            stats.reason = "target reached"
+            break
+        if tracker.stalled_for() >= tracker.settle_timeout():
+            stats.reason = "settled"
+            break
 
-        # Prefer scrolling the FEED element specifically
+        scroll_started = time.perf_counter()
         try:
-            handle = feed_locator.element_handle(timeout=20000)
+            scrolled = yield "evaluate", (SCROLL_FEED_JS,)
         except Exception:
-            handle = None
-
-        scrolled = False
-        if handle:
-            try:
-                # Scroll by one viewport height of the feed
-                page.evaluate("(el) => el.scrollBy(0, el.clientHeight)", handle)
-                scrolled = True
-            except Exception:
-                scrolled = False
-
+            scrolled = False
         if not scrolled:
-            # Fallback: use mouse wheel to nudge the page
+            # Feed was re-rendered: re-attach the observer, nudge with the wheel meanwhile
             try:
-                page.mouse.wheel(0, 1200)
+                yield "evaluate", (FEED_WATCH_JS, [FEED_SELECTOR, END_SELECTOR, CARD_SELECTOR, CARD_FALLBACK_SELECTOR])
+                yield "wheel", (0, 1200)
             except Exception:
                 pass
-        # Evaluate current listing count to determine progress
+        wait_started = time.perf_counter()
+        stats.scroll_sec += wait_started - scroll_started
+        if on_cards is not None and stats.cards > delivered:
+            # The next batch is already loading; parse the previous one meanwhile
+            delivered += _deliver((yield from harvest_cards_steps(grace_ms)), on_cards, stats)
+            wait_started = time.perf_counter()
+
         try:
-            curr_primary = page.locator("div.Nv2PK.tH5CWc.THOPZb").count()
-            curr_count = curr_primary if curr_primary > 0 else page.locator("div.Nv2PK").count()
+            state = yield "evaluate", (WAIT_FOR_GROWTH_JS, [stats.cards, tracker.next_wait_ms()])
         except Exception:
-            curr_count = last_count
+            state = None
+        stats.wait_sec += time.perf_counter() - wait_started
+        tracker.on_state(state, scroll_started)
 
-        if curr_count > last_count:
-            last_count = curr_count
-            last_progress_ts = time.time()
-        else:
-            # If listing count hasn't increased for too long, assume we're stuck and stop gracefully
-            if (time.time() - last_progress_ts) >= stuck_threshold_sec:
-                break
+    if on_cards is not None:
+        # The last cards only just rendered; let the extension catch up before the final harvest
+        t0 = time.perf_counter()
+        yield from wait_for_categories_steps(cfg)
+        stats.wait_sec += time.perf_counter() - t0
+        _deliver((yield from harvest_cards_steps()), on_cards, stats)
+    stats.total_sec = time.perf_counter() - started
+    return stats
 
-        time.sleep(cfg.scroll_pause_sec)
 
-    # Final wait for content to settle after reaching the end marker (or after attempts)
-    try:
-        page.wait_for_timeout(10_000)
-    except Exception:
-        pass
\ No newline at end of file
+def scroll_results_stub(
+    page: Page, cfg: ScrapeConfig, on_cards: Optional[CardsCallback] = None, stop_at_cards: Optional[int] = None
+) -> ScrollStats:
+    """scroll_steps on a sync page."""
+    return run_steps(scroll_steps(cfg, on_cards, stop_at_cards), FeedPage(page))
+
+
+async def scroll_results_stub_async(
+    page: AsyncPage, cfg: ScrapeConfig, on_cards: Optional[CardsCallback] = None, stop_at_cards: Optional[int] = None
+) -> ScrollStats:
+    """scroll_steps on an async page."""
+    return await run_steps_async(scroll_steps(cfg, on_cards, stop_at_cards), AsyncFeedPage(page))
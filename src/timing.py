@@ -0,0 +1,56 @@
+import time
+from typing import Dict, List
+
+
+class LatencyStats:
+    """Collects durations (ms) and summarizes their distribution for logging."""
+
+    def __init__(self) -> None:
+        self.samples: List[float] = []
+        self.timeouts = 0
+
+    def add(self, ms: float) -> None:
+        self.samples.append(ms)
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+        return ordered[k]
+
+    def describe(self) -> str:
+        if not self.samples:
+            return f"n=0 timeouts={self.timeouts}"
+        return (
+            f"n={len(self.samples)} p50={self.percentile(50):.0f}ms p90={self.percentile(90):.0f}ms "
+            f"max={max(self.samples):.0f}ms timeouts={self.timeouts}"
+        )
+
+
+class ListingTimings:
+    """Per-listing timings of the PlePer enrichment of one query."""
+
+    def __init__(self) -> None:
+        self.panel = LatencyStats()  # click done -> panel id changed
+        self.total = LatencyStats()  # whole scrape_listing
+
+    def describe(self) -> str:
+        return f"panel {self.panel.describe()} | listing {self.total.describe()}"
+
+
+class PhaseTimings:
+    """Wall time of the consecutive phases of a run; lap(name) closes the phase that just ended."""
+
+    def __init__(self) -> None:
+        self.started = self._last = time.perf_counter()
+        self.seconds: Dict[str, float] = {}
+
+    def lap(self, name: str) -> None:
+        now = time.perf_counter()
+        self.seconds[name] = self.seconds.get(name, 0.0) + now - self._last
+        self._last = now
+
+    def describe(self) -> str:
+        phases = ", ".join(f"{name} {sec:.2f}s" for name, sec in self.seconds.items())
+        return f"{phases} (total {self._last - self.started:.2f}s)"
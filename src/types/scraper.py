@@ -1,7 +1,68 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 @dataclass
 class ScrapeConfig:
-    scroll_pause_sec: float = 0.5
+    scroll_pause_sec: float = 0.5  # shortest wait slice while the feed is stalled
     navigation_timeout_ms: int = 30000
+    # The feed is settled once it has not grown for factor x the slowest recent batch,
+    # clamped to [min, max]; initial is used until the first batch arrives
+    scroll_settle_initial_sec: float = 10.0
+    scroll_settle_min_sec: float = 2.0
+    scroll_settle_max_sec: float = 60.0
+    scroll_settle_factor: float = 4.0
+    # How long a result card may wait for GBP Everywhere's category block before it is parsed without it
+    category_grace_sec: float = 3.0
+    panel_timeout_ms: int = 20000  # hard limit for the PlePer panel to switch listings
+    journal: bool = True  # checkpoint enriched listings to data/journal/<slug>.jsonl
+    rescrape: bool = False  # start every query over; leftover journals are discarded, not resumed
+    # Reuse PlePer enrichment of a listing seen by another query for this long; 0 disables the cache
+    cache_ttl_days: float = 14.0
+    workers: int = 1
+    engine: str = "sync"  # "sync" (thread per worker) or "async" (pages on one event loop)
+    listing_source: str = "dom"  # "dom" or "intercept" (Maps search responses, DOM fallback)
+    html_backend: str = "bs4"  # card parser tree: "bs4", "lxml" or "selectolax" (see src/html_backends.py)
+    storage_format: str = "xlsx"  # map files: "xlsx" or "parquet" (see io_helpers.STORAGE_FORMATS)
+    export_xlsx: bool = False  # also write data/export/maps/<slug>.xlsx when storing parquet
+    # Lean mode aborts requests the scraper never reads (see playwright_utils.should_block_request)
+    lean: bool = False
+    lean_blocked_resource_types: Tuple[str, ...] = ("image", "media", "font")
+    # Map tiles (vector + satellite) and street-view thumbnails are fetched as xhr/fetch too
+    lean_blocked_url_patterns: Tuple[str, ...] = (
+        "/maps/vt",
+        "khms",
+        "/kh/v=",
+        "streetviewpixels",
+    )
+    # The placeholder image check_listing_has_image looks for
+    lean_allowed_url_patterns: Tuple[str, ...] = ("maps.gstatic.com/tactile/pane/",)
 
+
+@dataclass
+class QueryTask:
+    """One pending row of a queries file."""
+    idx: Any
+    url: str
+    search_volume: Any = None
+
+
+@dataclass
+class QueryResult:
+    """Outcome of scraping one QueryTask. error is set when the query failed.
+    rows may be a generator; it is consumed once, by the map writer."""
+    task: QueryTask
+    slug: Optional[str] = None
+    rows: Iterable[Dict] = field(default_factory=list)
+    error: Optional[Exception] = None
+
+
+@dataclass
+class ScrollStats:
+    """What scroll_results_stub did: cards seen, why it stopped and where the time went."""
+    cards: int = 0
+    ended: bool = False
+    reason: str = ""
+    scroll_sec: float = 0.0
+    wait_sec: float = 0.0
+    harvest_sec: float = 0.0  # time spent in the on_cards callback (parsing)
+    total_sec: float = 0.0
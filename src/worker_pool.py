@@ -0,0 +1,117 @@
+import queue
+import shutil
+import threading
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from playwright.sync_api import BrowserContext
+
+from src.config.base import PROFILE_DIR, WORKER_PROFILES_DIR
+from src.io_helpers import safe_print
+from src.playwright_utils import launch_persistent_context
+from src.types.scraper import QueryTask, QueryResult
+
+ProcessFn = Callable[[QueryTask, BrowserContext], QueryResult]
+
+# Chromium leaves these behind while a profile is open; copying them makes the copy look locked
+_PROFILE_LOCK_FILES = ("SingletonLock", "SingletonCookie", "SingletonSocket", "lockfile")
+
+
+def worker_profile_dir(worker_id: int) -> Path:
+    """Worker 0 uses the main profile; the others get their own copy of it.
+    A Chromium profile can only be opened by one browser at a time. Copies are seeded
+    once and not refreshed; delete WORKER_PROFILES_DIR to pick up later profile changes.
+    """
+    if worker_id == 0:
+        return PROFILE_DIR
+    target = WORKER_PROFILES_DIR / f"worker_{worker_id}"
+    if not target.exists() and PROFILE_DIR.exists():
+        # Seed from the main profile so consent cookies and extension state carry over
+        try:
+            shutil.copytree(PROFILE_DIR, target, ignore=shutil.ignore_patterns(*_PROFILE_LOCK_FILES))
+        except Exception as e:
+            safe_print(f"[!] Could not seed profile for worker {worker_id}: {e}")
+    return target
+
+
+class QueryWorkerPool:
+    """Bounded pool of browser workers that scrape query rows concurrently.
+
+    The sync Playwright API is bound to the thread that started it, so each worker
+    thread launches and owns its own persistent context (one page per query, as in
+    the sequential path). Results are handed back to the calling thread, which keeps
+    all DataFrame updates, file writes and logging single-threaded.
+    """
+
+    def __init__(self, workers: int, headless: bool):
+        self.workers = max(1, int(workers))
+        self.headless = headless
+        self._tasks: "queue.Queue[Optional[Tuple[QueryTask, ProcessFn]]]" = queue.Queue()
+        self._results: "queue.Queue[QueryResult]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._launch_lock = threading.Lock()
+        self._launch_failures = 0
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, args=(i,), name=f"scrape-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _worker(self, worker_id: int) -> None:
+        context = None
+        pw_cm = None
+        try:
+            context, pw_cm = launch_persistent_context(self.headless, worker_profile_dir(worker_id))
+        except Exception as e:
+            safe_print(f"[!] Worker {worker_id} failed to launch browser: {e}")
+            with self._launch_lock:
+                self._launch_failures += 1
+                all_failed = self._launch_failures == self.workers
+            if all_failed:
+                # Nobody can run the tasks; fail them so the caller never waits forever
+                self._fail_tasks(e)
+            # Otherwise leave the tasks to the healthy workers instead of failing them instantly
+            return
+        try:
+            while True:
+                item = self._tasks.get()
+                if item is None:
+                    return
+                task, process_fn = item
+                try:
+                    result = process_fn(task, context)
+                except Exception as e:
+                    result = QueryResult(task=task, error=e)
+                self._results.put(result)
+        finally:
+            try:
+                if context is not None:
+                    context.close()
+            except Exception:
+                pass
+            try:
+                if pw_cm is not None:
+                    pw_cm.stop()
+            except Exception:
+                pass
+
+    def _fail_tasks(self, error: Exception) -> None:
+        while True:
+            item = self._tasks.get()
+            if item is None:
+                return
+            self._results.put(QueryResult(task=item[0], error=error))
+
+    def imap_unordered(self, tasks: List[QueryTask], process_fn: ProcessFn) -> Iterator[QueryResult]:
+        """Run process_fn(task, context) for every task on the workers and
+        yield the results in completion order.
+        """
+        for task in tasks:
+            self._tasks.put((task, process_fn))
+        for _ in range(len(tasks)):
+            yield self._results.get()
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self._tasks.put(None)
+        for t in self._threads:
+            t.join()
@@ -0,0 +1,121 @@
+# Offline scaling/accuracy benchmark for src/entity_resolution.resolve_entities.
+# Builds merged listing rows (as deduplicate.run() has them before resolution) for
+# distinct businesses and plants known duplicates of some of them: the same CID under a
+# link with a viewport segment, the same phone under a reformatted name, the same domain,
+# the same name+address with a different phone, and the same address under a name with
+# one extra word ("Zeta Dental" / "Zeta Dental Academy"). Chains (same domain, other address)
+# and a shared call-center phone are included as traps that must not merge.
+# Reports time per row at each size, merges per rule, and planted duplicates found/missed.
+#   python -m testing.bench_entity_resolution
+#   python -m testing.bench_entity_resolution --sizes 500000
+import argparse
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+from src.entity_resolution import resolve_entities
+
+SIZES = (62500, 125000, 250000, 500000)
+FLAG_COLS = ["query_filename1", "query_filename2"]
+STREETS = ["Main St", "Oak Avenue", "Pine Rd", "Maple Drive", "Cedar Ln", "Elm Street", "Lake Blvd"]
+TRADES = ["Roofing", "Insulation", "Plumbing", "Electric", "HVAC", "Painting", "Landscaping", "Solar"]
+WORDS = ["Summit", "Peak", "Front Range", "Mile High", "Alpine", "Rocky", "Golden", "Evergreen", "Granite", "Aspen"]
+
+
+def _row(i: int, name: str, phone: str, website: str, address: str, link: str) -> Dict[str, Any]:
+    return {
+        "listing_link": link,
+        "position": [i % 120 + 1],
+        "name": name,
+        "categories": ["Contractor"],
+        "website": website,
+        "phone": phone,
+        "address": address,
+        "reviews_count": i % 300,
+        "rating": 4.5,
+        "source_file": "queries.xlsx",
+        "search_volume": [100],
+        "map_files": [f"map-{i % 2}.xlsx"],
+        "status": "pending",
+        "query_filename1": i % 2 == 0,
+        "query_filename2": i % 2 == 1,
+    }
+
+
+def synthetic_listings(count: int, seed: int = 11) -> Tuple[List[Dict[str, Any]], List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Rows plus (original, duplicate) index pairs that must merge and trap pairs that must not."""
+    rnd = random.Random(seed)
+    rows: List[Dict[str, Any]] = []
+    planted: List[Tuple[int, int]] = []
+    traps: List[Tuple[int, int]] = []
+    while len(rows) < count:
+        i = len(rows)
+        name = f"{rnd.choice(WORDS)} {rnd.choice(TRADES)} {i}"
+        phone = f"(303) {i // 10000 % 1000:03d}-{i % 10000:04d}"
+        website = f"https://www.biz{i}.com/home"
+        address = f"{100 + i} {rnd.choice(STREETS)} #{i}"
+        link = f"https://www.google.com/maps/place/b{i}/data=!4m7!3m6!1s0x876c:0x{i + 1:x}!8m2"
+        rows.append(_row(i, name, phone, website, address, link))
+        kind = rnd.random()
+        if kind < 0.04:
+            # Same CID, link captured with a viewport segment
+            rows.append(_row(i, name, phone, website, address, link.replace("/data=", "/@39.74,-105.05,12z/data=")))
+            planted.append((i, len(rows) - 1))
+        elif kind < 0.06:
+            # Other listing, same business: same phone, name written differently
+            rows.append(_row(i, name.replace(" ", " & ", 1) + " LLC", "+1 " + phone, "", "", f"https://maps.example/p{i}"))
+            planted.append((i, len(rows) - 1))
+        elif kind < 0.08:
+            # Same domain and name, no address
+            rows.append(_row(i, name + " Inc", "", website.replace("https://www.", "http://"), "", f"https://maps.example/d{i}"))
+            planted.append((i, len(rows) - 1))
+        elif kind < 0.09:
+            # Same name and address, tracking phone number
+            rows.append(_row(i, "The " + name, f"(720) {i // 10000 % 1000:03d}-{i % 10000:04d}", "", address.replace("Street", "St"), f"https://maps.example/a{i}"))
+            planted.append((i, len(rows) - 1))
+        elif kind < 0.095:
+            # Same address, name with one more word that sorts before the others, tracking phone
+            rows[i]["name"] = name.replace(f" {i}", str(i))
+            rows.append(_row(i, rows[i]["name"] + " Academy", f"(720) {i // 10000 % 1000:03d}-{i % 10000:04d}", "", address, f"https://maps.example/n{i}"))
+            planted.append((i, len(rows) - 1))
+        elif kind < 0.10:
+            # Trap: another location of a chain (same domain, other address and phone)
+            rows.append(_row(i, name, f"(719) {i // 10000 % 1000:03d}-{i % 10000:04d}", website, f"9{address}", f"https://maps.example/c{i}"))
+            traps.append((i, len(rows) - 1))
+    # Trap: an answering service shared by unrelated businesses (small enough block to be compared)
+    for k in range(0, min(count, 40), 4):
+        rows[k]["phone"] = "(800) 555-0100"
+        rows[k]["name"] = f"Client{k} Answering"
+    for k in range(4, min(count, 40), 4):
+        traps.append((0, k))
+    return rows[:count], [p for p in planted if p[1] < count], [t for t in traps if t[1] < count]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Scaling/accuracy benchmark for resolve_entities")
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="Input row counts")
+    args = ap.parse_args()
+
+    print(f"{'rows':>8} {'out':>8} {'seconds':>8} {'us/row':>7} {'found':>11} {'trap merges':>11}  merges")
+    for size in args.sizes:
+        rows, planted, traps = synthetic_listings(size)
+        links = [r["listing_link"] for r in rows]
+        t0 = time.perf_counter()
+        resolved, stats = resolve_entities(rows, FLAG_COLS)
+        elapsed = time.perf_counter() - t0
+
+        group_of: Dict[str, int] = {}
+        for g, r in enumerate(resolved):
+            group_of[r["listing_link"]] = g
+            for other in r["merged_links"]:
+                group_of[other] = g
+        found = sum(group_of[links[a]] == group_of[links[b]] for a, b in planted)
+        wrong = sum(group_of[links[a]] == group_of[links[b]] for a, b in traps)
+        print(
+            f"{size:>8} {len(resolved):>8} {elapsed:>8.2f} {elapsed / size * 1e6:>7.2f} "
+            f"{found:>5}/{len(planted):<5} {wrong:>11}  {stats.describe()}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Offline scaling benchmark for deduplicate.merge_rows_by_listing.
+# Feeds synthetic map rows (100 map files over a fixed pool of 20,000 listings, so a
+# listing shows up more often as the input grows) and reports the time per row at each
+# size; flat microseconds per row means the merge scales linearly. The previous
+# implementation is kept here as a reference: it is checked for identical output on a
+# smaller input and timed next to the current one up to --legacy-max rows.
+# Rows are generated lazily, so 1M rows do not have to fit in memory; the generation
+# cost is measured on its own and subtracted. The GC is paused while timing.
+#   python -m testing.bench_merge
+#   python -m testing.bench_merge --sizes 100000 1000000 --legacy-max 0
+import argparse
+import gc
+import random
+import time
+from typing import Any, Dict, Iterator, List
+
+import pandas as pd
+
+from deduplicate import merge_rows_by_listing
+
+MAP_FILES = 100
+LISTINGS = 20000
+SIZES = (125000, 250000, 500000, 1000000)
+NAN = float("nan")
+
+
+def synthetic_rows(count: int, maps: int = MAP_FILES, listings: int = LISTINGS, seed: int = 7) -> Iterator[Dict[str, Any]]:
+    """Yield `count` map rows spread evenly over `maps` map files, in map-file order."""
+    rnd = random.Random(seed)
+    per_map = max(1, count // maps)
+    names = [f"Business {i}" for i in range(listings)]
+    links = [f"https://www.google.com/maps/place/b{i}/data=!4m2!3m1!1s0x0:0x{i:x}" for i in range(listings)]
+    cats = [["Roofing contractor"], ["Plumber", "Water heater installation service"], []]
+    emitted = 0
+    for m in range(maps):
+        map_file = f"query-{m:03d}.xlsx"
+        for pos in range(1, per_map + 1):
+            if emitted >= count:
+                return
+            emitted += 1
+            i = rnd.randrange(listings)
+            blank = rnd.random() < 0.3
+            yield {
+                "name": None if blank else names[i],
+                "categories": cats[i % 3],
+                "rating": NAN if blank else 4.0 + (i % 10) / 10,
+                "reviews_count": None if blank else i % 500,
+                "address": "" if blank else f"{i} Main St",
+                "phone": None if i % 4 == 0 else f"+1 555 {i:07d}",
+                "website": None if i % 5 == 0 else f"https://b{i}.example.com",
+                "listing_link": links[i],
+                "position": NAN if rnd.random() < 0.001 else pos,
+                # A few rows without a map file exercise the position-only path
+                "map_file": None if rnd.random() < 0.001 else map_file,
+                "source_file": f"queries-{m % 3}.xlsx",
+                "search_volume": NAN if i % 7 == 0 else i % 1000,
+            }
+
+
+def legacy_merge_rows_by_listing(rows, source_flags: Dict[str, int]) -> List[Dict[str, Any]]:
+    """The merge before per-aggregate pair sets: rebuilds the pair set and scans every field per row."""
+    by_link: Dict[str, Dict[str, Any]] = {}
+
+    def first_non_empty(*vals):
+        for v in vals:
+            if v is None:
+                continue
+            if isinstance(v, float) and pd.isna(v):
+                continue
+            if isinstance(v, str) and not v.strip():
+                continue
+            return v
+        return None
+
+    for r in rows:
+        link = r.get("listing_link")
+        if not isinstance(link, str) or not link.strip():
+            continue
+        if link not in by_link:
+            by_link[link] = {
+                "listing_link": link,
+                "position": [],
+                "name": r.get("name"),
+                "categories": r.get("categories") if isinstance(r.get("categories"), list) else [],
+                "website": r.get("website"),
+                "phone": r.get("phone"),
+                "address": r.get("address"),
+                "reviews_count": r.get("reviews_count"),
+                "rating": r.get("rating"),
+                "source_file": r.get("source_file"),
+                "search_volume": [],
+                "map_files": [],
+                "status": "pending",
+            }
+            for fname, idx in source_flags.items():
+                by_link[link][f"query_filename{idx}"] = False
+
+        agg = by_link[link]
+        pos = r.get("position")
+        map_name = r.get("map_file")
+        sv = r.get("search_volume")
+        if pd.notna(pos):
+            try:
+                p = int(pos)
+                if isinstance(map_name, str) and map_name:
+                    existing_pairs = set(zip(agg["map_files"], agg["position"]))
+                    if (map_name, p) not in existing_pairs:
+                        agg["position"].append(p)
+                        agg["map_files"].append(map_name)
+                        agg["search_volume"].append(sv)
+                else:
+                    if p not in agg["position"]:
+                        agg["position"].append(p)
+            except Exception:
+                pass
+
+        cats = r.get("categories")
+        if isinstance(cats, list) and cats and not agg["categories"]:
+            agg["categories"] = cats
+
+        for key in ("name", "website", "phone", "address", "reviews_count", "rating", "source_file"):
+            agg[key] = first_non_empty(agg.get(key), r.get(key))
+
+        if isinstance(map_name, str) and map_name in source_flags:
+            agg[f"query_filename{source_flags[map_name]}"] = True
+
+    return list(by_link.values())
+
+
+def _timed(fn) -> float:
+    # The cyclic GC walks every live row on full collections, which adds noise that
+    # has nothing to do with the merge itself
+    gc.collect()
+    gc.disable()
+    try:
+        t0 = time.perf_counter()
+        fn()
+        return time.perf_counter() - t0
+    finally:
+        gc.enable()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Scaling benchmark for merge_rows_by_listing")
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="Row counts to merge")
+    ap.add_argument("--legacy-max", type=int, default=250000, help="Largest size to also time the previous merge on (0 = never)")
+    ap.add_argument("--parity-rows", type=int, default=50000, help="Rows used for the output parity check")
+    args = ap.parse_args()
+
+    source_flags = {f"query-{m:03d}.xlsx": m + 1 for m in range(MAP_FILES)}
+
+    new = merge_rows_by_listing(synthetic_rows(args.parity_rows), source_flags)
+    old = legacy_merge_rows_by_listing(synthetic_rows(args.parity_rows), source_flags)
+    if new != old:
+        raise SystemExit(f"[!] Output differs from the previous merge on {args.parity_rows} rows")
+    print(f"[✓] Identical output to the previous merge on {args.parity_rows} rows ({len(new)} listings)")
+
+    print(f"{'rows':>9} {'gen s':>7} {'merge s':>8} {'us/row':>7} {'legacy s':>9} {'us/row':>7}")
+    for size in args.sizes:
+        gen = _timed(lambda: sum(1 for _ in synthetic_rows(size)))
+        merged = _timed(lambda: merge_rows_by_listing(synthetic_rows(size), source_flags)) - gen
+        line = f"{size:>9} {gen:>7.2f} {merged:>8.2f} {merged / size * 1e6:>7.2f}"
+        if size <= args.legacy_max:
+            legacy = _timed(lambda: legacy_merge_rows_by_listing(synthetic_rows(size), source_flags)) - gen
+            line += f" {legacy:>9.2f} {legacy / size * 1e6:>7.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
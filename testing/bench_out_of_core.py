@@ -0,0 +1,135 @@
+# Benchmark and parity check of deduplicate's out-of-core mode (--max-memory-mb).
+# Writes the synthetic rows of testing/bench_merge.py as parquet map files into a temporary
+# data dir, then dedupes them once in memory and once per memory cap, each run in a fresh
+# process. Reports wall time and the peak RSS of every run, and checks that the combined
+# files and the rewritten map files are identical to the in-memory run's, dtypes included,
+# and that no capped run went more than its cap above the baseline. The baseline is the RSS
+# once the libraries are loaded and initialized: each process first dedupes two tiny map
+# files the same way, then resets its peak RSS (Linux only).
+#   python -m testing.bench_out_of_core
+#   python -m testing.bench_out_of_core --rows 2000000 --caps 64 256 --engine groupby
+import argparse
+import contextlib
+import io
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import deduplicate
+from src.io_helpers import read_frame, write_map_results
+from testing.bench_merge import MAP_FILES, synthetic_rows
+
+
+def write_maps(maps_dir: Path, count: int) -> List[str]:
+    by_map: Dict[str, List[Dict]] = {}
+    current = None
+    for row in synthetic_rows(count):
+        current = row.pop("map_file") or current
+        # Every row has a review count, so the combined column stays integral and its dtype is compared too
+        if row["reviews_count"] is None:
+            row["reviews_count"] = 0
+        # A bit over 20% of the rows fall under the default 4.2 rating filter
+        by_map.setdefault(current, []).append(row)
+    names = []
+    for name, rows in by_map.items():
+        names.append(name.replace(".xlsx", ".parquet"))
+        write_map_results(maps_dir / names[-1], rows)
+    return names
+
+
+def _memory_mb(field: str) -> float:
+    # VmHWM/VmRSS belong to this process image; getrusage's ru_maxrss survives exec and would
+    # report the parent's peak when that is higher (Linux only)
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _dedupe(data_dir: Path, names: List[str], engine: str, cap: Optional[float]) -> None:
+    deduplicate.MAPS_DIR = data_dir / "maps"
+    deduplicate.COMBINED_DIR = data_dir / "combined"
+    with contextlib.redirect_stdout(io.StringIO()):
+        deduplicate.run(",".join(names), 4.2, None, None, False, engine, False, None, 1, cap)
+
+
+def _run(data_dir: str, names: List[str], engine: str, cap: Optional[float]) -> Tuple[float, float, float]:
+    """One dedupe in this (fresh) process; returns (seconds, baseline RSS MB, peak RSS MB)."""
+    warm_dir = Path(data_dir) / "warm-up"
+    _dedupe(warm_dir, write_maps(warm_dir / "maps", 300)[:2], engine, cap)
+    shutil.rmtree(warm_dir)
+    with open("/proc/self/clear_refs", "w") as f:
+        # Resets VmHWM to the current RSS
+        f.write("5")
+    base = _memory_mb("VmRSS")
+    t0 = time.perf_counter()
+    _dedupe(Path(data_dir), names, engine, cap)
+    elapsed = time.perf_counter() - t0
+    return elapsed, base, _memory_mb("VmHWM")
+
+
+def _outputs(data_dir: Path, names: List[str]) -> List[pd.DataFrame]:
+    combined = next((data_dir / "combined").iterdir())
+    return [read_frame(combined)] + [read_frame(data_dir / "maps" / n) for n in names]
+
+
+def _same(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    return list(a.columns) == list(b.columns) and (a.dtypes == b.dtypes).all() and a.astype(str).equals(b.astype(str))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Out-of-core dedupe vs in-memory dedupe")
+    ap.add_argument("--rows", type=int, default=500000, help="Synthetic map rows, spread over 100 map files")
+    ap.add_argument(
+        "--caps", type=float, nargs="+", default=[deduplicate.MIN_MEMORY_MB, 128],
+        help=f"Memory caps (MB) to run the out-of-core mode with, at least {deduplicate.MIN_MEMORY_MB}",
+    )
+    ap.add_argument("--engine", choices=deduplicate.DEDUPE_ENGINES, default="rows")
+    args = ap.parse_args()
+    if min(args.caps) < deduplicate.MIN_MEMORY_MB:
+        ap.error(f"deduplicate refuses caps below {deduplicate.MIN_MEMORY_MB} MB")
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench-ooc-"))
+    try:
+        source = tmp / "source"
+        names = write_maps(source, args.rows)
+        on_disk = sum(p.stat().st_size for p in source.iterdir()) / 1024 / 1024
+        print(f"[i] {args.rows} rows in {len(names)} of {MAP_FILES} map files, {on_disk:.1f} MB on disk")
+
+        ok = True
+        reference = None
+        print(f"{'mode':>12} {'seconds':>8} {'base MB':>8} {'peak MB':>8}  output")
+        for cap in [None] + args.caps:
+            data_dir = tmp / f"run-{cap}"
+            shutil.copytree(source, data_dir / "maps")
+            # A fresh (spawned, not forked) process per run, so each peak RSS is its own
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                elapsed, base, peak = pool.submit(_run, str(data_dir), names, args.engine, cap).result()
+            outputs = _outputs(data_dir, names)
+            if reference is None:
+                reference, verdict = outputs, f"{len(outputs[0])} listings"
+            else:
+                same = all(_same(a, b) for a, b in zip(reference, outputs))
+                within = peak - base <= cap
+                ok &= same and within
+                verdict = "identical" if same else "[!] differs from the in-memory run"
+                if not within:
+                    verdict += f", [!] {peak - base:.0f} MB over the baseline"
+            mode = "in-memory" if cap is None else f"cap {cap:g} MB"
+            print(f"{mode:>12} {elapsed:>8.2f} {base:>8.0f} {peak:>8.0f}  {verdict}")
+            shutil.rmtree(data_dir)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
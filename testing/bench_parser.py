@@ -0,0 +1,115 @@
+# Offline throughput/memory benchmark for the Maps card parser.
+# Runs extract_businesses_from_html (every HTML backend) and parse_maps_item_soup on
+# synthetic result pages of 20, 120 and 2,000 cards, plain and with the GBP Everywhere
+# category-list-display block on every card. Results are saved as JSON so runs can be compared.
+# Peak memory is what tracemalloc sees (Python allocations); the C-side trees of lxml and
+# selectolax are not included, so compare it within a backend, not across backends.
+#   python -m testing.bench_parser                                  # writes testing/bench_results/<timestamp>.json
+#   python -m testing.bench_parser --compare testing/bench_results/baseline.json
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+from src.html_backends import HTML_BACKENDS, LexborHTMLParser
+from src.maps_item_parser import parse_maps_item_soup
+from src.parse_gbp_listing import CONTAINER_SELECTOR, extract_businesses_from_html
+from testing.maps_fixtures import make_results_page
+
+RESULTS_DIR = Path(__file__).resolve().parent / "bench_results"
+SIZES = (20, 120, 2000)
+# category_list_every for each variant
+VARIANTS = {"plain": 0, "category-list": 1}
+
+
+def _measure(fn: Callable[[], object], cards: int, repeat: int) -> Dict[str, float]:
+    # Best-of timing without tracing, then one traced run for the allocation peak
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": round(best, 6),
+        "cards_per_sec": round(cards / best, 1) if best else None,
+        "peak_mem_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def run_suite(sizes: List[int], repeat: int) -> List[Dict]:
+    backends = [b for b in HTML_BACKENDS if b != "selectolax" or LexborHTMLParser is not None]
+    results: List[Dict] = []
+    for variant, every in VARIANTS.items():
+        for cards in sizes:
+            html = make_results_page(cards, category_list_every=every)
+            # Fewer repeats for the big page; it dominates the runtime
+            reps = max(1, repeat if cards <= 120 else repeat // 3)
+            for backend in backends:
+                stats = _measure(lambda: extract_businesses_from_html(html, "bench.xlsx", backend), cards, reps)
+                results.append({"bench": "extract_businesses_from_html", "backend": backend,
+                                "variant": variant, "cards": cards, **stats})
+            # Per-card extraction only: the document is parsed up front
+            containers = BeautifulSoup(html, "lxml").select(CONTAINER_SELECTOR)
+            stats = _measure(lambda: [parse_maps_item_soup(c) for c in containers], cards, reps)
+            results.append({"bench": "parse_maps_item_soup", "backend": "bs4",
+                            "variant": variant, "cards": cards, **stats})
+    return results
+
+
+def _key(r: Dict) -> tuple:
+    return (r["bench"], r["backend"], r["variant"], r["cards"])
+
+
+def print_results(results: List[Dict], baseline: Optional[List[Dict]] = None) -> None:
+    base = {_key(r): r for r in baseline or []}
+    print(f"{'bench':<30} {'backend':<11} {'variant':<14} {'cards':>6} {'cards/s':>10} {'peak MB':>8}  vs baseline")
+    for r in results:
+        old = base.get(_key(r))
+        ratio = f"{r['cards_per_sec'] / old['cards_per_sec']:.2f}x" if old and old.get("cards_per_sec") else ""
+        print(
+            f"{r['bench']:<30} {r['backend']:<11} {r['variant']:<14} {r['cards']:>6} "
+            f"{r['cards_per_sec']:>10.0f} {r['peak_mem_mb']:>8.2f}  {ratio}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=str, default=",".join(str(s) for s in SIZES),
+                        help="Comma-separated card counts (default: 20,120,2000).")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=Path, default=None, help="Result file (default: testing/bench_results/<timestamp>.json).")
+    parser.add_argument("--compare", type=Path, default=None, help="Earlier result file to compare throughput against.")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = run_suite(sizes, args.repeat)
+    baseline = json.loads(args.compare.read_text(encoding="utf-8"))["results"] if args.compare else None
+    print_results(results, baseline)
+
+    out = args.out or RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }, indent=2) + "\n", encoding="utf-8")
+    print(f"[✓] Saved {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# Compares the old per-card reserialization path with the single-pass parser on a
+# synthetic 120-card results page. Run from the project root:
+#   python -m testing.bench_result_parser [--cards 120] [--repeat 5]
+import argparse
+import time
+from typing import Dict, List
+
+from bs4 import BeautifulSoup
+
+from src.maps_item_parser import parse_maps_item_container
+from src.parse_gbp_listing import extract_businesses_from_html
+from testing.maps_fixtures import make_results_page
+
+
+def extract_reserialized(html: str, source_file: str) -> List[Dict]:
+    # The previous implementation: html.parser for the page, then str(el) and a new soup per card
+    soup = BeautifulSoup(html, "html.parser")
+    containers = soup.select("div.Nv2PK.tH5CWc.THOPZb") or soup.select("div.Nv2PK")
+    rows = []
+    for idx, el in enumerate(containers, start=1):
+        data = parse_maps_item_container(str(el)).to_dict()
+        data["position"] = idx
+        data["source_file"] = source_file
+        rows.append(data)
+    return rows
+
+
+def best_of(fn, html: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(html, "bench.xlsx")
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    html = make_results_page(args.cards, category_list_every=3)
+    old_rows = extract_reserialized(html, "bench.xlsx")
+    new_rows = extract_businesses_from_html(html, "bench.xlsx")
+    print(f"{args.cards} cards, identical rows: {old_rows == new_rows}")
+
+    old = best_of(extract_reserialized, html, args.repeat)
+    new = best_of(extract_businesses_from_html, html, args.repeat)
+    print(f"reserialize per card: {old * 1000:8.1f} ms  ({args.cards / old:8.0f} cards/s)")
+    print(f"single pass:          {new * 1000:8.1f} ms  ({args.cards / new:8.0f} cards/s)")
+    print(f"speedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Synthetic Google Maps result cards shaped like the live feed markup
+# (same classes and nesting maps_item_parser relies on). Deterministic for a given count.
+from html import escape
+from typing import List
+
+_CATEGORIES = ["Steel fabricator", "Welder", "Metal workshop", "Machine shop", "Iron works"]
+_STREETS = ["Umatilla St", "Larimer St", "Blake St", "Walnut St", "Brighton Blvd"]
+
+
+def make_card(i: int, category_list: bool = False) -> str:
+    """One result card. Every few cards drop the rating, phone or website, as real feeds do."""
+    name = f"Acme Fabrication {i}"
+    category = _CATEGORIES[i % len(_CATEGORIES)]
+    address = f"{1000 + i} {_STREETS[i % len(_STREETS)]}"
+    fid = f"0x876c7{i:06x}:0x{0x1a2b3c4d5e + i:x}"
+    link = f"https://www.google.com/maps/place/{name.replace(' ', '+')}/data=!4m7!3m6!1s{fid}!8m2!3d39.7!4d-104.9"
+
+    rating = ""
+    if i % 7 != 3:
+        stars = 3.5 + (i % 15) / 10
+        rating = (
+            f'<span class="ZkP5Je" role="img" aria-label="{stars:.1f} stars {10 + i} Reviews">'
+            f'<span class="MW4etd" aria-hidden="true">{stars:.1f}</span>'
+            f'<span class="UY7F9" aria-hidden="true">({10 + i:,})</span></span>'
+        )
+    phone = ""
+    if i % 5 != 1:
+        phone = f'<span class="UsdlK">(303) 555-{i % 10000:04d}</span>'
+    website = ""
+    if i % 4 != 2:
+        website = (
+            f'<a class="lcr4fd S9kvJb" data-value="Website" aria-label="Visit {escape(name)}\'s website" '
+            f'href="https://acme{i}.example.com/"><span class="DVeyrd"></span></a>'
+        )
+    cats = ""
+    if category_list:
+        # GBP Everywhere extension block injected into the card
+        cats = (
+            '<div class="category-list-display btn-gmb-category-tool">'
+            '<span>GMB Cat.:</span>'
+            f'<a>{category}</a> · <a>{_CATEGORIES[(i + 1) % len(_CATEGORIES)]}</a>'
+            '<span>Find more</span></div>'
+        )
+
+    return (
+        '<div class="Nv2PK tH5CWc THOPZb" jsaction="mouseover:pane.wfvdle10">'
+        f'<a class="hfpxzc" aria-label="{escape(name)}" href="{escape(link)}" jsaction="pane.wfvdle10"></a>'
+        '<div class="bfdHYd Ppzolf OFBs3e"><div class="lI9IFe"><div class="y7PRA"><div class="Lui3Od">'
+        f'<div class="UaQhfb fontBodyMedium"><div class="NrDZNb"><div class="qBF1Pd fontHeadlineSmall">{escape(name)}</div></div>'
+        f'<div class="W4Efsd"><div class="AJB7ye">{rating}</div></div>'
+        '<div class="W4Efsd">'
+        f'<div class="W4Efsd"><span><span>{category}</span></span><span> · </span>'
+        f'<span><span aria-hidden="true"></span></span><span> · </span><span>{address}</span></div>'
+        f'<div class="W4Efsd"><span><span style="font-weight: 400;">Open</span>'
+        f'<span> ⋅ Closes 5 PM</span></span>{" <span> · </span>" + phone if phone else ""}</div>'
+        '</div></div></div></div></div>'
+        f'<div class="Rwjeuc">{website}</div>'
+        f'{cats}'
+        '</div></div>'
+    )
+
+
+def make_cards(count: int, category_list_every: int = 0) -> List[str]:
+    """category_list_every=N adds the category-list-display block to every Nth card (0 = never)."""
+    return [
+        make_card(i, category_list=bool(category_list_every) and i % category_list_every == 0)
+        for i in range(1, count + 1)
+    ]
+
+
+def make_results_page(count: int, category_list_every: int = 0) -> str:
+    """A results page: the feed with `count` cards plus some surrounding page chrome."""
+    cards = "".join(
+        f'{card}<div class="TFQHme"></div>' for card in make_cards(count, category_list_every)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Google Maps</title></head><body>"
+        '<div id="app-container"><div class="m6QErb DxyBCb kA9KIf dS8AEf" role="feed" aria-label="Results">'
+        f"{cards}"
+        '<div class="m6QErb XiKgde tLjsW eKbjU"><span class="HlvSq">You\'ve reached the end of the list.</span></div>'
+        "</div></div></body></html>"
+    )
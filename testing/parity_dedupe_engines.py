@@ -0,0 +1,136 @@
+# Parity check between the two merge engines of deduplicate.py.
+# Runs merge_rows_by_listing (the rows engine, as run() calls it) and merge_frame_by_listing
+# (the groupby engine) on the same concatenated map rows and compares the resulting frames:
+# columns, dtypes, and every cell including the types of list elements. Inputs are the
+# synthetic rows of testing/bench_merge.py, a hand-made frame with the edge cases
+# (blank links, missing/float/str positions, rows without a map file, blank scalars), and
+# optionally real map files from data/maps/.
+#   python -m testing.parity_dedupe_engines
+#   python -m testing.parity_dedupe_engines --maps a.xlsx,b.xlsx --rows 200000
+import argparse
+import math
+import sys
+import time
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from deduplicate import (
+    MAPS_DIR,
+    _normalize_categories_series,
+    merge_frame_by_listing,
+    merge_rows_by_listing,
+    read_map_file,
+)
+from testing.bench_merge import MAP_FILES, synthetic_rows
+
+NAN = float("nan")
+
+
+def edge_case_frame() -> pd.DataFrame:
+    rows = [
+        {"listing_link": "L1", "position": 1, "map_file": "a.xlsx", "name": "  ", "search_volume": 10, "categories": []},
+        {"listing_link": "L1", "position": 1.0, "map_file": "a.xlsx", "name": "One", "search_volume": 11, "categories": ["X"]},
+        {"listing_link": "L1", "position": 2.7, "map_file": "b.xlsx", "name": "Other", "search_volume": NAN, "categories": ["Y"]},
+        {"listing_link": "L1", "position": 2, "map_file": None, "rating": 4.5, "categories": []},
+        {"listing_link": "L1", "position": 5, "map_file": "", "rating": 3.0, "categories": []},
+        {"listing_link": "L1", "position": 5, "map_file": None, "categories": []},
+        {"listing_link": "L1", "position": 5, "map_file": "c.xlsx", "search_volume": 3, "categories": []},
+        {"listing_link": "   ", "position": 1, "map_file": "a.xlsx", "name": "Blank link", "categories": []},
+        {"listing_link": None, "position": 1, "map_file": "a.xlsx", "name": "No link", "categories": []},
+        {"listing_link": "L2", "position": NAN, "map_file": "c.xlsx", "phone": "", "categories": ["Z"]},
+        {"listing_link": "L2", "position": float("inf"), "map_file": "b.xlsx", "phone": "+1 5", "categories": []},
+        {"listing_link": "L3", "position": NAN, "map_file": "unknown.xlsx", "website": None, "categories": []},
+        {"listing_link": " L1", "position": 1, "map_file": "a.xlsx", "reviews_count": 7, "categories": []},
+    ]
+    df = pd.DataFrame(rows)
+    for col in ("name", "website", "phone", "address", "reviews_count", "rating", "source_file", "search_volume"):
+        if col not in df.columns:
+            df[col] = None
+    return df
+
+
+def str_position_frame() -> pd.DataFrame:
+    # Positions read back as text (e.g. a hand-edited sheet) take the per-value path
+    df = edge_case_frame()
+    df["position"] = ["1", "1", "x", 2, None, "5", 5, 1, 1, NAN, "3", None, "1"]
+    return df
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, list) or isinstance(b, list):
+        return (
+            isinstance(a, list)
+            and isinstance(b, list)
+            and len(a) == len(b)
+            and all(_same(x, y) for x, y in zip(a, b))
+        )
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return type(a) is type(b) and a == b
+
+
+def compare(name: str, df: pd.DataFrame, source_flags: Dict[str, int]) -> bool:
+    t0 = time.perf_counter()
+    rows_df = pd.DataFrame(merge_rows_by_listing(df.to_dict(orient="records"), source_flags))
+    t1 = time.perf_counter()
+    groupby_df = merge_frame_by_listing(df, source_flags)
+    t2 = time.perf_counter()
+
+    problems: List[str] = []
+    if list(rows_df.columns) != list(groupby_df.columns):
+        problems.append(f"columns {list(rows_df.columns)} != {list(groupby_df.columns)}")
+    elif len(rows_df) != len(groupby_df):
+        problems.append(f"{len(rows_df)} rows != {len(groupby_df)} rows")
+    else:
+        for col in rows_df.columns:
+            if rows_df[col].dtype != groupby_df[col].dtype:
+                problems.append(f"{col}: dtype {rows_df[col].dtype} != {groupby_df[col].dtype}")
+            for i, (a, b) in enumerate(zip(rows_df[col].tolist(), groupby_df[col].tolist())):
+                if not _same(a, b):
+                    problems.append(f"{col}[{i}]: {a!r} != {b!r}")
+                    break
+
+    timing = f"rows {t1 - t0:.2f}s, groupby {t2 - t1:.2f}s"
+    if problems:
+        print(f"[!] {name}: {len(problems)} difference(s) ({timing})")
+        for p in problems[:20]:
+            print(f"    {p}")
+        return False
+    print(f"[✓] {name}: {len(rows_df)} listings identical ({timing})")
+    return True
+
+
+def load_maps(names: List[str]) -> pd.DataFrame:
+    # Same preparation as deduplicate.run(), minus the rating filter
+    frames = []
+    for name in names:
+        df = read_map_file(MAPS_DIR / name)
+        df["map_file"] = name
+        df["categories"] = _normalize_categories_series(df["categories"])
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Compare the rows and groupby dedupe engines")
+    ap.add_argument("--rows", type=int, default=100000, help="Synthetic rows to merge")
+    ap.add_argument("--maps", type=str, default="", help="Comma-separated map files in data/maps/ to compare on as well")
+    args = ap.parse_args()
+
+    ok = True
+    flags = {"a.xlsx": 1, "b.xlsx": 2, "c.xlsx": 3}
+    ok &= compare("edge cases", edge_case_frame(), flags)
+    ok &= compare("text positions", str_position_frame(), flags)
+
+    synthetic = pd.DataFrame(list(synthetic_rows(args.rows)))
+    ok &= compare(f"synthetic {args.rows} rows", synthetic, {f"query-{m:03d}.xlsx": m + 1 for m in range(MAP_FILES)})
+
+    names = [n.strip() for n in args.maps.split(",") if n.strip()]
+    if names:
+        ok &= compare(", ".join(names), load_maps(names), {n: i + 1 for i, n in enumerate(names)})
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
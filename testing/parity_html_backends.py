@@ -0,0 +1,61 @@
+# Checks that every HTML backend in src.html_backends yields exactly the rows of the
+# BeautifulSoup reference on the saved fixtures in testing/fixtures/, and that the
+# reference still matches the recorded <fixture>.expected.json. Exit code 1 on any mismatch.
+#   python -m testing.parity_html_backends            # check
+#   python -m testing.parity_html_backends --update   # re-record expected output (bs4)
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from src.html_backends import HTML_BACKENDS, LexborHTMLParser
+from src.parse_gbp_listing import extract_businesses_from_html
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+
+def _diff(expected, actual) -> str:
+    if len(expected) != len(actual):
+        return f"{len(actual)} rows instead of {len(expected)}"
+    for e, a in zip(expected, actual):
+        if e != a:
+            keys = sorted(k for k in set(e) | set(a) if e.get(k) != a.get(k))
+            return f"row {e.get('position')}: " + ", ".join(f"{k}: {e.get(k)!r} != {a.get(k)!r}" for k in keys)
+    return ""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="Re-record the expected output from the bs4 backend.")
+    args = parser.parse_args()
+
+    backends = [b for b in HTML_BACKENDS if b != "selectolax" or LexborHTMLParser is not None]
+    if "selectolax" not in backends:
+        print("[i] selectolax not installed, skipping it")
+
+    failures = 0
+    for fixture in sorted(FIXTURES_DIR.glob("*.html")):
+        html = fixture.read_text(encoding="utf-8")
+        reference = extract_businesses_from_html(html, fixture.name, "bs4")
+        expected_path = fixture.with_suffix(".expected.json")
+        if args.update:
+            expected_path.write_text(json.dumps(reference, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            print(f"[✓] Recorded {expected_path.name} ({len(reference)} rows)")
+            continue
+        if expected_path.exists():
+            diff = _diff(json.loads(expected_path.read_text(encoding="utf-8")), reference)
+            if diff:
+                failures += 1
+                print(f"[!] {fixture.name} bs4 vs expected: {diff}")
+        for backend in backends[1:] if backends[0] == "bs4" else backends:
+            diff = _diff(reference, extract_businesses_from_html(html, fixture.name, backend))
+            if diff:
+                failures += 1
+                print(f"[!] {fixture.name} {backend}: {diff}")
+            else:
+                print(f"[✓] {fixture.name} {backend}: {len(reference)} rows identical")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# Parity check of deduplicate.py --append-to against a full run.
+# In a scratch directory: dedupes m0 into a combined file, appends m1, marks some combined
+# rows "good" (as an evaluator would), re-scrapes m0 (other order, listings dropped and
+# added), adds m2 and appends again. Then runs a full dedupe of m0, m1, m2 and compares:
+# every listing of the full run must be identical in the appended file (all columns but
+# status), listings no map file holds any more must be left with no map files or flags,
+# the "good" statuses must survive and the map files' statuses must match the full run.
+# Covers both storage formats.
+#   python -m testing.parity_incremental_dedupe
+#   python -m testing.parity_incremental_dedupe --formats parquet --listings 600
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import deduplicate
+from deduplicate import _list_cell
+from src.io_helpers import STORAGE_FORMATS, read_frame, write_frame, write_map_results
+from src.parse_gbp_listing import iter_businesses_from_html
+from testing.maps_fixtures import make_results_page
+from testing.parity_dedupe_engines import _same
+
+MIN_RATING = 4.2
+
+
+def _dedupe(names: List[str], append_to: Optional[str] = None) -> None:
+    # run() reports every phase; only show it when something went wrong
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        code = deduplicate.run(",".join(names), MIN_RATING, append_to=append_to)
+    if code != 0:
+        print(out.getvalue())
+        raise RuntimeError(f"deduplicate.run({names}, append_to={append_to}) returned {code}")
+
+
+def _write_map(path: Path, rows: List[Dict]) -> str:
+    write_map_results(path, rows)
+    # The append run must notice the rewrite even within the filesystem's timestamp granularity
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    return path.name
+
+
+def _map_statuses(names: List[str]) -> Dict[str, List[str]]:
+    return {n: read_frame(deduplicate.MAPS_DIR / n)["status"].astype(str).tolist() for n in names}
+
+
+def compare(fmt: str, listings: int, workdir: Path) -> bool:
+    deduplicate.MAPS_DIR = workdir / "maps"
+    cards = list(iter_businesses_from_html(make_results_page(listings, 3), "queries.xlsx"))
+    third = listings // 3
+    m0 = _write_map(deduplicate.MAPS_DIR / f"m0.{fmt}", cards[: 2 * third])
+    m1 = _write_map(deduplicate.MAPS_DIR / f"m1.{fmt}", cards[third: 2 * third + third // 2])
+
+    camp = f"campaign.{fmt}"
+    deduplicate.COMBINED_DIR = workdir / "incremental"
+    _dedupe([m0], camp)
+    _dedupe([m0, m1], camp)
+
+    # An evaluator marks some listings
+    combined = read_frame(deduplicate.COMBINED_DIR / camp)
+    combined.loc[combined.index % 5 == 0, "status"] = "good"
+    write_frame(deduplicate.COMBINED_DIR / camp, combined)
+    good = set(combined.loc[combined["status"] == "good", "listing_link"])
+
+    # m0 is scraped again: other order, its first listings gone, new ones after them
+    _write_map(deduplicate.MAPS_DIR / m0, list(reversed(cards[third // 2: 2 * third + third // 4])))
+    m2 = _write_map(deduplicate.MAPS_DIR / f"m2.{fmt}", cards[2 * third:])
+    names = [m0, m1, m2]
+    _dedupe(names, camp)
+    appended = read_frame(deduplicate.COMBINED_DIR / camp)
+    appended_statuses = _map_statuses(names)
+
+    deduplicate.COMBINED_DIR = workdir / "full"
+    _dedupe(names)
+    full = read_frame(next(deduplicate.COMBINED_DIR.glob(f"*.{fmt}")))
+    full_statuses = _map_statuses(names)
+
+    problems: List[str] = []
+    if list(appended.columns) != list(full.columns):
+        problems.append(f"columns {list(appended.columns)} != {list(full.columns)}")
+    else:
+        by_link = {r["listing_link"]: r for r in appended.to_dict(orient="records")}
+        for row in full.to_dict(orient="records"):
+            mine = by_link.pop(row["listing_link"], None)
+            if mine is None:
+                problems.append(f"{row['listing_link']}: missing from the appended file")
+                continue
+            for col, value in row.items():
+                if col != "status" and not _same(mine[col], value):
+                    problems.append(f"{row['listing_link']} {col}: {mine[col]!r} != {value!r}")
+                    break
+        flags = [c for c in appended.columns if c.startswith("query_filename")]
+        for link, row in by_link.items():
+            # Kept for its status, but no map file holds it any more
+            if _list_cell(row["map_files"]) or _list_cell(row["position"]) or any(row[c] for c in flags):
+                problems.append(f"{link}: dropped out of every map file but kept {row['map_files']!r}")
+        for row in appended.to_dict(orient="records"):
+            expected = "good" if row["listing_link"] in good else "pending"
+            if row["status"] != expected:
+                problems.append(f"{row['listing_link']}: status {row['status']!r}, expected {expected!r}")
+    for name in names:
+        if appended_statuses[name] != full_statuses[name]:
+            problems.append(f"{name}: map file statuses differ from the full run")
+
+    if problems:
+        print(f"[!] {fmt}: {len(problems)} difference(s)")
+        for p in problems[:20]:
+            print(f"    {p}")
+        return False
+    print(
+        f"[✓] {fmt}: {len(full)} listings identical to the full run, "
+        f"{len(appended) - len(full)} dropped-out kept, {len(good)} good statuses kept"
+    )
+    return True
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Compare deduplicate --append-to with a full run")
+    ap.add_argument("--formats", type=str, default=",".join(STORAGE_FORMATS), help="Comma-separated storage formats")
+    ap.add_argument("--listings", type=int, default=180, help="Synthetic listings across the map files")
+    args = ap.parse_args()
+
+    ok = True
+    for fmt in [f.strip() for f in args.formats.split(",") if f.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            ok &= compare(fmt, args.listings, Path(tmp))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
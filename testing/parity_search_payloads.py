@@ -0,0 +1,86 @@
+# Checks the intercepted-payload decoder (src/maps_response_parser.py) against the payloads
+# saved in testing/fixtures/*.payload and their recorded <fixture>.expected.json: an initial
+# state with a guarded nested payload and a repeated record, and a pagination response in
+# the {"d": ...} envelope with /*""*/ markers, a /url?q= website, address lines instead of
+# [39] and a noise category. Then checks that cards are paired with the decoded rows by
+# their link, not their position (an extra record and a sponsored card shift the order).
+# Exit code 1 on any mismatch.
+#   python -m testing.parity_search_payloads            # check
+#   python -m testing.parity_search_payloads --update   # re-record expected output
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from src.listing_keys import match_cards_to_rows
+from src.maps_response_parser import MapsResponseCollector, decode_search_payload
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+# Initial state first, as MapsResponseCollector.collect() reads them
+MERGE_ORDER = ("search_initial_state.payload", "search_page.payload")
+CARD_LINK = "https://www.google.com/maps/place/{}/data=!4m7!3m6!1s{}!8m2!3d39.7!4d-104.9!16s%2Fg%2F1tg?authuser=0&hl=en&rclk=1"
+
+
+def _diff(expected, actual) -> str:
+    if len(expected) != len(actual):
+        return f"{len(actual)} rows instead of {len(expected)}"
+    for n, (e, a) in enumerate(zip(expected, actual), start=1):
+        if e != a:
+            keys = sorted(k for k in set(e) | set(a) if e.get(k) != a.get(k))
+            return f"row {n}: " + ", ".join(f"{k}: {e.get(k)!r} != {a.get(k)!r}" for k in keys)
+    return ""
+
+
+def check_card_matching(payloads) -> str:
+    rows = MapsResponseCollector()._merge(payloads, "q.xlsx")
+    by_name = {r["name"]: i for i, r in enumerate(rows)}
+    plumbing = rows[by_name["Mile High Plumbing & Drain"]]
+    roofing = rows[by_name["Front Range Roofing"]]
+    cards = [
+        # Sponsored card of a listing no payload carried
+        CARD_LINK.format("Ad", "0x876c7f5e2e7f6c7b:0x99"),
+        CARD_LINK.format("Mile+High+Plumbing", plumbing["listing_link"].rsplit("!1s", 1)[1]),
+        CARD_LINK.format("Front+Range+Roofing", roofing["listing_link"].rsplit("!1s", 1)[1]),
+        None,
+    ]
+    expected = [None, by_name["Mile High Plumbing & Drain"], by_name["Front Range Roofing"], None]
+    matches = match_cards_to_rows(cards, rows)
+    if matches != expected:
+        return f"matches {matches} != {expected}"
+    if plumbing["listing_link"] != cards[1] or roofing["listing_link"] != cards[2]:
+        return "matched rows did not take the card links"
+    return ""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="Re-record the expected output.")
+    args = parser.parse_args()
+
+    failures = 0
+    for fixture in sorted(FIXTURES_DIR.glob("*.payload")):
+        text = fixture.read_text(encoding="utf-8")
+        rows = decode_search_payload(text)
+        expected_path = fixture.with_suffix(".expected.json")
+        if args.update:
+            expected_path.write_text(json.dumps(rows, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            print(f"[✓] Recorded {expected_path.name} ({len(rows)} rows)")
+            continue
+        diff = _diff(json.loads(expected_path.read_text(encoding="utf-8")), rows)
+        if diff:
+            failures += 1
+            print(f"[!] {fixture.name}: {diff}")
+        else:
+            print(f"[✓] {fixture.name}: {len(rows)} rows as expected")
+    if not args.update:
+        diff = check_card_matching([(FIXTURES_DIR / name).read_text(encoding="utf-8") for name in MERGE_ORDER])
+        if diff:
+            failures += 1
+            print(f"[!] card matching: {diff}")
+        else:
+            print("[✓] card matching: cards paired with their rows by link")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())